@@ -1,3 +1,4 @@
+from collections import defaultdict
 from datetime import date, datetime, time, timedelta
 from functools import reduce
 import logging
@@ -31,6 +32,42 @@ __all__ = (
 User = get_user_model()
 
 
+def get_send_stats_window(profile, start_date, end_date):
+    """
+    Return the start & end datetimes of the dates in the profile's company timezone, and the UTC
+    start & end times of the profile's business hours.
+    """
+    tz = pytz.timezone(profile.company.timezone)
+    start_time = profile.employee_start_time
+    end_time = profile.employee_end_time
+
+    # Convert the start_date and end_date into the datetime for for the company's timezone.
+    start_datetime = datetime.combine(start_date, datetime.min.time())
+    day_tz_start = tz.localize(start_datetime)
+
+    # Get the start time for the business hours
+    business_start = tz.localize(start_datetime).replace(
+        hour=start_time.hour,
+        minute=start_time.minute,
+    )
+    business_time_start = business_start.astimezone(pytz.utc).time()
+
+    # Get the start/end datetimes for the company timezone.
+    end_datetime = datetime.combine(end_date, datetime.max.time())
+    day_tz_end = tz.localize(end_datetime)
+
+    # Get the start/end datetimes for the business hours
+    business_datetime_end = tz.localize(end_datetime).replace(
+        hour=end_time.hour,
+        minute=end_time.minute,
+        second=0,
+        microsecond=0,
+    )
+    business_time_end = business_datetime_end.astimezone(pytz.utc).time()
+
+    return day_tz_start, day_tz_end, business_time_start, business_time_end
+
+
 class UserProfileQuerySet(models.QuerySet):
 
     def valid(self):
@@ -60,6 +97,95 @@ class UserProfileQuerySet(models.QuerySet):
         logger.info(f'[ch15689] filtered {no_profile_ct} users without profiles')
         return valid_profiles
 
+    def send_stats(self, start_date=None, end_date=None):
+        """
+        Return the sending and lead stats of the profiles, by profile id.
+
+        The stats of all the profiles are calculated together, grouped by user, so that the amount
+        of queries doesn't grow with the amount of profiles.
+        """
+        from sherpa.models import Prospect, SMSMessage
+
+        # If no start or end dates were sent, default to past day only.
+        if not start_date:
+            start_date = datetime.now().date() - timedelta(days=1)
+        if not end_date:
+            end_date = datetime.now().date()
+
+        profiles = list(self.select_related('company'))
+        by_range = defaultdict(list)
+        by_business_hours = defaultdict(list)
+        for profile in profiles:
+            window = get_send_stats_window(profile, start_date, end_date)
+            by_range[window[:2]].append(profile.user_id)
+            by_business_hours[window[2:]].append(profile.user_id)
+
+        # Go through and get all of our stats to return.
+        sent = {}
+        qualified = {}
+        for (day_tz_start, day_tz_end), user_ids in by_range.items():
+            sent.update({
+                row['initial_message_sent_by_rep']: row
+                for row in SMSMessage.objects.filter(
+                    initial_message_sent_by_rep__in=user_ids,
+                    dt__gte=day_tz_start,
+                    dt__lte=day_tz_end,
+                ).order_by().values('initial_message_sent_by_rep').annotate(
+                    attempts=Count('id'),
+                    delivered=Count('id', filter=Q(message_status='delivered')),
+                )
+            })
+            qualified.update(Prospect.objects.filter(
+                qualified_lead_created_by__in=user_ids,
+                qualified_lead_dt__gte=day_tz_start,
+                qualified_lead_dt__lte=day_tz_end,
+            ).order_by().values('qualified_lead_created_by').annotate(
+                total=Count('id'),
+            ).values_list('qualified_lead_created_by', 'total'))
+
+        response_times = {}
+        for (business_time_start, business_time_end), user_ids in by_business_hours.items():
+            # For response time, replace the start/end time with the business hours.
+            messages = SMSMessage.objects.filter(
+                response_from_rep__in=user_ids,
+            ).annotate(
+                # Perhaps these should be fields on the model itself?
+                msg_date=TruncDate('dt', output_field=models.DateField()),
+                msg_time=TruncTime('dt', output_field=models.TimeField()),
+            ).filter(msg_date__range=(start_date, end_date))
+
+            if business_time_end > business_time_start:
+                messages = messages.filter(
+                    msg_time__range=(business_time_start, business_time_end),
+                )
+            else:
+                # The end time has rolled over to next day due to UTC conversion.
+                ending = Q(msg_time__range=(time(0, 0), business_time_end))
+                starting = Q(msg_time__range=(business_time_start, time(23, 59, 59, 999999)))
+                messages = messages.filter(ending | starting)
+
+            response_times.update(messages.order_by().values('response_from_rep').annotate(
+                avg=Avg('response_time_seconds'),
+            ).values_list('response_from_rep', 'avg'))
+
+        stats = {}
+        for profile in profiles:
+            attempts_count = sent.get(profile.user_id, {}).get('attempts', 0)
+            delivered_count = sent.get(profile.user_id, {}).get('delivered', 0)
+            qualified_lead_count = qualified.get(profile.user_id, 0)
+            avg_response_time_seconds = response_times.get(profile.user_id) or 0
+            lead_rate = (
+                round(qualified_lead_count / delivered_count * 100) if delivered_count else 0
+            )
+            stats[profile.id] = {
+                "attempts": attempts_count,
+                "delivered": delivered_count,
+                "leads_created": qualified_lead_count,
+                "lead_rate": lead_rate,
+                "avg_response_time": math.ceil(avg_response_time_seconds / 60),
+            }
+        return stats
+
 
 class UserProfileManager(models.Manager.from_queryset(UserProfileQuerySet)):
     pass
@@ -267,100 +393,7 @@ class UserProfile(models.Model):
         """
         Return the sending and lead stats for the user.
         """
-        from sherpa.models import Prospect, SMSMessage
-        user = self.user
-        date_kwargs = {}
-        qualified_kwargs = {}
-        tz = pytz.timezone(self.company.timezone)
-
-        start_time = self.employee_start_time
-        end_time = self.employee_end_time
-
-        # If no start or end dates were sent, default to past day only.
-        if not start_date:
-            start_date = datetime.now().date() - timedelta(days=1)
-        if not end_date:
-            end_date = datetime.now().date()
-
-        # Convert the start_date and end_date into the datetime for for the company's timezone.
-        start_datetime = datetime.combine(start_date, datetime.min.time())
-        day_tz_start = tz.localize(start_datetime)
-        date_kwargs['dt__gte'] = day_tz_start
-        qualified_kwargs['qualified_lead_dt__gte'] = day_tz_start
-
-        # Get the start time for the business hours
-        business_start = tz.localize(start_datetime).replace(
-            hour=start_time.hour,
-            minute=start_time.minute,
-        )
-        business_time_start = business_start.astimezone(pytz.utc).time()
-
-        # Get the start/end datetimes for the company timezone.
-        end_datetime = datetime.combine(end_date, datetime.max.time())
-        day_tz_end = tz.localize(end_datetime)
-        date_kwargs['dt__lte'] = day_tz_end
-        qualified_kwargs['qualified_lead_dt__lte'] = day_tz_end
-
-        # Get the start/end datetimes for the business hours
-        business_datetime_end = tz.localize(end_datetime).replace(
-            hour=end_time.hour,
-            minute=end_time.minute,
-            second=0,
-            microsecond=0,
-        )
-        business_time_end = business_datetime_end.astimezone(pytz.utc).time()
-
-        # Go through and get all of our stats to return.
-        attempts_count = SMSMessage.objects.filter(
-            initial_message_sent_by_rep=user,
-            **date_kwargs,
-        ).count()
-
-        delivered_count = SMSMessage.objects.filter(
-            initial_message_sent_by_rep=user,
-            message_status='delivered',
-            **date_kwargs,
-        ).count()
-
-        qualified_lead_count = Prospect.objects.filter(
-            qualified_lead_created_by=user,
-            **qualified_kwargs,
-        ).count()
-
-        # For response time, replace the start/end time with the timezone 9am-6pm.
-        response_time_seconds_dict = SMSMessage.objects.filter(
-            response_from_rep=user,
-        ).annotate(
-            # Perhaps these should be fields on the model itself?
-            msg_date=TruncDate('dt', output_field=models.DateField()),
-            msg_time=TruncTime('dt', output_field=models.TimeField()),
-        ).filter(msg_date__range=(start_date, end_date))
-
-        if business_time_end > business_time_start:
-            response_time_seconds_dict = response_time_seconds_dict.filter(
-                msg_time__range=(business_time_start, business_time_end),
-            )
-        else:
-            # The end time has rolled over to next day due to UTC conversion.
-            ending = Q(msg_time__range=(time(0, 0), business_time_end))
-            starting = Q(msg_time__range=(business_time_start, time(23, 59, 59, 999999)))
-            response_time_seconds_dict = response_time_seconds_dict.filter(ending | starting)
-
-        response_time_seconds_dict = response_time_seconds_dict.aggregate(
-            Avg('response_time_seconds'),
-        )
-
-        avg_response_time_seconds = response_time_seconds_dict.get(
-            "response_time_seconds__avg") or 0
-        lead_rate = round(qualified_lead_count / delivered_count * 100) if delivered_count else 0
-
-        return {
-            "attempts": attempts_count,
-            "delivered": delivered_count,
-            "leads_created": qualified_lead_count,
-            "lead_rate": lead_rate,
-            "avg_response_time": math.ceil(avg_response_time_seconds / 60),
-        }
+        return UserProfile.objects.filter(pk=self.pk).send_stats(start_date, end_date)[self.pk]
 
     def update_agreement(self):
         """
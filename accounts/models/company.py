@@ -11,12 +11,12 @@ import pytz
 
 from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
-from django.db.models import Case, Count, F, Q, Sum, When
-from django.db.models.functions import Coalesce
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils import timezone as django_tz
-from django.utils.dateparse import parse_datetime
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.functional import cached_property
 
 from billing.exceptions import SubscriptionException
@@ -378,6 +378,13 @@ class Company(models.Model):
         """
         Total amount of initial bulk sends a company can make per day.
         """
+        from markets.capacity import SendCapacity
+        return SendCapacity(self).get_limit()
+
+    def calculate_send_sms_daily_limit(self):
+        """
+        Calculate the daily limit of initial bulk sends from the phone numbers of active markets.
+        """
         from sherpa.models import PhoneNumber
         markets = self.market_set.filter(is_active=True)
         phone_number_counts = PhoneNumber.objects.filter(
@@ -407,10 +414,8 @@ class Company(models.Model):
         """
         Returns an integer of how many initial campaign messages the company has sent today.
         """
-        total_count = 0
-        for market in self.market_set.all():
-            total_count += market.total_intial_sms_sent_today_count
-        return total_count
+        from markets.capacity import SendCapacity
+        return SendCapacity(self).get_sent_today()
 
     @property
     def admin_profile(self):
@@ -844,49 +849,15 @@ class Company(models.Model):
         """
         Generate campaign meta stats for a date range.
         """
-        from sherpa.models import Campaign
-
-        # Get the queryset of the daily stats instances that we'll be using.
-        active_campaigns = self.campaign_set.filter(is_archived=False).prefetch_related(
-            'campaigndailystats_set',
-        ).filter(
-            campaigndailystats__date__gte=start_date,
-            campaigndailystats__date__lte=end_date,
-        ).values('id').annotate(
-            sent=Coalesce(Sum(F('campaigndailystats__sent')), 0),
-            auto_dead=Coalesce(Sum(F('campaigndailystats__auto_dead')), 0),
-            new_leads=Coalesce(Sum(F('campaigndailystats__new_leads')), 0),
-            skipped=Coalesce(Sum(F('campaigndailystats__skipped')), 0),
-            delivered=Coalesce(Sum(F('campaigndailystats__delivered')), 0),
-            responses=Coalesce(Sum(F('campaigndailystats__responses')), 0),
-            response_rate=Case(
-                When(delivered=0, then=0),
-                default=F('responses') / (1.0 * F('delivered')) * 100,
-            ),
-            delivery_rate=Case(
-                When(sent=0, then=0),
-                default=F('delivered') / (1.0 * F('sent')) * 100,
-            ),
-            performance_rating=Case(
-                When(sent=0, then=0),
-                default=F('new_leads') / (1.0 * F('sent')) * 100,
-            ),
-        )
+        from campaigns.models import CampaignDailyStats
 
-        return [
-            {
-                'campaign': Campaign.objects.get(id=c['id']),
-                'sent': c['sent'],
-                'auto_dead': c['auto_dead'],
-                'new_leads': c['new_leads'],
-                'skipped': c['skipped'],
-                'delivered': c['delivered'],
-                'responses': c['responses'],
-                'response_rate': c['response_rate'],
-                'delivery_rate': c['delivery_rate'],
-                'performance_rating': c['performance_rating'],
-            } for c in active_campaigns
-        ]
+        if isinstance(start_date, str):
+            start_date = parse_date(start_date)
+        if isinstance(end_date, str):
+            end_date = parse_date(end_date)
+
+        active_campaigns = self.campaign_set.filter(is_archived=False)
+        return CampaignDailyStats.objects.meta_stats(active_campaigns, start_date, end_date)
 
     def add_twilio_discount(self):
         """
@@ -1133,15 +1104,24 @@ class Company(models.Model):
         """
         Return a list of agents with their time-filtered sending stats.
 
+        The stats are cached for a few minutes for each date range.
+
         :return list[dict]: Data about the time-filtered stats for an agent.
         """
-        queryset = self.profiles.filter(user__is_active=True)
+        cache_key = f'user_profile_stats_{self.uuid}_{start_date}_{end_date}'
+        stats = cache.get(cache_key)
+        if stats is not None:
+            return stats
+
+        queryset = self.profiles.filter(user__is_active=True).select_related('user')
+        send_stats = queryset.send_stats(start_date, end_date)
         stats = []
         for user_profile in queryset:
-            data = user_profile.send_stats(start_date, end_date)
+            data = send_stats[user_profile.id]
             data['id'] = user_profile.id
             data['name'] = user_profile.user.get_full_name()
             stats.append(data)
+        cache.set(cache_key, stats, timeout=60 * 3)  # Store stats for 3 minutes.
         return stats
 
     def cancel_subscription(self, subscription_cancellation=None):
@@ -60,6 +60,11 @@ class SiteSettings(SingletonModel):
     """
     direct_mail_drop_date_hours = models.IntegerField(default=48)
     smarty_streets_nightly_run_count = models.IntegerField(default=5000000)
+    braintree_transactions_synced_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Latest settlement of the braintree transactions that were synced.',
+    )
 
     class Meta:
         app_label = 'sherpa'
@@ -162,6 +162,34 @@ class UserModelTestCase(CompanyTwoMixin, CompanyOneMixin, NoDataBaseTestCase):
         stats = self.company2_user.profile.send_stats()
         self.assertEqual(stats['avg_response_time'], 2)
 
+    def test_send_stats_for_many_profiles(self):
+        users = [self.master_admin_user, self.company2_user]
+        for user in users:
+            mommy.make(
+                'sherpa.SMSMessage',
+                initial_message_sent_by_rep=user,
+                message_status='delivered',
+                _quantity=2,
+            )
+        mommy.make('sherpa.SMSMessage', initial_message_sent_by_rep=self.master_admin_user)
+        mommy.make(
+            'sherpa.Prospect',
+            qualified_lead_created_by=self.master_admin_user,
+            qualified_lead_dt=django_tz.now(),
+            _quantity=2,
+        )
+
+        profiles = UserProfile.objects.filter(user__in=users)
+        stats = profiles.send_stats()
+        for profile in profiles:
+            self.assertEqual(stats[profile.id], profile.send_stats())
+        self.assertEqual(stats[self.master_admin_user.profile.id]['attempts'], 3)
+        self.assertEqual(stats[self.master_admin_user.profile.id]['delivered'], 2)
+        self.assertEqual(stats[self.master_admin_user.profile.id]['leads_created'], 2)
+        self.assertEqual(stats[self.master_admin_user.profile.id]['lead_rate'], 100)
+        self.assertEqual(stats[self.company2_user.profile.id]['attempts'], 2)
+        self.assertEqual(stats[self.company2_user.profile.id]['leads_created'], 0)
+
 
 class AuthenticationAPITestCase(SitesMixin, AllUserRoleMixin, CompanyOneMixin, NoDataBaseTestCase):
 
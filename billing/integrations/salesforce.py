@@ -1,4 +1,5 @@
 from functools import lru_cache
+import logging
 
 import simple_salesforce
 
@@ -6,6 +7,8 @@ from django.conf import settings
 
 from ..models.product import Product
 
+logger = logging.getLogger(__name__)
+
 
 class Salesforce(simple_salesforce.Salesforce):
     """ An enhanced Salesforce client with some helper methods for our routine use.
@@ -17,6 +20,8 @@ class Salesforce(simple_salesforce.Salesforce):
     For more information:
     https://developer.salesforce.com/docs/atlas.en-us.api_rest.meta/api_rest/
     """
+    # Maximum records of an sObject Collections request.
+    collection_batch_size = 200
 
     @lru_cache(maxsize=None)
     def get_account_id_from_company_id(self, company_id):
@@ -26,6 +31,24 @@ class Salesforce(simple_salesforce.Salesforce):
         """
         return self.Account.get('Sherpa_Company_ID__c/' + str(company_id))['Id']
 
+    def upsert_records(self, sobject, external_id_field, records):
+        """ Upsert records of an sObject in batches through the sObject Collections API, instead
+        of one request per record.
+        Returns the list of results, in the same order as the records.
+        """
+        results = []
+        for start in range(0, len(records), self.collection_batch_size):
+            batch = [
+                {'attributes': {'type': sobject}, **record}
+                for record in records[start:start + self.collection_batch_size]
+            ]
+            results.extend(self.restful(
+                f'composite/sobjects/{sobject}/{external_id_field}',
+                method='PATCH',
+                json={'allOrNone': False, 'records': batch},
+            ))
+        return results
+
     def create_account_record_from_company(self, company, bt_subscription=None):
         """ Return a data dictionary formatted as a SF Account record. """
 
@@ -130,11 +153,12 @@ class Salesforce(simple_salesforce.Salesforce):
         """
         return self.Product2.get_by_custom_id('Product_Line_ID__c', product_id)
 
-    def upsert_opportunity_from_transaction(self, transaction, company_id, bt_subscription=None):
-        """ Given a transaction from Braintree, upsert an Opportunity to Salesforce.
+    def get_line_items_from_transaction(self, transaction):
+        """ Given a transaction from Braintree, get the products it paid for.
+        Returns a list of (product_id, quantity, unit_price) tuples, with the plan or primary
+        product first, and a set of the skus that are not supported. The list is empty if the
+        primary product is not supported.
         """
-        sf_account_id = self.get_account_id_from_company_id(company_id)
-
         # the transaction was tied to a plan via a subscription or
         # made via API call and indicated on a custom field "type"
         # if the transaction is for an invalid sku, skip it
@@ -147,21 +171,65 @@ class Salesforce(simple_salesforce.Salesforce):
         products_not_supported = set()
         if not primary_product_id:
             products_not_supported |= {sku}
-            return products_not_supported
+            return [], products_not_supported
+
+        # deal with add-ons and line items first...
+        # we need to deduct them to get the amount paid for the plan
+        transaction_amount = transaction.amount
+        add_on_line_items = []
+        for add_on in transaction.add_ons:
+            product_id = Product.get_id_from_sku(add_on.id)
+            if not product_id:
+                products_not_supported |= {add_on.id}
+                continue
+            transaction_amount -= add_on.quantity * add_on.amount
+            add_on_line_items.append((product_id, add_on.quantity, add_on.amount))
+
+        # no special treatment for discount... it comes off the plan
 
+        # we want the add ons to show up as line items 2+
+        line_items = [(primary_product_id, 1, transaction_amount)] + add_on_line_items
+        return line_items, products_not_supported
+
+    def create_opportunity_record_from_transaction(self, transaction, sf_account_id):
+        """ Return a data dictionary formatted as a SF Opportunity record. """
         created_date = str(transaction.created_at.date())
         name = ' '.join((sf_account_id, created_date, transaction.id))
-        transaction_amount = transaction.amount
-        data = {
+        return {
             'Name': name,
             'AccountId': sf_account_id,
-            'Amount': str(transaction_amount),
+            'Amount': str(transaction.amount),
             'CloseDate': created_date,
             'Pricebook2Id': '01s5Y000000TZWTQA4',  # Standard Price Book
             'StageName': 'Closed Won',
             # 'Probability': transaction.name,
             # 'Type': transaction.name,
         }
+
+    def create_opportunity_line_item_record(
+        self, opportunity_id, product_id, quantity, unit_price, created_date,
+    ):
+        """ Return a data dictionary formatted as a SF Opportunity Line Item record, without the
+        fields that can only be set when the line item is created.
+        """
+        product = self.get_product_from_product_id(product_id)
+        return {
+            'Quantity': quantity,
+            'UnitPrice': str(unit_price),
+            'ServiceDate': created_date,
+            'Description': product['Description'],
+            # 'TotalPrice': str(quantity*unit_price),
+        }
+
+    def upsert_opportunity_from_transaction(self, transaction, company_id, bt_subscription=None):
+        """ Given a transaction from Braintree, upsert an Opportunity to Salesforce.
+        """
+        sf_account_id = self.get_account_id_from_company_id(company_id)
+        line_items, products_not_supported = self.get_line_items_from_transaction(transaction)
+        if not line_items:
+            return products_not_supported
+
+        data = self.create_opportunity_record_from_transaction(transaction, sf_account_id)
         self.Opportunity.upsert(
             'Transaction_ID__c/' + str(transaction.id),
             data,
@@ -169,58 +237,88 @@ class Salesforce(simple_salesforce.Salesforce):
 
         # deal with line items
         opportunity_id = self.Opportunity.get('Transaction_ID__c/' + str(transaction.id))['Id']
-
-        # deal with add-ons and line items first...
-        # we need to deduct them to get the amount paid for the plan
-        add_ons_to_post_process = []
-        for add_on in transaction.add_ons:
-            product_id = Product.get_id_from_sku(add_on.id)
-            if not product_id:
-                products_not_supported |= {add_on.id}
-                continue
-            transaction_amount -= add_on.quantity * add_on.amount
-            add_ons_to_post_process.append(add_on)
-
-        for line_item in transaction.line_items:
-            print(line_item)
-
-        # no special treatment for discount... it comes off the plan
-
-        self.upsert_opportunity_line_item(
-            opportunity_id,
-            primary_product_id,
-            1,
-            transaction_amount,
-            created_date,
-        )
-
-        # we want the add ons to show up as line items 2+
-        for add_on in add_ons_to_post_process:
+        created_date = data['CloseDate']
+        for product_id, quantity, unit_price in line_items:
             self.upsert_opportunity_line_item(
                 opportunity_id,
                 product_id,
-                add_on.quantity,
-                add_on.amount,
+                quantity,
+                unit_price,
                 created_date,
             )
 
         return products_not_supported
 
+    def upsert_opportunities_from_transactions(self, transactions):
+        """ Given transactions from Braintree, upsert their Opportunities and Opportunity Line
+        Items to Salesforce in batches.
+
+        :param transactions: list of (transaction, company_id) tuples.
+        Returns the set of skus that are not supported.
+        """
+        products_not_supported = set()
+        opportunities = []
+        opportunity_line_items = []
+        for transaction, company_id in transactions:
+            line_items, not_supported = self.get_line_items_from_transaction(transaction)
+            products_not_supported |= not_supported
+            if not line_items:
+                continue
+
+            sf_account_id = self.get_account_id_from_company_id(company_id)
+            data = self.create_opportunity_record_from_transaction(transaction, sf_account_id)
+            data['Transaction_ID__c'] = str(transaction.id)
+            opportunities.append(data)
+            opportunity_line_items.append(line_items)
+
+        results = self.upsert_records('Opportunity', 'Transaction_ID__c', opportunities)
+
+        line_items = []
+        for opportunity, result, opportunity_items in zip(
+            opportunities, results, opportunity_line_items,
+        ):
+            if not result['success']:
+                logger.warning(
+                    f'Opportunity {opportunity["Transaction_ID__c"]} not synced: '
+                    f'{result["errors"]}',
+                )
+                continue
+            for product_id, quantity, unit_price in opportunity_items:
+                data = self.create_opportunity_line_item_record(
+                    result['id'], product_id, quantity, unit_price, opportunity['CloseDate'],
+                )
+                data['LineItemId__c'] = f'{result["id"]}_{product_id}'
+                line_items.append((data, result['id'], product_id))
+
+        # line items are updated first, the ones that don't exist yet fail because they need the
+        # fields that can only be set on creation
+        results = self.upsert_records(
+            'OpportunityLineItem', 'LineItemId__c', [data for data, _, _ in line_items])
+        new_line_items = []
+        for (data, opportunity_id, product_id), result in zip(line_items, results):
+            if result['success']:
+                continue
+            data['OpportunityId'] = opportunity_id
+            data['Product2Id'] = self.get_product_from_product_id(product_id)['Id']
+            new_line_items.append(data)
+        results = self.upsert_records('OpportunityLineItem', 'LineItemId__c', new_line_items)
+        for data, result in zip(new_line_items, results):
+            if not result['success']:
+                logger.warning(
+                    f'Opportunity line item {data["LineItemId__c"]} not synced: '
+                    f'{result["errors"]}',
+                )
+
+        return products_not_supported
+
     def upsert_opportunity_line_item(
         self, opportunity_id, product_id, quantity, unit_price, created_date,
     ):
         """ Given an OpportunityId in Salesforce, upsert an Opportunity Line Item.
         """
-
-        product = self.get_product_from_product_id(product_id)
-
-        data = {
-            'Quantity': quantity,
-            'UnitPrice': str(unit_price),
-            'ServiceDate': created_date,
-            'Description': product['Description'],
-            # 'TotalPrice': str(quantity*unit_price),
-        }
+        data = self.create_opportunity_line_item_record(
+            opportunity_id, product_id, quantity, unit_price, created_date,
+        )
 
         try:
             return self.OpportunityLineItem.update(
@@ -229,7 +327,7 @@ class Salesforce(simple_salesforce.Salesforce):
             )
         except simple_salesforce.SalesforceMalformedRequest:
             data['OpportunityId'] = opportunity_id
-            data['Product2Id'] = product['Id']
+            data['Product2Id'] = self.get_product_from_product_id(product_id)['Id']
             return self.OpportunityLineItem.upsert(
                 f'LineItemId__c/{opportunity_id}_{product_id}',
                 data,
@@ -1,50 +1,137 @@
+from datetime import timedelta
+from itertools import islice
+
 import braintree
 from celery import shared_task
+import pytz
 
-from sherpa.models import Company
+from sherpa.models import Company, SiteSettings
 from ..models import Gateway, Transaction
 
 
+class BraintreeTransactionSync:
+    """
+    Sync the settled braintree transactions of companies into sherpa `Transaction`s.
+
+    The sync is incremental: the latest settlement that was synced is kept in the site settings as
+    a high-water mark and each sync only searches the transactions settled since then, for all
+    customers at once. Transactions of all the companies with a braintree customer are synced,
+    whatever their subscription status, as the mark doesn't go back for companies that become
+    active later.
+    """
+    # Braintree can report a transaction as settled a while after its settlement time, so the
+    # search starts a bit before the last synced settlement. Duplicates are skipped.
+    overlap = timedelta(days=1)
+    batch_size = 500
+
+    def __init__(self, gateway=Gateway):
+        """
+        :param gateway: Braintree gateway used to search the transactions.
+        """
+        self.gateway = gateway
+
+    @property
+    def synced_until(self):
+        return SiteSettings.load().braintree_transactions_synced_until
+
+    @synced_until.setter
+    def synced_until(self, value):
+        site_settings = SiteSettings.load()
+        site_settings.braintree_transactions_synced_until = value
+        site_settings.save(update_fields=['braintree_transactions_synced_until'])
+
+    def search(self, since=None):
+        """
+        Return the settled braintree transactions of all customers, settled since the datetime.
+        """
+        criteria = [braintree.TransactionSearch.status == braintree.Transaction.Status.Settled]
+        if since:
+            # Braintree searches and returns naive datetimes in UTC.
+            since = since.astimezone(pytz.utc).replace(tzinfo=None)
+            criteria.append(braintree.TransactionSearch.settled_at >= since - self.overlap)
+        return self.gateway.transaction.search(*criteria).items
+
+    def sync(self):
+        """
+        Create the transactions that were settled since the last sync.
+
+        :return: The list of created `Transaction`s.
+        """
+        company_ids = dict(Company.objects.exclude(
+            braintree_id=None,
+        ).values_list('braintree_id', 'id'))
+
+        created = []
+        synced_until = self.synced_until
+        results = iter(self.search(synced_until))
+        while True:
+            batch = list(islice(results, self.batch_size))
+            if not batch:
+                break
+
+            for bt_transaction in batch:
+                settled = self.get_settled_at(bt_transaction)
+                if settled and (not synced_until or settled > synced_until):
+                    synced_until = settled
+
+            batch = [
+                bt_transaction for bt_transaction in batch
+                if bt_transaction.customer_details.id in company_ids
+            ]
+            existing = set(Transaction.objects.filter(
+                transaction_id__in=[bt_transaction.id for bt_transaction in batch],
+            ).values_list('transaction_id', flat=True))
+            transactions = [
+                self.build_transaction(
+                    bt_transaction,
+                    company_ids[bt_transaction.customer_details.id],
+                )
+                for bt_transaction in batch if bt_transaction.id not in existing
+            ]
+            created.extend(Transaction.objects.bulk_create(transactions))
+
+        if synced_until:
+            self.synced_until = synced_until
+        return created
+
+    @staticmethod
+    def get_settled_at(bt_transaction):
+        for status_history in bt_transaction.status_history:
+            if status_history.status == 'settled':
+                return status_history.timestamp.replace(tzinfo=pytz.utc)
+        return None
+
+    @staticmethod
+    def build_transaction(bt_transaction, company_id):
+        """
+        Return an unsaved `Transaction` with the data of a braintree transaction.
+        """
+        transaction = Transaction(
+            transaction_id=bt_transaction.id,
+            company_id=company_id,
+            created_with_sync=True,
+            type=Transaction.Type.UNKNOWN,
+        )
+        if bt_transaction.recurring:
+            transaction.type = Transaction.Type.SUBSCRIPTION
+
+        for status_history in bt_transaction.status_history:
+            # Loop through status history so that we can get settled and authorized.
+            if status_history.status == 'settled':
+                transaction.is_charged = True
+                transaction.dt_charged = status_history.timestamp
+                transaction.amount_charged = status_history.amount
+            if status_history.status == 'authorized':
+                transaction.is_authorized = True
+                transaction.dt_authorized = status_history.timestamp
+                transaction.amount_authorized = status_history.amount
+        return transaction
+
+
 @shared_task
 def sync_braintree_transactions():
     """
     Since we're storing all transactions in sherpa as well as braintree, we need to sync the
     transactions from braintree back into sherpa in case they have become inconsistent.
     """
-    company_list = Company.objects.filter(status='active').exclude(braintree_id=None)
-    completed = 0
-
-    for company in company_list:
-        braintree_id = company.braintree_id
-        search_results = Gateway.transaction.search(
-            braintree.TransactionSearch.customer_id == braintree_id,
-            braintree.TransactionSearch.status == braintree.Transaction.Status.Settled,
-        )
-        for transaction in search_results.items:
-            t, is_new = Transaction.objects.get_or_create(
-                transaction_id=transaction.id,
-                company=company,
-                defaults={'created_with_sync': True},
-            )
-
-            if not is_new:
-                continue
-
-            if transaction.recurring:
-                t.type = Transaction.Type.SUBSCRIPTION
-                t.subscription_id = transaction.subscription_id
-            else:
-                t.type = Transaction.Type.UNKNOWN
-
-            for status_history in transaction.status_history:
-                # Loop through status history so that we can get settled and authorized.
-                if status_history.status == 'settled':
-                    t.is_charged = True
-                    t.dt_charged = status_history.timestamp
-                    t.amount_charged = status_history.amount
-                if status_history.status == 'authorized':
-                    t.is_authorized = True
-                    t.dt_authorized = status_history.timestamp
-                    t.amount_authorized = status_history.amount
-            t.save()
-        completed += 1
+    BraintreeTransactionSync().sync()
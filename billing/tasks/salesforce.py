@@ -5,10 +5,12 @@ import braintree
 from celery import shared_task
 from celery.utils.log import get_task_logger
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
 
+from services.http import run_concurrently
 from sherpa.models import Company, UserProfile
 from ..integrations.braintree import gateway
 from ..integrations.salesforce import get_salesforce_client
@@ -53,6 +55,35 @@ def update_or_create_account_and_contacts(salesforce, company, bt_subscription=N
     return invalid_email_addresses
 
 
+def collect_settled_transactions(start_date, lookback, missing_companies):
+    """ Return the settled Braintree transactions of each day in the window, with their company.
+    Recurring transactions come first each day since they amend subscription data to the account.
+    The ids of transactions without a company are added to `missing_companies`.
+    """
+    planned = []
+    for dayN in range(lookback):
+        day = start_date + timedelta(days=dayN)
+        for source in (
+            braintree.Transaction.Source.Recurring,
+            braintree.Transaction.Source.Api,
+            braintree.Transaction.Source.ControlPanel,
+        ):
+            # get the transactions for the day and source
+            transactions = gateway.get_settled_transactions_for_date(
+                day,
+                braintree.TransactionSearch.source == source,
+                braintree.TransactionSearch.status == braintree.Transaction.Status.Settled,
+            )
+            logger.info(f'Collecting {len(transactions.ids)} {source} transactions for {day}')
+            for transaction in transactions:
+                company = get_companies_indexed_by_btid().get(transaction.customer['id'])
+                if not company:
+                    missing_companies.add(transaction.id)
+                    continue
+                planned.append((transaction, company))
+    return planned
+
+
 @shared_task(bind=True)
 def full_sync_to_salesforce(self, lookback=2, offset=0):
     """ Using Braintree and the database, assemble the data required to push to Salesforce.
@@ -87,55 +118,56 @@ def full_sync_to_salesforce(self, lookback=2, offset=0):
     companies_subscribed = set()
     companies_active = set()
 
-    def sync_transactions_to_salesforce(day, source):
-
-        # get the transactions for the day and source
-        transactions = gateway.get_settled_transactions_for_date(
-            day,
-            braintree.TransactionSearch.source == source,
-            braintree.TransactionSearch.status == braintree.Transaction.Status.Settled,
-        )
-        print(f'Processing {len(transactions.ids)} {source} transactions for '
-              f'{day}', end='', flush=True)
-        for (Nt, transaction) in enumerate(transactions, start=1):
-            print('.' if Nt % 10 else Nt, end='', flush=True)
-
-            # need to make sure the account exists and is upserted first
-            company = get_companies_indexed_by_btid().get(transaction.customer['id'])
-            if not company:
-                missing_companies.add(transaction.id)
-                continue
-
-            bt_subscription = gateway.get_subscription(transaction.subscription_id)
-
-            # skip disallowed subscriptions
-            if transaction.subscription_id and not bt_subscription:
-                invalid_subscriptions.add(transaction.id)
-                continue
-
-            # upsert account and contacts
-            invalid_email_addresses.update(
-                update_or_create_account_and_contacts(salesforce, company, bt_subscription))
-
-            # now create the opportunity and related line items
-            invalid_products.update(salesforce.upsert_opportunity_from_transaction(
-                transaction, company.pk, bt_subscription,
-            ))
-
-            companies_active.add(company.id)
-            if bt_subscription:
-                companies_subscribed.add(company.id)
-        print()
-
-    # process each day in the window
-    for dayN in range(lookback):
-        # process recurring first since that will amend subscription data to the account
-        for source in (
-            braintree.Transaction.Source.Recurring,
-            braintree.Transaction.Source.Api,
-            braintree.Transaction.Source.ControlPanel,
-        ):
-            sync_transactions_to_salesforce(start_date + timedelta(days=dayN), source)
+    # plan the sync: collect the transactions of the window with their companies first
+    planned = collect_settled_transactions(start_date, lookback, missing_companies)
+
+    # fetch each distinct subscription once, concurrently
+    gateway.get_active_plan_subscription_ids()
+    subscription_ids = {
+        transaction.subscription_id for transaction, _ in planned if transaction.subscription_id
+    }
+    run_concurrently(gateway.get_subscription, subscription_ids, settings.BRAINTREE_MAX_WORKERS)
+
+    # skip disallowed subscriptions and keep the first subscription of each company
+    companies = {}
+    subscriptions = {}
+    opportunities = []
+    for transaction, company in planned:
+        bt_subscription = gateway.get_subscription(transaction.subscription_id)
+        if transaction.subscription_id and not bt_subscription:
+            invalid_subscriptions.add(transaction.id)
+            continue
+
+        companies[company.pk] = company
+        if bt_subscription and company.pk not in subscriptions:
+            subscriptions[company.pk] = bt_subscription
+        opportunities.append((transaction, company.pk))
+
+        companies_active.add(company.id)
+        if bt_subscription:
+            companies_subscribed.add(company.id)
+
+    # upsert the account and contacts of each company once
+    def sync_company_to_salesforce(company):
+        return update_or_create_account_and_contacts(
+            salesforce, company, subscriptions.get(company.pk))
+
+    logger.info(f'Upserting {len(companies)} accounts')
+    for invalid in run_concurrently(
+            sync_company_to_salesforce,
+            companies.values(),
+            settings.SALESFORCE_MAX_WORKERS,
+    ):
+        invalid_email_addresses.update(invalid)
+
+    # now create the opportunities and related line items
+    logger.info(f'Upserting {len(opportunities)} opportunities')
+    run_concurrently(
+        salesforce.get_account_id_from_company_id,
+        companies,
+        settings.SALESFORCE_MAX_WORKERS,
+    )
+    invalid_products.update(salesforce.upsert_opportunities_from_transactions(opportunities))
 
     logger.info(f'Transactions skipped for invalid email addresses: {len(invalid_email_addresses)}')
     logger.info(f'Transactions skipped for missing companies: {len(missing_companies)}')
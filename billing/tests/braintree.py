@@ -1,9 +1,15 @@
-from datetime import date
+from datetime import date, datetime
 import logging
+from types import SimpleNamespace
 
-from sherpa.tests import NoDataBaseTestCase
+from model_mommy import mommy
+import pytz
+
+from sherpa.models import Company, SiteSettings
+from sherpa.tests import CompanyOneMixin, NoDataBaseTestCase
 from ..integrations.braintree import allowed_skus, gateway
-from ..models import product
+from ..models import product, Transaction
+from ..tasks.braintree import BraintreeTransactionSync
 
 logging.disable(logging.CRITICAL)
 
@@ -52,3 +58,77 @@ class BraintreeGatewayTestCase(NoDataBaseTestCase):
         valid_date = date(2021, 8, 9)
         settled_transactions = gateway.get_settled_transactions_for_date(valid_date)
         self.assertTrue(len(settled_transactions.ids) > 0)
+
+
+class FakeTransactionGateway:
+    """
+    Braintree transaction gateway that returns the given transactions on each search.
+    """
+    def __init__(self, transactions):
+        self.transactions = transactions
+        self.searches = []
+
+    def search(self, *criteria):
+        self.searches.append(criteria)
+        return SimpleNamespace(items=iter(self.transactions))
+
+
+def make_bt_transaction(transaction_id, customer_id, settled_at, amount=10, recurring=False):
+    return SimpleNamespace(
+        id=transaction_id,
+        recurring=recurring,
+        customer_details=SimpleNamespace(id=customer_id),
+        status_history=[
+            SimpleNamespace(status='authorized', timestamp=settled_at, amount=amount),
+            SimpleNamespace(status='settled', timestamp=settled_at, amount=amount),
+        ],
+    )
+
+
+class BraintreeTransactionSyncTestCase(CompanyOneMixin, NoDataBaseTestCase):
+
+    def setUp(self):
+        SiteSettings.objects.all().delete()
+        self.transactions = FakeTransactionGateway([
+            make_bt_transaction('abc1', self.company1.braintree_id, datetime(2021, 8, 9)),
+            make_bt_transaction(
+                'abc2', self.company1.braintree_id, datetime(2021, 8, 10), recurring=True),
+            make_bt_transaction('abc3', 'unknown', datetime(2021, 8, 11)),
+        ])
+        self.sync = BraintreeTransactionSync(SimpleNamespace(transaction=self.transactions))
+
+    def test_sync_creates_new_transactions(self):
+        mommy.make('billing.Transaction', company=self.company1, transaction_id='abc1')
+
+        created = self.sync.sync()
+        self.assertEqual([transaction.transaction_id for transaction in created], ['abc2'])
+        transaction = Transaction.objects.get(transaction_id='abc2')
+        self.assertEqual(transaction.company, self.company1)
+        self.assertEqual(transaction.type, Transaction.Type.SUBSCRIPTION)
+        self.assertTrue(transaction.is_charged)
+        self.assertTrue(transaction.created_with_sync)
+        self.assertFalse(Transaction.objects.filter(transaction_id='abc3').exists())
+
+        # Syncing again doesn't duplicate the transactions.
+        self.assertEqual(self.sync.sync(), [])
+        self.assertEqual(Transaction.objects.filter(transaction_id='abc2').count(), 1)
+
+    def test_sync_searches_since_last_settlement(self):
+        self.sync.sync()
+        self.assertEqual(len(self.transactions.searches[0]), 1)
+        self.assertEqual(self.sync.synced_until, datetime(2021, 8, 11, tzinfo=pytz.utc))
+
+        self.sync.sync()
+        self.assertEqual(len(self.transactions.searches[1]), 2)
+
+    def test_sync_inactive_companies(self):
+        # Transactions of inactive companies are synced, as they wouldn't be searched again once
+        # the companies are active.
+        self.company1.subscription_status = Company.SubscriptionStatus.PAUSED
+        self.company1.save(update_fields=['subscription_status'])
+
+        created = self.sync.sync()
+        self.assertEqual(
+            sorted(transaction.transaction_id for transaction in created),
+            ['abc1', 'abc2'],
+        )
@@ -0,0 +1,133 @@
+from datetime import datetime
+from decimal import Decimal
+import logging
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from ..integrations.salesforce import Salesforce
+
+
+class FakeSalesforce(Salesforce):
+    """
+    Salesforce client that answers the sObject Collections requests without calling the API.
+
+    Opportunities of the `failing` transactions can't be saved, and line items can only be
+    updated when they are `existing`, the same as Salesforce requires the fields that can only be
+    set on creation for new line items.
+    """
+    collection_batch_size = 2
+
+    def __init__(self, failing=(), existing=()):
+        self.failing = set(failing)
+        self.existing = set(existing)
+        self.requests = []
+
+    def get_account_id_from_company_id(self, company_id):
+        return f'account{company_id}'
+
+    def get_product_from_product_id(self, product_id):
+        return {'Id': f'product{product_id}', 'Description': f'Product {product_id}'}
+
+    def restful(self, path, method='GET', json=None, **kwargs):
+        records = json['records']
+        self.requests.append((path, records))
+        results = []
+        for record in records:
+            if 'Transaction_ID__c' in record:
+                external_id = record['Transaction_ID__c']
+                success = external_id not in self.failing
+                record_id = f'opportunity_{external_id}'
+            else:
+                external_id = record['LineItemId__c']
+                success = external_id in self.existing or 'OpportunityId' in record
+                record_id = f'line_item_{external_id}'
+            results.append({
+                'id': record_id if success else None,
+                'success': success,
+                'errors': [] if success else [{'message': 'Failed'}],
+            })
+        return results
+
+
+def make_bt_transaction(transaction_id, add_ons=()):
+    return SimpleNamespace(
+        id=transaction_id,
+        plan_id='core',
+        custom_fields=None,
+        amount=Decimal('100'),
+        add_ons=[
+            SimpleNamespace(id=add_on, quantity=1, amount=Decimal('10')) for add_on in add_ons
+        ],
+        created_at=datetime(2021, 8, 9),
+    )
+
+
+class SalesforceOpportunitiesTestCase(SimpleTestCase):
+
+    def setUp(self):
+        # Other billing tests disable logging.
+        self.addCleanup(logging.disable, logging.root.manager.disable)
+        logging.disable(logging.NOTSET)
+
+    def test_upsert_opportunities_from_transactions(self):
+        salesforce = FakeSalesforce(
+            failing={'t2'},
+            existing={'opportunity_t1_2'},
+        )
+        with self.assertLogs('billing.integrations.salesforce', logging.WARNING) as logs:
+            not_supported = salesforce.upsert_opportunities_from_transactions([
+                (make_bt_transaction('t1', add_ons=['additional_market']), 1),
+                (make_bt_transaction('t2'), 1),
+                (make_bt_transaction('t3', add_ons=['unknown_add_on']), 2),
+            ])
+        self.assertEqual(not_supported, {'unknown_add_on'})
+
+        # Records are sent in batches of `collection_batch_size`.
+        paths = [path for path, _ in salesforce.requests]
+        self.assertEqual(paths, [
+            'composite/sobjects/Opportunity/Transaction_ID__c',
+            'composite/sobjects/Opportunity/Transaction_ID__c',
+            'composite/sobjects/OpportunityLineItem/LineItemId__c',
+            'composite/sobjects/OpportunityLineItem/LineItemId__c',
+            'composite/sobjects/OpportunityLineItem/LineItemId__c',
+        ])
+        self.assertEqual(
+            [[record['Transaction_ID__c'] for record in records]
+             for records in [records for _, records in salesforce.requests[:2]]],
+            [['t1', 't2'], ['t3']],
+        )
+
+        # Line items of the failed opportunity are skipped, and the line items that don't exist
+        # are created after the update fails.
+        updated = salesforce.requests[2][1] + salesforce.requests[3][1]
+        self.assertEqual([record['LineItemId__c'] for record in updated], [
+            'opportunity_t1_2',
+            'opportunity_t1_5',
+            'opportunity_t3_2',
+        ])
+        self.assertNotIn('OpportunityId', updated[0])
+        created = salesforce.requests[4][1]
+        self.assertEqual(
+            [(record['LineItemId__c'], record['OpportunityId'], record['Product2Id'])
+             for record in created],
+            [
+                ('opportunity_t1_5', 'opportunity_t1', 'product5'),
+                ('opportunity_t3_2', 'opportunity_t3', 'product2'),
+            ],
+        )
+        self.assertEqual(created[0]['UnitPrice'], '10')
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('Opportunity t2 not synced', logs.output[0])
+
+    def test_failed_line_items_are_logged(self):
+        salesforce = FakeSalesforce()
+        salesforce.restful = lambda path, method='GET', json=None: [
+            {'id': 'opportunity_t1', 'success': True, 'errors': []},
+        ] if 'Opportunity/' in path else [
+            {'id': None, 'success': False, 'errors': [{'message': 'Failed'}]},
+        ]
+        with self.assertLogs('billing.integrations.salesforce', logging.WARNING) as logs:
+            salesforce.upsert_opportunities_from_transactions([(make_bt_transaction('t1'), 1)])
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('Opportunity line item opportunity_t1_2 not synced', logs.output[0])
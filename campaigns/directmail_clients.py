@@ -7,6 +7,8 @@ from django.conf import settings
 from django.contrib.sites.models import Site
 from django.urls import reverse
 
+from services.http import build_session
+
 
 YELLOW_LETTER_DETAILS_CONFIG = {
     'product': '1',
@@ -301,6 +303,15 @@ class AccuTraceClient:
     api_base = f"https://{api_prefix}.iaccutrace.com/servoy-service/rest_ws/mod_rest"
     api_report_base = url = f'{api_base}/ws_job_reports'
 
+    def __init__(self, session=None, timeout=None):
+        """
+        :param session: `requests.Session` shared by the threads refreshing the tracking.
+        :param timeout: Seconds to wait for AccuTrace to respond.
+        """
+        self.session = session or build_session(
+            pool_size=settings.DIRECTMAIL_TRACKING_MAX_WORKERS)
+        self.timeout = timeout or settings.ACCUTRACE_TIMEOUT
+
     def get_status(self, tracking_url):
         """
         Get status for specified job.
@@ -309,7 +320,10 @@ class AccuTraceClient:
         """
         uid = tracking_url.split('uid=')[1]
         url = f'{self.api_base}/ws_jobs/{uid}/'
-        job_data = requests.get(url)
+        try:
+            job_data = self.__get(url)
+        except requests.RequestException:
+            return DirectMailStatusResponse(error='Could not get job id')
 
         if not job_data.status_code == 200 and not job_data.json().get('jobs'):
             return DirectMailStatusResponse(error='Could not get job id')
@@ -317,8 +331,10 @@ class AccuTraceClient:
         job_id = job_data.json().get('jobs')[0].get('job_id')
 
         url = f'{self.api_report_base}/{uid}/jobId={job_id}&reportNumber=2&level=1&getDataSet=true'
-        response = requests.get(url)
-        error, data = self.__validate_response(response)
+        try:
+            error, data = self.__validate_response(self.__get(url))
+        except requests.RequestException:
+            error, data = "Could not get tracking information.", None
 
         if error:
             return DirectMailStatusResponse(error=error)
@@ -356,10 +372,10 @@ class AccuTraceClient:
         :job_id: Job ID to query specific job
         """
         status = ['Early', 'On Time', 'Late']
-        results = TrackingDetailResponse()
+        results = TrackingDetailResponse(data=[])
         for stat in status:
             current_resp = self.__get_by_status(job_id, stat, 2, 2)
-            results.data.extend(current_resp.data)
+            results.data.extend(current_resp.data or [])
             results.error = current_resp.error if current_resp.error else results.error
         return results
 
@@ -376,14 +392,20 @@ class AccuTraceClient:
         url = f'{self.api_report_base}jobId={job_id}&reportNumber={report}&level={level}' \
               f'&getDataSet=true&{status_name}={status}'
 
-        error, data = self.__validate_response(requests.get(url))
+        try:
+            error, data = self.__validate_response(self.__get(url))
+        except requests.RequestException:
+            error, data = "Could not get tracking information.", None
         if error:
             return TrackingDetailResponse(error=error)
 
         return TrackingDetailResponse(
-            data=[{'barcode': x[0], 'imd': x[1]} for x in data.get('dataset').get('rows')],
+            data=[{'barcode': x[0], 'imb': x[1]} for x in data.get('dataset').get('rows')],
         )
 
+    def __get(self, url):
+        return self.session.get(url, timeout=self.timeout)
+
     @staticmethod
     def __validate_response(response):
         """
@@ -391,7 +413,7 @@ class AccuTraceClient:
         """
 
         if response.status_code != 200:
-            return "Count not get tracking information.", None
+            return "Could not get tracking information.", None
 
         data = response.json().get('data')
         if not data or not data.get('dataset') or not data.get('dataset').get('rows'):
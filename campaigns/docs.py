@@ -32,6 +32,12 @@ batch_prospects_params = [
         description="Id of the sms template to use for batch prospects.",
         type=openapi.TYPE_NUMBER,
     ),
+    openapi.Parameter(
+        'after',
+        openapi.IN_QUERY,
+        description="Id of the last campaign prospect of the previous page.",
+        type=openapi.TYPE_NUMBER,
+    ),
 ]
 
 start_upload_params = [
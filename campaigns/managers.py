@@ -1,7 +1,35 @@
-from django.db.models import Q, Sum
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Count, F, Q, Sum
 
 from core import models
 
+# Upsert the daily stats of many campaigns at once from arrays of the stats of each campaign.
+UPSERT_DAILY_STATS_SQL = """
+INSERT INTO {table} (campaign_id, date, {fields})
+SELECT campaign_id, %(date)s, {fields}
+FROM unnest(%(campaign_id)s::integer[], {arrays}) AS stats (campaign_id, {fields})
+ON CONFLICT (campaign_id, date) DO UPDATE SET {updates};
+"""
+
+ROLLUP_PERIOD_STATS_SQL = """
+INSERT INTO {table} (campaign_id, period, date, {fields})
+SELECT campaign_id, %(period)s, date_trunc(%(period)s, date)::date, {sums}
+FROM {daily_table}
+WHERE campaign_id = ANY(%(campaign_id)s) AND date >= %(start)s AND date < %(end)s
+GROUP BY 1, 2, 3
+ON CONFLICT (campaign_id, period, date) DO UPDATE SET {updates};
+"""
+
+UPSERT_TRACKING_BY_PIECE_SQL = """
+INSERT INTO {table} (order_id, tracking_imb, tracking_barcode, status)
+SELECT %(order_id)s, tracking_imb, tracking_barcode, status
+FROM unnest(%(tracking_imb)s::varchar[], %(tracking_barcode)s::varchar[], %(status)s::varchar[])
+    AS pieces (tracking_imb, tracking_barcode, status)
+ON CONFLICT (order_id, tracking_barcode, status) DO UPDATE SET tracking_imb = EXCLUDED.tracking_imb;
+"""
+
 
 class CampaignManager(models.Manager):
     def has_access(self, user):
@@ -36,6 +64,8 @@ class CampaignManager(models.Manager):
 
 
 class CampaignDailyStatsManager(models.Manager):
+    stat_fields = ['new_leads', 'skipped', 'delivered', 'sent', 'auto_dead', 'responses']
+
     def summary(self, campaign, start_date=None, end_date=None):
         """
         Get the aggregated summary stats for a given campaign in a date range and return a queryset
@@ -63,6 +93,236 @@ class CampaignDailyStatsManager(models.Manager):
             responses=Sum('responses'),
         )
 
+    def rollup(self, date, campaigns):
+        """
+        Create or update the daily stats of the campaigns for the given date.
+
+        Each stat is calculated for all the campaigns at once, grouped by campaign, rather than per
+        campaign.
+
+        :param date Date: The date to calculate the stats of.
+        :param campaigns: Queryset of the `Campaign`s to calculate the stats of.
+        :return: The amount of campaigns whose stats were saved.
+        """
+        from sherpa.models import Activity, CampaignProspect, SMSMessage, StatsBatch
+        from .models import InitialResponse
+
+        campaign_ids = list(campaigns.values_list('id', flat=True))
+        if not campaign_ids:
+            return 0
+        stats = {campaign_id: dict.fromkeys(self.stat_fields, 0) for campaign_id in campaign_ids}
+
+        def add_stats(rows):
+            for row in rows:
+                campaign_id = row.pop('campaign_id')
+                stats[campaign_id].update({field: value or 0 for field, value in row.items()})
+
+        add_stats(SMSMessage.objects.filter(
+            campaign__in=campaigns,
+            dt__date=date,
+        ).order_by().values('campaign_id').annotate(
+            sent=Count('id'),
+            delivered=Count('id', filter=Q(message_status='delivered')),
+        ))
+
+        # Direct mail campaigns don't include the prospects that were removed from them.
+        add_stats(CampaignProspect.objects.filter(
+            Q(campaign__is_direct_mail=False) | Q(removed_datetime__isnull=True),
+            campaign__in=campaigns,
+            prospect__activity__title__in=[
+                Activity.Title.ADDED_QUALIFIED,
+                Activity.Title.ADDED_AUTODEAD,
+            ],
+            prospect__activity__date_utc__date=date,
+        ).order_by().values('campaign_id').annotate(
+            new_leads=Count(
+                'prospect__activity',
+                filter=Q(prospect__activity__title=Activity.Title.ADDED_QUALIFIED),
+                distinct=True,
+            ),
+            auto_dead=Count(
+                'prospect__activity',
+                filter=Q(prospect__activity__title=Activity.Title.ADDED_AUTODEAD),
+                distinct=True,
+            ),
+        ))
+
+        add_stats(InitialResponse.objects.filter(
+            campaign__in=campaigns,
+            created__date=date,
+        ).order_by().values('campaign_id').annotate(responses=Count('id')))
+
+        # Same as `StatsBatch.total_skipped`.
+        skipped_fields = [
+            'skipped_has_previous_response',
+            'skipped_msg_threshold_days',
+            'skipped_internal_dnc',
+            'skipped_litigator',
+            'skipped_opted_out',
+            'skipped_att',
+            'skipped_wrong_number',
+            'skipped_force',
+            'skipped_verizon',
+        ]
+        total_skipped = sum((F(field) for field in skipped_fields[1:]), F(skipped_fields[0]))
+        add_stats(StatsBatch.objects.filter(
+            campaign__in=campaigns,
+            last_send_utc__date=date,
+        ).order_by().values('campaign_id').annotate(skipped=Sum(total_skipped)))
+
+        self.upsert(date, stats)
+        return len(stats)
+
+    def upsert(self, date, stats):
+        """
+        Create or update the daily stats of many campaigns with a single query.
+
+        :param date Date: The date of the stats.
+        :param stats dict: The stats of each campaign, by campaign id.
+        """
+        sql = UPSERT_DAILY_STATS_SQL.format(
+            table=self.model._meta.db_table,
+            fields=', '.join(self.stat_fields),
+            arrays=', '.join(f'%({field})s::integer[]' for field in self.stat_fields),
+            updates=', '.join(f'{field} = EXCLUDED.{field}' for field in self.stat_fields),
+        )
+        params = {'date': date, 'campaign_id': list(stats)}
+        for field in self.stat_fields:
+            params[field] = [campaign_stats[field] for campaign_stats in stats.values()]
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+        from .models import CampaignPeriodStats
+        CampaignPeriodStats.objects.rollup(date, list(stats))
+
+    def meta_stats(self, campaigns, start_date, end_date):
+        """
+        Return the stats of each campaign with daily stats in the date range, summed over the
+        range, along with the campaign's id and name.
+
+        Whole weeks and months in the range are read from their rollups in `CampaignPeriodStats`
+        rather than from every daily row.
+
+        :param campaigns: Queryset of the `Campaign`s to get the stats of.
+        :param start_date Date: First date of the range.
+        :param end_date Date: Last date of the range.
+        :return list[dict]: The stats of each campaign.
+        """
+        from .models import CampaignPeriodStats
+
+        days, weeks, months = CampaignPeriodStats.objects.split_range(start_date, end_date)
+        sources = []
+        if days:
+            sources.append(self.filter(date__in=days))
+        if weeks:
+            sources.append(CampaignPeriodStats.objects.filter(
+                period=CampaignPeriodStats.Period.WEEK,
+                date__in=weeks,
+            ))
+        if months:
+            sources.append(CampaignPeriodStats.objects.filter(
+                period=CampaignPeriodStats.Period.MONTH,
+                date__in=months,
+            ))
+
+        stats = {}
+        for queryset in sources:
+            rows = queryset.filter(campaign__in=campaigns).values(
+                'campaign_id',
+                'campaign__name',
+            ).annotate(**{f'total_{field}': Sum(field) for field in self.stat_fields})
+            for row in rows:
+                campaign_stats = stats.setdefault(row['campaign_id'], {
+                    'campaign': {'id': row['campaign_id'], 'name': row['campaign__name']},
+                    **dict.fromkeys(self.stat_fields, 0),
+                })
+                for field in self.stat_fields:
+                    campaign_stats[field] += row[f'total_{field}'] or 0
+
+        def rate(value, total):
+            return value / total * 100 if total else 0
+
+        for campaign_stats in stats.values():
+            campaign_stats.update({
+                'response_rate': rate(campaign_stats['responses'], campaign_stats['delivered']),
+                'delivery_rate': rate(campaign_stats['delivered'], campaign_stats['sent']),
+                'performance_rating': rate(campaign_stats['new_leads'], campaign_stats['sent']),
+            })
+        return [stats[campaign_id] for campaign_id in sorted(stats)]
+
+
+class CampaignPeriodStatsManager(models.Manager):
+    def split_range(self, start_date, end_date):
+        """
+        Split a date range into the whole months, the whole weeks outside of those months and the
+        remaining days.
+
+        :return tuple: Lists of the days, the first day of the weeks and the first day of the
+                       months in the range.
+        """
+        days, weeks, months = [], [], []
+        current = start_date
+        while current <= end_date:
+            next_month = self.get_period_end(self.model.Period.MONTH, current)
+            if current.day == 1 and next_month - timedelta(days=1) <= end_date:
+                months.append(current)
+                current = next_month
+            elif current.weekday() == 0 and current + timedelta(days=6) <= end_date:
+                weeks.append(current)
+                current += timedelta(days=7)
+            else:
+                days.append(current)
+                current += timedelta(days=1)
+        return days, weeks, months
+
+    def get_period_start(self, period, date):
+        """
+        Return the first day of the week (monday) or month that includes the date.
+        """
+        if period == self.model.Period.WEEK:
+            return date - timedelta(days=date.weekday())
+        return date.replace(day=1)
+
+    def get_period_end(self, period, date):
+        """
+        Return the first day after the week or month that includes the date.
+        """
+        start = self.get_period_start(period, date)
+        if period == self.model.Period.WEEK:
+            return start + timedelta(days=7)
+        return (start + timedelta(days=31)).replace(day=1)
+
+    def rollup(self, date, campaign_ids):
+        """
+        Recalculate the stats of the weeks and months that include the date from the daily stats
+        of the campaigns.
+
+        :param date Date: A date whose daily stats have changed.
+        :param campaign_ids list: Ids of the campaigns whose daily stats have changed.
+        """
+        from .models import CampaignDailyStats
+
+        if not campaign_ids:
+            return
+
+        stat_fields = CampaignDailyStats.objects.stat_fields
+        sql = ROLLUP_PERIOD_STATS_SQL.format(
+            table=self.model._meta.db_table,
+            daily_table=CampaignDailyStats._meta.db_table,
+            fields=', '.join(stat_fields),
+            sums=', '.join(f'SUM({field})' for field in stat_fields),
+            updates=', '.join(f'{field} = EXCLUDED.{field}' for field in stat_fields),
+        )
+        with connection.cursor() as cursor:
+            for period, _ in self.model.Period.CHOICES:
+                cursor.execute(sql, {
+                    'period': period,
+                    'campaign_id': campaign_ids,
+                    'start': self.get_period_start(period, date),
+                    'end': self.get_period_end(period, date),
+                })
+
 
 class DirectMailCampaignManager(models.Manager):
     def create(self, *args, **kwargs):
@@ -75,3 +335,29 @@ class DirectMailCampaignManager(models.Manager):
             campaign.save(update_fields=['is_direct_mail'])
 
         return super(DirectMailCampaignManager, self).create(*args, **kwargs)
+
+
+class DirectMailTrackingByPieceManager(models.Manager):
+    def upsert(self, order, pieces):
+        """
+        Create or update the tracking of many mail pieces of an order with a single query.
+
+        :param order DirectMailOrder: The order the pieces belong to.
+        :param pieces list: Dicts with the `imb`, `barcode` and `status` of each piece.
+        """
+        # A statement can't update the same row twice, so only the last imb of a piece is kept.
+        tracking = {
+            (piece['barcode'], piece['status']): piece['imb'] for piece in pieces
+        }
+        if not tracking:
+            return
+
+        params = {
+            'order_id': order.pk,
+            'tracking_imb': list(tracking.values()),
+            'tracking_barcode': [barcode for barcode, _ in tracking],
+            'status': [status for _, status in tracking],
+        }
+        sql = UPSERT_TRACKING_BY_PIECE_SQL.format(table=self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
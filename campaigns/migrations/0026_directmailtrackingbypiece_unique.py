@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0025_directmailtrackingbypiece'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='directmailtrackingbypiece',
+            unique_together={('order', 'tracking_barcode', 'status')},
+        ),
+    ]
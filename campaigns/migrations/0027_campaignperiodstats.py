@@ -0,0 +1,43 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+BACKFILL_PERIOD_STATS_SQL = """
+INSERT INTO campaigns_campaignperiodstats (
+    campaign_id, period, date, new_leads, skipped, delivered, sent, auto_dead, responses
+)
+SELECT
+    campaign_id, period, date_trunc(period, date)::date, SUM(new_leads), SUM(skipped),
+    SUM(delivered), SUM(sent), SUM(auto_dead), SUM(responses)
+FROM campaigns_campaigndailystats, unnest(ARRAY['week', 'month']) AS period
+GROUP BY 1, 2, 3;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sherpa', '0187_prospect_search_trgm_indexes'),
+        ('campaigns', '0026_directmailtrackingbypiece_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignPeriodStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Week'), ('month', 'Month')], max_length=8)),
+                ('date', models.DateField()),
+                ('new_leads', models.PositiveIntegerField()),
+                ('skipped', models.PositiveIntegerField()),
+                ('delivered', models.PositiveIntegerField()),
+                ('sent', models.PositiveIntegerField()),
+                ('auto_dead', models.PositiveIntegerField()),
+                ('responses', models.PositiveIntegerField()),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sherpa.Campaign')),
+            ],
+            options={
+                'unique_together': {('campaign', 'period', 'date')},
+            },
+        ),
+        migrations.RunSQL(BACKFILL_PERIOD_STATS_SQL, migrations.RunSQL.noop),
+    ]
@@ -1,4 +1,6 @@
-from .analytics import CampaignAggregatedStats, CampaignDailyStats, DirectMailCampaignStats
+from .analytics import (
+    CampaignAggregatedStats, CampaignDailyStats, CampaignPeriodStats, DirectMailCampaignStats,
+)
 from .autodeaddetection import AutoDeadDetection
 from .campaigndata import CampaignIssue, CampaignNote, CampaignTag, InitialResponse
 from .directmail import (
@@ -8,9 +10,9 @@ from .directmail import (
 )
 
 __all__ = (
-    'AutoDeadDetection', 'CampaignAggregatedStats', 'CampaignDailyStats', 'DirectMailCampaignStats',
-    'CampaignIssue', 'CampaignNote', 'CampaignTag', 'DirectMailCampaign', 'DirectMailOrder',
-    'DirectMailOrderStatus', 'DirectMailProvider', 'DirectMailResponse', 'DirectMailReturnAddress',
-    'DirectMailStatusResponse', 'DirectMailTracking', 'DirectMailTrackingByPiece',
-    'InitialResponse',
+    'AutoDeadDetection', 'CampaignAggregatedStats', 'CampaignDailyStats', 'CampaignPeriodStats',
+    'DirectMailCampaignStats', 'CampaignIssue', 'CampaignNote', 'CampaignTag',
+    'DirectMailCampaign', 'DirectMailOrder', 'DirectMailOrderStatus', 'DirectMailProvider',
+    'DirectMailResponse', 'DirectMailReturnAddress', 'DirectMailStatusResponse',
+    'DirectMailTracking', 'DirectMailTrackingByPiece', 'InitialResponse',
 )
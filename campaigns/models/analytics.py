@@ -1,5 +1,8 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
 from core import models
-from ..managers import CampaignDailyStatsManager
+from ..managers import CampaignDailyStatsManager, CampaignPeriodStatsManager
 
 
 class CampaignDailyStats(models.Model):
@@ -21,6 +24,47 @@ class CampaignDailyStats(models.Model):
         unique_together = ('campaign', 'date')
 
 
+class CampaignPeriodStats(models.Model):
+    """
+    Weekly and monthly rollups of the campaigns' daily stats, so that long date ranges don't need
+    to aggregate every daily row. Kept up to date when the daily stats are saved.
+    """
+    class Period:
+        WEEK = 'week'
+        MONTH = 'month'
+
+        CHOICES = (
+            (WEEK, 'Week'),
+            (MONTH, 'Month'),
+        )
+
+    campaign = models.ForeignKey('sherpa.Campaign', on_delete=models.CASCADE)
+    period = models.CharField(max_length=8, choices=Period.CHOICES)
+    # First day of the week (monday) or month.
+    date = models.DateField()
+    new_leads = models.PositiveIntegerField()
+    skipped = models.PositiveIntegerField()
+    delivered = models.PositiveIntegerField()
+    sent = models.PositiveIntegerField()
+    auto_dead = models.PositiveIntegerField()
+    responses = models.PositiveIntegerField()
+
+    objects = CampaignPeriodStatsManager()
+
+    class Meta:
+        unique_together = ('campaign', 'period', 'date')
+
+
+@receiver(post_save, sender=CampaignDailyStats)
+def campaign_daily_stats_post_save(sender, instance, raw, *args, **kwargs):
+    """
+    Keep the weekly and monthly rollups up to date with daily stats saved one by one.
+    """
+    if raw:
+        return
+    CampaignPeriodStats.objects.rollup(instance.date, [instance.campaign_id])
+
+
 class CampaignAggregatedStats(models.Model):
     """
     Total aggregated stats for campaigns.
@@ -1,3 +1,4 @@
+from collections import defaultdict
 from datetime import datetime, timedelta
 from decimal import Decimal
 from importlib import import_module
@@ -25,6 +26,7 @@ from accounts.models.company import Company
 from billing.models.product import ADDITIONAL_MARKET
 from campaigns.managers import CampaignManager
 from companies.models import UploadBaseModel
+from companies.reference import get_lead_stage
 from core import models
 from core.mixins import SortOrderModelMixin
 from core.utils import clean_phone, number_display
@@ -34,9 +36,10 @@ from prospects.managers import ProspectManager
 from sherpa.abstracts import AbstractNote
 from sherpa.utils import sign_street_view_url
 from skiptrace.models import SkipTraceProperty, UploadSkipTrace
-from sms import OPT_OUT_LANGUAGE, OPT_OUT_LANGUAGE_TWILIO, TAG_MAPPINGS
 from sms.clients import get_client, TelnyxClient
-from sms.utils import fetch_phonenumber_info, get_tags
+from sms.renderer import get_opt_out_language, get_renderer
+from sms.routing import InboundRoutes
+from sms.utils import fetch_phonenumber_info
 
 __all__ = (
     'Activity', 'AreaCodeState', 'Campaign', 'CampaignAccess', 'CampaignProspect', 'InternalDNC',
@@ -441,8 +444,14 @@ class Market(models.Model):
         Phone numbers should not send out more than 100 numbers or they have a higher chance of
         being marked as spam.
         """
+        from markets.capacity import SendCapacity
+        return SendCapacity(self.company).get_limit(self)
+
+    def calculate_send_sms_daily_limit(self):
+        """
+        Calculate the daily limit of initial bulk sends from the market's active phone numbers.
+        """
         from sherpa.models import PhoneNumber
-        phone_numbers = PhoneNumber.objects.filter(market=self, status=PhoneNumber.Status.ACTIVE)
         limit_per_phone = settings.MESSAGES_PER_PHONE_PER_DAY
         if self.phone_provider == Provider.TWILIO:
             limit_per_phone = settings.MESSAGES_PER_PHONE_PER_DAY_TWILIO
@@ -451,17 +460,23 @@ class Market(models.Model):
         # conduct our test.
         if self.phone_provider == Provider.INTELIQUENT:
             return 9999999999
-        return phone_numbers.count() * limit_per_phone
+
+        # Lists of campaigns annotate the count of all their markets with one query.
+        active_phone_count = getattr(self, 'active_phone_count', None)
+        if active_phone_count is None:
+            active_phone_count = PhoneNumber.objects.filter(
+                market=self,
+                status=PhoneNumber.Status.ACTIVE,
+            ).count()
+        return active_phone_count * limit_per_phone
 
     @property
     def total_sends_available(self):
         """
         Companies may only send a certain amount of messages per day to a market.
         """
-        if self.total_intial_sms_sent_today_count >= self.total_initial_send_sms_daily_limit:
-            return 0
-
-        return self.total_initial_send_sms_daily_limit - self.total_intial_sms_sent_today_count
+        from markets.capacity import SendCapacity
+        return SendCapacity(self.company).get_available(self)
 
     @property
     def call_forwarding_number_display(self):
@@ -1016,6 +1031,10 @@ class Campaign(models.Model):
 
         :return: tuple of data for (batch_number, sent)
         """
+        if hasattr(self, 'latest_batch_number'):
+            # Annotated by `prefetch_campaign_serializer_data`.
+            return self.latest_batch_number or 0, self.latest_batch_attempts or 0
+
         latest_batch = self.statsbatch_set.last()
 
         if not latest_batch:
@@ -1218,8 +1237,12 @@ class Campaign(models.Model):
         Returns a list of users that has access to the campaign.  If ALL users within the company
         has access to the campaign, return an empty list.
         """
-        company_users = set(self.company.profiles.values_list('pk', flat=True))
-        campaign_users = set(self.campaignaccess_set.values_list('user_profile_id', flat=True))
+        if hasattr(self.company, 'profile_list'):
+            # Prefetched by `prefetch_campaign_serializer_data`.
+            company_users = {profile.pk for profile in self.company.profile_list}
+        else:
+            company_users = set(self.company.profiles.values_list('pk', flat=True))
+        campaign_users = {access.user_profile_id for access in self.campaignaccess_set.all()}
         if company_users ^ campaign_users:
             return list(campaign_users)
         else:
@@ -1421,6 +1444,8 @@ class Prospect(models.Model):
         'last_sms_sent_utc',
         'last_sms_received_utc',
     ])
+    # Separate tracker so that unread changes don't update the propstack listing.
+    unread_tracker = FieldTracker(fields=['has_unread_sms'])
     objects = ProspectManager()
 
     class Meta:
@@ -2089,68 +2114,24 @@ class Prospect(models.Model):
                 locked_instance.save(update_fields=['has_unread_sms'])
                 self.modify_unread_count(-1)
 
-    def build_bulk_message(self, sms_template, is_carrier_approved=False, sender_name=None, campaign=None):  # noqa: C901, E501
+    def build_bulk_message(self, sms_template, is_carrier_approved=False, sender_name=None, campaign=None):  # noqa: E501
         """
         Pass in the raw message for the bulk message and transform it replacing with the values from
         the prospect.
 
-        NOTE: This seems to be better suited as a SMSTemplate method.
-        """
-        message_raw = sms_template.message
-        use_alternate_sms_template = False
-
-        tags = get_tags(message_raw)
-        for tag in get_tags(message_raw):
-            if TAG_MAPPINGS[tag] and not getattr(self, TAG_MAPPINGS[tag]):
-                use_alternate_sms_template = True
-                break
-
-        if not use_alternate_sms_template:
-            if 'CompanyName' in tags:
-                # Locate the possible index we will use.
-                match = re.findall(r'(?<=\{CompanyName:)([^]]*?)(?=\})', message_raw)
-                if match:
-                    i = int(match[0]) if match[0].isnumeric() else 0
-                    if len(self.company.outgoing_company_names) <= i:
-                        use_alternate_sms_template = True
-                elif not self.company.random_outgoing_company_name:
-                    use_alternate_sms_template = True
-            elif 'UserFirstName' in tags and not any([
-                self.company.use_sender_name and sender_name,
-                self.company.random_outgoing_user_name,
-            ]):
-                use_alternate_sms_template = True
-
-        # Checking if (and which) opt out language should be used
-        in_twilio_market = campaign and campaign.market.name == 'Twilio'
-        exclude_opt_out_language = in_twilio_market and not self.company.enable_optional_opt_out
-        postfix_message = ''
-        if not exclude_opt_out_language:
-            postfix_message = OPT_OUT_LANGUAGE_TWILIO if in_twilio_market else OPT_OUT_LANGUAGE
-
-        # Either use the formatted message or the alternate template if the data isn't available.
-        if use_alternate_sms_template:
-            return sms_template.get_alternate_message(is_carrier_approved, postfix_message)
-
-        # If 'use_sender_name' is turned on then fill in the template with 'sender_name'.
-        # This overrides the default behavior of filling this in with 'outgoing_first_name'.
-        if 'UserFirstName' in tags and self.company.use_sender_name and sender_name:
-            message_raw = message_raw.replace('{UserFirstName}', sender_name)
-
-        # As a template can now choose a company to use instead of a random one, we need to handle
-        # that before sending to the msg_attrs.
-        match = re.findall(r'(?<=\{CompanyName:)([^]]*?)(?=\})', message_raw)
-        if match:
-            found_index = match[0]
-            i = int(match[0]) if match[0].isnumeric() else 0
-            if i >= len(self.company.outgoing_company_names):
-
-                i = 0
-            company_name = self.company.outgoing_company_names[i]
-            tag = '{CompanyName:' + found_index + '}'
-            message_raw = message_raw.replace(tag, company_name)
-
-        return message_raw.format(**self.msg_attrs).replace("None", "") + postfix_message
+        The template is rendered with its compiled renderer, see `SMSTemplateRenderer`.
+        """
+        renderer = get_renderer(sms_template)
+        values = renderer.get_values(self)
+        opt_out_language = get_opt_out_language(self.company, campaign)
+
+        if is_carrier_approved:
+            # DEPRECATED: carrier approved templates can only be rendered when they don't need
+            # their alternate message, which is no longer supported.
+            if not all(values) or renderer.requires_alternate(self.company, sender_name):
+                raise Exception('Carrier approved templates no longer supported.')
+
+        return renderer.render(values, self.company, sender_name, opt_out_language)
 
     @property
     def has_valid_sherpa_number(self):
@@ -2266,20 +2247,13 @@ class Prospect(models.Model):
         After a campaign prospect is sent a message, we need to update its leadstage to the initial
         message sent lead stage.
         """
-        if self.lead_stage:
+        if self.lead_stage_id:
             return
 
-        try:
-            lead_stage = LeadStage.objects.get(
-                company=self.company,
-                lead_stage_title='Initial Message Sent',
-            )
-            if lead_stage:
-                self.lead_stage = lead_stage
-                self.save(update_fields=['lead_stage'])
-
-        except LeadStage.DoesNotExist:
-            return
+        lead_stage = get_lead_stage(self.company, 'Initial Message Sent')
+        if lead_stage:
+            self.lead_stage = lead_stage
+            self.save(update_fields=['lead_stage'])
 
     def toggle_do_not_call(self, user, value, index_update=True):
         """
@@ -2294,7 +2268,7 @@ class Prospect(models.Model):
 
         if value:
             # Set the prospect's lead stage to dead.
-            self.lead_stage = self.company.leadstage_set.get(lead_stage_title="Dead")
+            self.lead_stage = get_lead_stage(self.company, 'Dead')
             update_fields.append('lead_stage')
 
             # Mark the prospect's messages as read.
@@ -2321,7 +2295,7 @@ class Prospect(models.Model):
 
         if value:
             # Set the prospect's lead stage to dead.
-            self.lead_stage = self.company.leadstage_set.get(lead_stage_title="Dead")
+            self.lead_stage = get_lead_stage(self.company, 'Dead')
             update_fields.append('lead_stage')
 
             # Mark the prospect's messages as read.
@@ -2395,35 +2369,8 @@ class Prospect(models.Model):
 
         # Mark related `Prospect`s as 'unverified' if prospect is verified.
         if self.related_record_id and verified:
-            lead_stage = LeadStage.objects.get(lead_stage_title="Dead", company=self.company)
-            for p in Prospect.objects.filter(
-                    related_record_id=self.related_record_id,
-            ).exclude(id=self.id):
-                p.owner_verified_status = Prospect.OwnerVerifiedStatus.UNVERIFIED
-                p.lead_stage = lead_stage
-                p.wrong_number = True
-                p.save(
-                    index_update=index_update,
-                    update_fields=['owner_verified_status', 'lead_stage', 'wrong_number'],
-                )
-
-                description = 'Owner set to not valid by system'
-                if user:
-                    description = f'Owner set to not valid by {user.get_full_name()}'
-                Activity.objects.create(
-                    title="Owner Not Valid",
-                    prospect=p,
-                    description=description,
-                    icon="fa fa-times-circle",
-                )
-
-            # Mark related `CampaignProspect` objects as 'skipped'
-            related_prospects = Prospect.objects.filter(
-                related_record_id=self.related_record_id).exclude(id=self.id)
-            for prospect in related_prospects:
-                for cp in prospect.campaignprospect_set.filter(sent=False, skipped=False):
-                    cp.skipped = True
-                    cp.save(update_fields=['skipped'])
+            Prospect.objects.invalidate_related_records(
+                [self.id], user=user, index_update=index_update)
 
         return self, [activity]
 
@@ -2497,7 +2444,7 @@ class Prospect(models.Model):
 
         Activity.objects.create(prospect=self, title=title, description=description)
         if value:
-            self.lead_stage = self.company.leadstage_set.get(lead_stage_title='Dead (Auto)')
+            self.lead_stage = get_lead_stage(self.company, 'Dead (Auto)')
         self.save(update_fields=['lead_stage'])
 
     def is_prospect_new(self, full_name, property_address, mailing_address):
@@ -2578,25 +2525,11 @@ class Prospect(models.Model):
         """
         Update phone type and carrier for this prospect's phone.
         """
-        from sherpa.models import PhoneType
+        from prospects.carriers import CarrierLookup
         if self.phone_type or settings.TEST_MODE:
             return
 
-        phone_type_record, is_new_phone_type_record = PhoneType.objects.get_or_create(
-            phone=self.phone_raw)
-
-        # If this is a new `PhoneType`, run lookup to get type & carrier.
-        error = None
-        if is_new_phone_type_record or phone_type_record.carrier is None:
-            error = phone_type_record.lookup_phone_type()
-
-        # Set phone type and carrier to match `PhoneType` record (deprecated in future?)
-        # Set to error message if there was an error on lookup. Set to 'na' if blank.
-        phone_type = phone_type_record.type if not error else 'error on lookup'
-        self.phone_type = 'na' if not phone_type else phone_type
-        self.phone_carrier = phone_type_record.carrier if not error else 'error on lookup'
-
-        self.save(update_fields=['phone_type', 'phone_carrier'])
+        CarrierLookup().update_prospects([self])
 
     def push_to_campaign(
             self,
@@ -2692,7 +2625,42 @@ class Prospect(models.Model):
 
         if index_update and self.tracker.changed() and self.pk:
             self.update_propstack_listing()
-        return super(Prospect, self).save(*args, **kwargs)
+
+        # New messages from a prospect that is already unread move it to the top of the inbox.
+        update_fields = kwargs.get('update_fields')
+        inbox_changed = any(
+            tracker.has_changed(field) and (update_fields is None or field in update_fields)
+            for tracker, field in [
+                (self.unread_tracker, 'has_unread_sms'),
+                (self.tracker, 'last_sms_received_utc'),
+            ]
+        ) and (self.has_unread_sms or not self._state.adding)
+        created = self._state.adding
+        phone_changed = not created and self.tracker.has_changed('phone_raw') and (
+            update_fields is None or 'phone_raw' in update_fields)
+        previous_phone = self.tracker.previous('phone_raw')
+        super(Prospect, self).save(*args, **kwargs)
+        if inbox_changed:
+            self.update_unread_inbox()
+        if created:
+            InboundRoutes().add_prospects([self])
+        elif phone_changed:
+            # Other prospects might be the latest with the phones, they're loaded when needed.
+            routes = InboundRoutes()
+            routes.remove_prospect(self.company_id, previous_phone)
+            routes.remove_prospect(self.company_id, self.phone_raw)
+
+    def update_unread_inbox(self):
+        """
+        Add or remove the prospect from the company's `UnreadInbox`.
+        """
+        from prospects.inbox import UnreadInbox
+
+        inbox = UnreadInbox(self.company)
+        if self.has_unread_sms:
+            inbox.add(self)
+        else:
+            inbox.remove(self.id)
 
 
 class CampaignProspect(models.Model):
@@ -2844,6 +2812,14 @@ class CampaignProspect(models.Model):
         app_label = 'sherpa'
         unique_together = ('campaign', 'prospect')
         ordering = ('id',)
+        indexes = [
+            # Campaign prospects waiting to be sent, in the order of `CampaignSendQueue`.
+            models.Index(
+                fields=['campaign', '-has_unread_sms', 'sort_order', '-last_updated', 'id'],
+                name='sherpa_cp_send_queue_idx',
+                condition=Q(scheduled=False, skipped=False, sent=False),
+            ),
+        ]
 
     def __str__(self):
         return "%s - %s %s" % (
@@ -2906,6 +2882,48 @@ class CampaignProspect(models.Model):
         else:
             return ''
 
+    @staticmethod
+    def bulk_sms_msg_texts(campaign_prospects, templates, sender_name=None):
+        """
+        Return the formatted messages of many campaign prospects of a campaign, the same as
+        `sms_msg_text` with the template of each one.
+
+        Campaign prospects with the same template are rendered together and their template is
+        saved with a single update.
+
+        :param campaign_prospects list: Campaign prospects of the same campaign.
+        :param templates list: The `SMSTemplate` of each campaign prospect.
+        """
+        messages = [''] * len(campaign_prospects)
+        groups = defaultdict(list)
+        for i, (campaign_prospect, template) in enumerate(zip(campaign_prospects, templates)):
+            if campaign_prospect.should_send_carrier_approved_template:
+                messages[i] = campaign_prospect.sms_msg_text(sender_name, template)
+            elif template:
+                groups[template].append(i)
+
+        for template, indexes in groups.items():
+            if not template.is_valid:
+                continue
+
+            rows = [campaign_prospects[i] for i in indexes]
+            CampaignProspect.objects.filter(
+                id__in=[campaign_prospect.id for campaign_prospect in rows],
+            ).update(sms_template=template)
+
+            renderer = get_renderer(template)
+            company = rows[0].prospect.company
+            rendered = renderer.render_many(
+                [renderer.get_values(campaign_prospect.prospect) for campaign_prospect in rows],
+                company,
+                sender_name,
+                get_opt_out_language(company, rows[0].campaign),
+            )
+            for i, campaign_prospect, message in zip(indexes, rows, rendered):
+                campaign_prospect.sms_template = template
+                messages[i] = message
+        return messages
+
     @property
     def public_sms_url(self):
         """
@@ -3361,14 +3379,8 @@ class CampaignProspect(models.Model):
         qualified_prospect.saved_to_zapier_dt = django_tz.now()
 
         # Set the new lead stage for the prospect
-        lead_stage_pushed_to_podio_list = LeadStage.objects.filter(
-            is_active=True,
-            lead_stage_title='Pushed to Podio',
-            company=self.campaign.company,
-        )
-        if lead_stage_pushed_to_podio_list:
-            lead_stage_pushed_to_podio = lead_stage_pushed_to_podio_list[0]
-        else:
+        lead_stage_pushed_to_podio = get_lead_stage(self.campaign.company, 'Pushed to Podio')
+        if lead_stage_pushed_to_podio and not lead_stage_pushed_to_podio.is_active:
             lead_stage_pushed_to_podio = None
 
         if lead_stage_pushed_to_podio is not None:
@@ -3444,14 +3456,8 @@ class CampaignProspect(models.Model):
         qualified_prospect.emailed_lead_to_podio_dt = django_tz.now()
 
         # Update the lead stage to show that the prospect has been pushed to podio.
-        lead_stage_pushed_to_podio_list = LeadStage.objects.filter(
-            is_active=True,
-            lead_stage_title='Pushed to Podio',
-            company=self.campaign.company,
-        )
-        if lead_stage_pushed_to_podio_list:
-            lead_stage_pushed_to_podio = lead_stage_pushed_to_podio_list[0]
-        else:
+        lead_stage_pushed_to_podio = get_lead_stage(self.campaign.company, 'Pushed to Podio')
+        if lead_stage_pushed_to_podio and not lead_stage_pushed_to_podio.is_active:
             lead_stage_pushed_to_podio = None
 
         if lead_stage_pushed_to_podio:
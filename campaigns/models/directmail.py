@@ -12,7 +12,7 @@ from properties.utils import get_or_create_address
 from sherpa.tasks import sherpa_send_email
 from ..directmail import DirectMailProvider
 from ..directmail_clients import DirectMailOrderStatus, DirectMailResponse, DirectMailStatusResponse
-from ..managers import DirectMailCampaignManager
+from ..managers import DirectMailCampaignManager, DirectMailTrackingByPieceManager
 from ..utils import get_dm_charges
 
 User = get_user_model()
@@ -435,11 +435,13 @@ class DirectMailOrder(models.Model):
         Get stats by piece by status.
         """
         delivered = self.__client.get_delivered(self.tracking_job_id)
-        self.update_stats_by_piece(delivered.data, DirectMailTrackingByPiece.Status.DELIVERED)
         returned = self.__client.get_returned(self.tracking_job_id)
-        self.update_stats_by_piece(returned.data, DirectMailTrackingByPiece.Status.RETURNED)
         redirected = self.__client.get_redirected(self.tracking_job_id)
-        self.update_stats_by_piece(redirected.data, DirectMailTrackingByPiece.Status.REDIRECTED)
+        self.update_stats_by_piece({
+            DirectMailTrackingByPiece.Status.DELIVERED: delivered.data,
+            DirectMailTrackingByPiece.Status.RETURNED: returned.data,
+            DirectMailTrackingByPiece.Status.REDIRECTED: redirected.data,
+        })
 
         if delivered.error or redirected.error or returned.error:
             error = f"Error getting delivered: {delivered.error}, " \
@@ -448,20 +450,18 @@ class DirectMailOrder(models.Model):
             self.error = error
             self.save(update_fields=['error'])
 
-    def update_stats_by_piece(self, records, status):
+    def update_stats_by_piece(self, records_by_status):
         """
-        Update stats by piece.
+        Update stats by piece, upserting all the pieces of the order at once.
 
-        :records: list of dict with imb & barcode
-        :status: status to update record with (DirectMailTrackingByPiece.Status)
+        :records_by_status: dict of list of dict with imb & barcode, by status to update the
+                            records with (DirectMailTrackingByPiece.Status)
         """
-        for record in records:
-            tracking, _ = DirectMailTrackingByPiece.get_or_create(
-                tracking_imb=record['imb'],
-                tracking_barcode=record['barcode'],
-                order=self,
-                status=status,
-            )
+        DirectMailTrackingByPiece.objects.upsert(self, [
+            {'imb': record['imb'], 'barcode': record['barcode'], 'status': status}
+            for status, records in records_by_status.items()
+            for record in records or []
+        ])
 
     def update_status_on_tracking_thresholds(self):
         """
@@ -639,3 +639,8 @@ class DirectMailTrackingByPiece(models.Model):
     tracking_imb = models.CharField(max_length=255, blank=True, null=True)
     tracking_barcode = models.CharField(max_length=255, blank=True, null=True)
     status = models.CharField(max_length=50, blank=True, null=True, choices=Status.CHOICES)
+
+    objects = DirectMailTrackingByPieceManager()
+
+    class Meta:
+        unique_together = ('order', 'tracking_barcode', 'status')
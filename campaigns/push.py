@@ -0,0 +1,336 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from companies.reference import get_property_tag, get_prospect_tag
+from phone.choices import Provider
+from properties.models import Property, PropertyTag, PropertyTagAssignment
+from properties.utils import get_or_create_attom_tags
+from prospects.models import ProspectTag, ProspectTagAssignment
+from search.tasks import stacker_full_update, stacker_update_property_tags
+from sherpa.models import CampaignProspect, Company, LitigatorList, PhoneType, Prospect
+
+
+class BulkCampaignPush:
+    """
+    Push many prospects to a campaign at once.
+
+    Works the same as `Prospect.push_to_campaign` for each prospect, but the campaign prospects are
+    inserted with a single statement and the litigator, charge and wrong number flags are
+    calculated with a query for all the prospects, instead of a few queries per prospect. The
+    campaign stats are updated once in `finish`.
+    """
+    # Amount of prospects pushed in each `push`, used by tasks to checkpoint their progress.
+    chunk_size = 1000
+
+    def __init__(self, campaign, tags=None, upload_skip_trace=None, sms=True):
+        """
+        :param campaign Campaign: Campaign to push the prospects to.
+        :param tags list: Ids of property tags to add to the prospects' properties.
+        :param upload_skip_trace UploadSkipTrace: The skip trace where the prospects were created.
+        :param sms bool: Whether the sms related tasks should be run, such as counting the
+                         prospects for charging.
+        """
+        self.campaign = campaign
+        self.tags = list(tags or [])
+        self.upload_skip_trace = upload_skip_trace
+        self.sms = sms and not campaign.is_direct_mail
+        self.tag_ids = {}
+
+    def push(self, prospect_ids):
+        """
+        Push the prospects to the campaign.
+
+        :param prospect_ids list: Ids of the prospects to push, in the order they should be pushed.
+        :return: The amount of pushed prospects that should be charged.
+        """
+        prospects = list(Prospect.objects.filter(id__in=prospect_ids).select_related(
+            'prop',
+            'prop__address',
+        ).order_by('id'))
+        if not prospects:
+            return 0
+
+        with transaction.atomic():
+            campaign_prospects = self.__save_campaign_prospects(prospects)
+            wrong_numbers = []
+            if self.sms:
+                self.__update_phone_types(prospects)
+                wrong_numbers = self.__update_wrong_numbers(prospects)
+            tagged_prop_ids = self.__add_tags(prospects, campaign_prospects)
+            transaction.on_commit(lambda: self.__update_index(wrong_numbers, tagged_prop_ids))
+
+        if not self.sms:
+            return 0
+        return len([
+            prospect for prospect in prospects
+            if campaign_prospects[prospect.id].include_in_upload_count and
+            not prospect.upload_duplicate
+        ])
+
+    def finish(self):
+        """
+        Update the campaign stats with the pushed prospects.
+        """
+        if self.sms:
+            self.campaign.update_campaign_stats()
+
+    def __save_campaign_prospects(self, prospects):
+        """
+        Insert the prospects' campaign prospects and update the ones that already exist.
+
+        :return: A dictionary of `CampaignProspect` by prospect id.
+        """
+        existing = {
+            campaign_prospect.prospect_id: campaign_prospect
+            for campaign_prospect in CampaignProspect.objects.filter(
+                campaign=self.campaign,
+                prospect__in=prospects,
+            )
+        }
+
+        # Prospects created from the same phones share their related record id. The campaign
+        # prospects of a related record are sorted in the order they are pushed.
+        related_ids = {prospect.related_record_id for prospect in prospects} - {'', None}
+        totals = dict(CampaignProspect.objects.filter(
+            campaign=self.campaign,
+            prospect__related_record_id__in=related_ids,
+        ).order_by().values_list('prospect__related_record_id').annotate(total=Count('id')))
+        litigator_related_ids = set(Prospect.objects.filter(
+            related_record_id__in=related_ids,
+            phone_raw__in=LitigatorList.objects.values('phone'),
+        ).values_list('related_record_id', flat=True))
+        litigator_phones = set(LitigatorList.objects.filter(
+            phone__in=[prospect.phone_raw for prospect in prospects],
+        ).values_list('phone', flat=True))
+        counter = self.__get_upload_counter(prospects) if self.sms else None
+
+        campaign_prospects = {}
+        for prospect in prospects:
+            campaign_prospect = existing.get(prospect.id) or CampaignProspect(
+                campaign=self.campaign,
+                prospect=prospect,
+                from_upload_skip_trace=self.upload_skip_trace,
+            )
+            campaign_prospects[prospect.id] = campaign_prospect
+
+            related_id = prospect.related_record_id
+            if related_id:
+                campaign_prospect.sort_order = totals.get(related_id, 0) + 1
+                if prospect.id not in existing:
+                    totals[related_id] = campaign_prospect.sort_order
+                has_litigator_list = related_id in litigator_related_ids
+            else:
+                campaign_prospect.sort_order = 2 if prospect.id in existing else 1
+                has_litigator_list = prospect.phone_raw in litigator_phones
+
+            if has_litigator_list or prospect.do_not_call:
+                campaign_prospect.skipped = True
+            if prospect.phone_raw in litigator_phones:
+                campaign_prospect.is_litigator = True
+            elif has_litigator_list:
+                campaign_prospect.is_associated_litigator = True
+
+            if counter:
+                counter(prospect, campaign_prospect, prospect.id not in existing)
+
+        CampaignProspect.objects.bulk_create(
+            [cp for prospect_id, cp in campaign_prospects.items() if prospect_id not in existing],
+            ignore_conflicts=True,
+        )
+        CampaignProspect.objects.bulk_update(existing.values(), [
+            'sort_order',
+            'skipped',
+            'is_litigator',
+            'is_associated_litigator',
+            'count_as_unique',
+            'include_in_upload_count',
+            'include_in_skip_trace_cost',
+        ])
+        if self.sms:
+            self.__charge_uploads(prospects, campaign_prospects)
+
+        return campaign_prospects
+
+    def __get_upload_counter(self, prospects):
+        """
+        Return a function that decides if a campaign prospect counts towards the monthly uploads,
+        the same as `CampaignProspect.count_prospect`.
+        """
+        phone_types = {}
+        carriers = {}
+        for phone, phone_type, carrier in PhoneType.objects.filter(
+                phone__in=[prospect.phone_raw for prospect in prospects],
+        ).values_list('phone', 'type', 'carrier'):
+            phone_types[phone] = phone_type
+            carriers[phone] = carrier
+        twilio_company_ids = set(Company.objects.filter(
+            id__in={prospect.company_id for prospect in prospects},
+            telephonyconnection__provider=Provider.TWILIO,
+        ).values_list('id', flat=True))
+        charged_prop_ids = set()
+
+        def count_prospect(prospect, campaign_prospect, is_new_campaign_prospect):
+            if campaign_prospect.sort_order == 1 and is_new_campaign_prospect:
+                campaign_prospect.count_as_unique = True
+
+            prop = prospect.prop
+            if prospect.upload_duplicate or (prop and (
+                    prop.is_charged or prop.id in charged_prop_ids)):
+                return
+
+            carrier = (carriers.get(prospect.phone_raw) or '').lower()
+            is_verizon = 'verizon' in carrier or 'cellco' in carrier
+            phone_type = phone_types.get(prospect.phone_raw, PhoneType.Type.MOBILE)
+            if (not is_verizon or prospect.company_id in twilio_company_ids) and \
+                    phone_type == PhoneType.Type.MOBILE:
+                campaign_prospect.include_in_upload_count = True
+                campaign_prospect.include_in_skip_trace_cost = True
+                if prop:
+                    charged_prop_ids.add(prop.id)
+
+        return count_prospect
+
+    def __charge_uploads(self, prospects, campaign_prospects):
+        """
+        Add the counted prospects to their company's monthly uploads and mark their properties as
+        charged.
+        """
+        uploads = defaultdict(int)
+        prop_ids = set()
+        for prospect in prospects:
+            if campaign_prospects[prospect.id].include_in_upload_count and \
+                    not prospect.upload_duplicate:
+                uploads[prospect.company_id] += 1
+                if prospect.prop:
+                    prop_ids.add(prospect.prop_id)
+                    prospect.prop.is_charged = True
+
+        for company_id, total in uploads.items():
+            Company.objects.filter(id=company_id).update(
+                monthly_upload_count=F('monthly_upload_count') + total,
+            )
+        if prop_ids:
+            Property.objects.filter(id__in=prop_ids).update(is_charged=True)
+
+    def __update_phone_types(self, prospects):
+        """
+        Set the campaign of the prospects' `PhoneType`, creating the ones that are missing.
+        """
+        phones = {prospect.phone_raw for prospect in prospects}
+        existing = set(PhoneType.objects.filter(phone__in=phones).values_list('phone', flat=True))
+        PhoneType.objects.bulk_create(
+            [PhoneType(phone=phone, campaign=self.campaign) for phone in phones - existing],
+            ignore_conflicts=True,
+        )
+        PhoneType.objects.filter(phone__in=existing).update(campaign=self.campaign)
+
+    def __update_wrong_numbers(self, prospects):
+        """
+        Set the prospects as wrong number when other prospects with the same name and number are,
+        the same as `Prospect.mark_as_wrong_number`.
+
+        :return: The prospects that changed.
+        """
+        named = [prospect for prospect in prospects if prospect.phone_raw and prospect.first_name]
+        wrong_numbers = set(Prospect.objects.filter(
+            phone_raw__in={prospect.phone_raw for prospect in named},
+            first_name__in={prospect.first_name for prospect in named},
+            wrong_number=True,
+        ).order_by().values_list('phone_raw', 'first_name').annotate(
+            total=Count('id'),
+        ).filter(total__gt=1).values_list('phone_raw', 'first_name'))
+
+        changed = defaultdict(list)
+        for prospect in prospects:
+            wrong_number = (prospect.phone_raw, prospect.first_name) in wrong_numbers
+            if prospect.wrong_number != wrong_number:
+                prospect.wrong_number = wrong_number
+                changed[wrong_number].append(prospect)
+        for wrong_number, changed_prospects in changed.items():
+            Prospect.objects.filter(
+                id__in=[prospect.id for prospect in changed_prospects],
+            ).update(wrong_number=wrong_number)
+        return sum(changed.values(), [])
+
+    def __add_tags(self, prospects, campaign_prospects):
+        """
+        Add the push tags and the auto tags to the prospects and their properties, the same as
+        `Prospect.apply_auto_tags`.
+
+        :return: Ids of the properties that were tagged.
+        """
+        company = self.campaign.company
+        property_tags = defaultdict(set)
+        prospect_tags = defaultdict(set)
+        attom_tags = {}
+        for prospect in prospects:
+            prop = prospect.prop
+            if prop:
+                if prop.id not in attom_tags:
+                    attom_tags[prop.id] = list(get_or_create_attom_tags(
+                        prop.address,
+                        company,
+                    )) if prop.address else []
+                property_tags[prop.id].update(self.tags + attom_tags[prop.id])
+
+                if prospect.validated_property_vacant == 'Y':
+                    property_tags[prop.id].add(self.__get_tag(PropertyTag, 'Vacant'))
+                if prospect.is_absentee:
+                    property_tags[prop.id].add(self.__get_tag(PropertyTag, 'Absentee'))
+
+            campaign_prospect = campaign_prospects[prospect.id]
+            if campaign_prospect.is_litigator:
+                prospect_tags[prospect.id].add(self.__get_tag(ProspectTag, 'Litigator'))
+            if campaign_prospect.is_associated_litigator:
+                prospect_tags[prospect.id].add(
+                    self.__get_tag(ProspectTag, 'Litigator Associate'))
+
+        PropertyTagAssignment.objects.bulk_create([
+            PropertyTagAssignment(prop_id=prop_id, tag_id=tag_id)
+            for prop_id, tag_ids in property_tags.items() for tag_id in tag_ids
+        ], ignore_conflicts=True)
+        ProspectTagAssignment.objects.bulk_create([
+            ProspectTagAssignment(prospect_id=prospect_id, tag_id=tag_id)
+            for prospect_id, tag_ids in prospect_tags.items() for tag_id in tag_ids
+        ], ignore_conflicts=True)
+        return [prop_id for prop_id, tag_ids in property_tags.items() if tag_ids]
+
+    def __update_index(self, wrong_numbers, prop_ids):
+        """
+        Queue the search index updates that the signals of the prospects and properties would have
+        queued, as the changes were saved in bulk.
+
+        :param wrong_numbers list: Prospects whose wrong number flag changed.
+        :param prop_ids list: Ids of the properties that were tagged.
+        """
+        if wrong_numbers:
+            stacker_full_update.delay(
+                [prospect.id for prospect in wrong_numbers],
+                [prospect.prop_id for prospect in wrong_numbers if prospect.prop_id],
+            )
+
+        tags = defaultdict(list)
+        distress_indicators = defaultdict(int)
+        for assignment in PropertyTagAssignment.objects.filter(prop_id__in=prop_ids).values(
+            'prop_id',
+            'tag_id',
+            'tag__distress_indicator',
+        ):
+            tags[assignment['prop_id']].append(assignment['tag_id'])
+            if assignment['tag__distress_indicator']:
+                distress_indicators[assignment['prop_id']] += 1
+        for prop_id, tag_ids in tags.items():
+            stacker_update_property_tags.delay(prop_id, tag_ids, distress_indicators[prop_id])
+
+    def __get_tag(self, model, name):
+        key = (model, name)
+        if key not in self.tag_ids:
+            company = self.campaign.company
+            get_tag = get_property_tag if model is PropertyTag else get_prospect_tag
+            tag = get_tag(company, name)
+            if tag is None:
+                tag, _ = model.objects.get_or_create(name=name, company=company)
+            self.tag_ids[key] = tag.id
+        return self.tag_ids[key]
@@ -0,0 +1,86 @@
+from django.db.models import Q
+
+from sherpa.models import CampaignProspect
+
+# Order of the campaign prospects waiting to be sent, the same as the columns of the partial index
+# `sherpa_cp_send_queue_idx`, with the id to break ties. Fields are `(name, descending)`.
+SEND_ORDER = (
+    ('has_unread_sms', True),
+    ('sort_order', False),
+    ('last_updated', True),
+    ('id', False),
+)
+
+
+class CampaignSendQueue:
+    """
+    Campaign prospects of a campaign that are waiting to be sent in bulk, in the order to send.
+
+    Pages are fetched with a keyset cursor on the send order, which is served by a partial index of
+    the unsent campaign prospects, so each page only reads its own rows instead of sorting all the
+    remaining prospects of the campaign.
+    """
+    page_size = 100
+
+    def __init__(self, campaign):
+        self.campaign = campaign
+
+    def get_queryset(self):
+        return CampaignProspect.objects.filter(
+            campaign=self.campaign,
+            scheduled=False,
+            skipped=False,
+            sent=False,
+            prospect__phone_type='mobile',
+        ).order_by(*[f'-{name}' if desc else name for name, desc in SEND_ORDER])
+
+    def get_page(self, after=None):
+        """
+        Return the next page of campaign prospects, with the data needed to render their message.
+
+        :param after int: Id of the last campaign prospect of the previous page, to continue after
+                          it. The first page is returned when there's no id.
+        """
+        queryset = self.get_queryset()
+        if after:
+            values = CampaignProspect.objects.filter(
+                campaign=self.campaign,
+                id=after,
+            ).values(*[name for name, _ in SEND_ORDER]).first()
+            if values:
+                queryset = queryset.filter(self.get_after_filter(values))
+
+        return queryset.select_related(
+            'campaign',
+            'campaign__company',
+            'campaign__market',
+            'campaign__sms_template',
+            'prospect',
+            'prospect__company',
+        )[:self.page_size]
+
+    @staticmethod
+    def get_after_filter(values):
+        """
+        Return the filter of the rows that come after `values` in the send order.
+
+        Nulls are sorted the same as postgres does, last in ascending order and first in descending
+        order, so that the filter matches the index.
+        """
+        after = Q(pk__in=[])
+        equal = Q()
+        for name, desc in SEND_ORDER:
+            value = values[name]
+            if value is None:
+                if desc:
+                    after |= equal & Q(**{f'{name}__isnull': False})
+                equal &= Q(**{f'{name}__isnull': True})
+            else:
+                if desc:
+                    after |= equal & Q(**{f'{name}__lt': value})
+                else:
+                    after |= equal & (
+                        Q(**{f'{name}__gt': value}) | Q(**{f'{name}__isnull': True})
+                    )
+                equal &= Q(**{name: value})
+        return after
@@ -11,13 +11,13 @@ from django.db.models import F, Q
 from django.utils import timezone as django_tz
 from django.utils.dateparse import parse_date
 
+from markets.capacity import SendCapacity
 from phone.choices import Provider
 from prospects.utils import record_phone_number_opt_outs
+from services.http import run_concurrently
 from sherpa.models import (
-    Activity,
     Campaign,
     CampaignProspect,
-    Company,
     Prospect,
     ReceiptSmsDirect,
     SMSMessage,
@@ -43,14 +43,18 @@ def attempt_batch_text(campaign_prospect_id, sms_template_id, sent_by_user_id, f
     isn't actually always sent, sometimes the message can be skipped for a variety of reasons.
     """
     campaign_prospect = CampaignProspect.objects.get(id=campaign_prospect_id)
+    campaign = campaign_prospect.campaign
+    market = campaign.market
+    # The send was counted towards the daily limit when requested, and is released when the
+    # message is not sent.
+    capacity = SendCapacity(campaign.company)
     if not campaign_prospect.is_valid_send:
+        capacity.release(market)
         return
-    campaign = campaign_prospect.campaign
     prospect = campaign_prospect.prospect
     phone_type = prospect.phone_data
     company = prospect.company
     initial_message_sent_by_rep = User.objects.get(id=sent_by_user_id)
-    market = campaign.market
 
     # Save stats_batch to campaign_prospect here
     stats_batch = campaign.update_stats_batch()
@@ -84,6 +88,7 @@ def attempt_batch_text(campaign_prospect_id, sms_template_id, sent_by_user_id, f
     if campaign_prospect.check_skip(force_skip=force_skip):
         campaign.campaign_stats.total_skipped = F('total_skipped') + 1
         campaign.campaign_stats.save(update_fields=['total_skipped'])
+        capacity.release(market)
         return
 
     campaign_prospect.prospect.set_lead_stage()
@@ -163,6 +168,7 @@ def attempt_batch_text(campaign_prospect_id, sms_template_id, sent_by_user_id, f
                 campaign.campaign_stats.save(update_fields=['total_skipped'])
 
         if not campaign_prospect.skipped and error_code is not None:
+            capacity.release(market)
             return SMSResult.objects.create(
                 sms=sms_message,
                 error_code=error_code,
@@ -176,6 +182,7 @@ def attempt_batch_text(campaign_prospect_id, sms_template_id, sent_by_user_id, f
     else:
         campaign_prospect.sms_status = 'failure6'
         campaign_prospect.save(update_fields=['sms_status'])
+        capacity.release(market)
 
 
 @shared_task
@@ -398,42 +405,9 @@ def modify_campaign_daily_stats(campaign_id, date_str):
     """
     Either create or update the daily stats for a given campaign and date.
     """
-    campaign = Campaign.objects.get(id=campaign_id)
     date = parse_date(date_str)
-
-    # Generate the stats for the campaign on this day.
-    sent_count = campaign.get_bulk_sent_messages(start_date=date, end_date=date).count()
-    new_lead_count = campaign.get_prospect_activities(
-        start_date=date,
-        end_date=date,
-        activity_title=Activity.Title.ADDED_QUALIFIED,
-    ).count()
-    auto_dead_count = campaign.get_prospect_activities(
-        start_date=date,
-        end_date=date,
-        activity_title=Activity.Title.ADDED_AUTODEAD,
-    ).count()
-    response_count = campaign.get_responses(start_date=date, end_date=date).count()
-    delivered_count = campaign.get_delivered_initial_messages(
-        start_date=date,
-        end_date=date,
-    ).count()
-    skipped_count = campaign.get_skipped_count(start_date=date, end_date=date)
-
-    # Create or modify the the `CampaignDailyStats` instance.
-    instance, _ = CampaignDailyStats.objects.update_or_create(
-        campaign=campaign,
-        date=date,
-        defaults={
-            'new_leads': new_lead_count,
-            'sent': sent_count,
-            'auto_dead': auto_dead_count,
-            'responses': response_count,
-            'delivered': delivered_count,
-            'skipped': skipped_count,
-        },
-    )
-    return instance
+    CampaignDailyStats.objects.rollup(date, Campaign.objects.filter(id=campaign_id))
+    return CampaignDailyStats.objects.get(campaign_id=campaign_id, date=date)
 
 
 @shared_task
@@ -441,11 +415,11 @@ def set_daily_campaign_stats(date_str):
     """
     Set all the campaign stats for the day for active campaigns.
     """
-    companies = Company.objects.filter(subscription_status__in=['active', 'past_due'])
-    for company in companies:
-        campaigns = company.campaign_set.filter(is_archived=False)
-        for campaign in campaigns:
-            modify_campaign_daily_stats(campaign.id, date_str)
+    campaigns = Campaign.objects.filter(
+        company__subscription_status__in=['active', 'past_due'],
+        is_archived=False,
+    )
+    CampaignDailyStats.objects.rollup(parse_date(date_str), campaigns)
 
 
 @shared_task
@@ -545,6 +519,8 @@ def charge_locked_dm_campaign():
 def update_tracking_status():
     """
     Update status for all Direct Mail orders that are processing or out for delivery.
+
+    Orders are refreshed concurrently since each refresh waits on AccuTrace.
     """
     check_status = [
         DirectMailOrderStatus.PROCESSING,
@@ -557,11 +533,15 @@ def update_tracking_status():
     target_hours = get_target_hours(update_status=True)
     target_date = date.today() + timedelta(hours=target_hours)
 
-    for order in orders.exclude(
-            status=DirectMailOrderStatus.PROCESSING,
-            drop_date__lte=target_date,
-    ):
-        order.update_status()
+    orders = orders.exclude(
+        status=DirectMailOrderStatus.PROCESSING,
+        drop_date__lte=target_date,
+    ).select_related('tracking_stats')
+    run_concurrently(
+        DirectMailOrder.update_status,
+        orders,
+        settings.DIRECTMAIL_TRACKING_MAX_WORKERS,
+    )
 
 
 @shared_task
@@ -7,7 +7,9 @@ import uuid
 from dateutil.parser import parse
 from model_mommy import mommy
 
+from django.db import connection
 from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
@@ -24,6 +26,7 @@ from sherpa.models import (
     Company,
     LeadStage,
     PhoneNumber,
+    PhoneType,
     Prospect,
     StatsBatch,
     UploadProspects,
@@ -37,7 +40,9 @@ from sherpa.tests import (
     NoDataBaseTestCase,
     StaffUserMixin,
 )
-from .models import CampaignNote
+from .models import CampaignDailyStats, CampaignNote, DirectMailTrackingByPiece
+from .push import BulkCampaignPush
+from .send_queue import CampaignSendQueue
 from .tasks import modify_campaign_daily_stats, record_skipped_send, transfer_campaign_prospects
 
 
@@ -995,6 +1000,51 @@ class CampaignAPITestCase(CampaignAPIMixin, BaseAPITestCase):
         expected_count = self.company1.campaign_set.filter(is_archived=False).count()
         self.assertEqual(len(response.json()), expected_count)
 
+    def test_list_query_budget(self):
+        def get_list():
+            with CaptureQueriesContext(connection) as context:
+                response = self.george_client.get(self.list_url)
+            self.assertEqual(response.status_code, 200)
+            return len(context), response.json()['results']
+
+        query_count, _ = get_list()
+        for market in [self.market1, self.market2]:
+            mommy.make('sherpa.PhoneNumber', market=market, status='active', _quantity=2)
+            campaign = mommy.make(
+                'sherpa.Campaign',
+                company=self.company1,
+                market=market,
+                campaign_stats=mommy.make('campaigns.CampaignAggregatedStats'),
+            )
+            mommy.make(
+                'sherpa.CampaignAccess',
+                campaign=campaign,
+                user_profile=self.staff_user.profile,
+            )
+            mommy.make('sherpa.StatsBatch', campaign=campaign, batch_number=1, send_attempt=5)
+
+        # Serializing more campaigns doesn't run more queries.
+        new_query_count, results = get_list()
+        self.assertEqual(new_query_count, query_count)
+        self.assertEqual(len(results), 6)
+
+        for data in results:
+            instance = Campaign.objects.get(id=data['id'])
+            self.assertEqual(data['access'], instance.access_list)
+            if not instance.market:
+                continue
+            self.assertEqual(
+                data['market']['totalInitialSendSmsDailyLimit'],
+                instance.market.total_initial_send_sms_daily_limit,
+            )
+            self.assertEqual(
+                data['market']['campaignCount'],
+                instance.market.active_campaigns.count(),
+            )
+
+        response = self.george_client.get(reverse('campaign-detail', kwargs={'pk': campaign.id}))
+        self.assertEqual(response.json()['latestBatchAttempts'], 5)
+
     def test_campaign_percent_complete_filter(self):
         response = self.george_client.get(self.list_url)
         data = response.json()
@@ -1430,7 +1480,7 @@ class CampaignProspectAPITestCase(CampaignAPIMixin, BaseAPITestCase):
             title='testcat',
             company=self.company1,
         )
-        mommy.make(
+        first_template = mommy.make(
             'sherpa.SMSTemplate',
             company=self.company1,
             message='message {CompanyName}',
@@ -1438,11 +1488,37 @@ class CampaignProspectAPITestCase(CampaignAPIMixin, BaseAPITestCase):
             category=self.category,
             sort_order=1,
         )
+        second_template = mommy.make(
+            'sherpa.SMSTemplate',
+            company=self.company1,
+            message='second {CompanyName}',
+            alternate_message='altmessage {CompanyName}',
+            category=self.category,
+            sort_order=2,
+        )
         response = self.george_client.get(
             self.george_campaign_prospects_url,
             {'sms_category': self.category.id},
         )
         self.assertEqual(response.status_code, 200)
+
+        # Templates of the category are used in turns and saved on the campaign prospects.
+        prefixes = {
+            first_template.id: 'message A test company',
+            second_template.id: 'second A test company',
+        }
+        rows = response.json()
+        self.assertEqual(
+            [row['smsMsgText']['template'] for row in rows[:2]],
+            [first_template.id, second_template.id],
+        )
+        for row in rows:
+            template_id = row['smsMsgText']['template']
+            self.assertTrue(row['smsMsgText']['msg'].startswith(prefixes[template_id]))
+            self.assertEqual(
+                CampaignProspect.objects.get(id=row['id']).sms_template_id,
+                template_id,
+            )
         self.assertEqual(
             len(response.json()),
             CampaignProspect.objects.filter(
@@ -1451,6 +1527,53 @@ class CampaignProspectAPITestCase(CampaignAPIMixin, BaseAPITestCase):
             ).count(),
         )
 
+    def test_batch_prospects_pages_in_send_order(self):
+        now = timezone.now()
+        rows = [(True, 2, now), (False, None, None), (False, 1, None), (False, 1, now)] * 2
+        for has_unread_sms, sort_order, last_updated in rows:
+            prospect = mommy.make(
+                'sherpa.Prospect',
+                company=self.company1,
+                phone_type='mobile',
+                phone_raw='2222222222',
+            )
+            campaign_prospect = mommy.make(
+                'sherpa.CampaignProspect',
+                campaign=self.george_campaign,
+                prospect=prospect,
+                has_unread_sms=has_unread_sms,
+                sort_order=sort_order,
+            )
+            CampaignProspect.objects.filter(id=campaign_prospect.id).update(
+                last_updated=last_updated,
+            )
+
+        queue = CampaignSendQueue(self.george_campaign)
+        expected = list(queue.get_queryset().values_list('id', flat=True))
+        self.assertEqual(len(expected), len(set(expected)))
+
+        queue.page_size = 3
+        paged = []
+        page = list(queue.get_page())
+        while page:
+            paged.extend(campaign_prospect.id for campaign_prospect in page)
+            page = list(queue.get_page(after=page[-1].id))
+        self.assertEqual(paged, expected)
+
+        response = self.george_client.get(
+            self.george_campaign_prospects_url,
+            {'sms_template': self.sms_template.id, 'after': expected[-2]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()], expected[-1:])
+        self.assertNotIn('messages', response.json()[0]['prospect'])
+
+        response = self.george_client.get(
+            self.george_campaign_prospects_url,
+            {'sms_template': self.sms_template.id, 'after': 'abc'},
+        )
+        self.assertEqual(response.status_code, 400)
+
     def test_user_can_update_sms_template(self):
         self.george_campaign.sms_template = None
         self.george_campaign.save()
@@ -1632,6 +1755,52 @@ class CampaignTaskTestCase(CampaignDataMixin, BaseTestCase):
         self.assertEqual(expected_delivered, instance.delivered)
         self.assertEqual(expected_responses, instance.responses)
 
+    def test_can_rollup_daily_stats(self):
+        today = timezone.now().date()
+        campaigns = Campaign.objects.filter(
+            id__in=[self.george_campaign.id, self.george_campaign2.id])
+        mommy.make('sherpa.SMSMessage', campaign=self.george_campaign, message_status='delivered')
+        mommy.make('sherpa.SMSMessage', campaign=self.george_campaign2, _quantity=2)
+        mommy.make(
+            'sherpa.StatsBatch',
+            campaign=self.george_campaign2,
+            last_send_utc=timezone.now(),
+            skipped_internal_dnc=2,
+            skipped_force=1,
+        )
+        mommy.make(
+            'sherpa.StatsBatch',
+            campaign=self.george_campaign2,
+            last_send_utc=timezone.now(),
+            skipped_litigator=4,
+        )
+        for prospect, title in [
+            (self.george_prospect, Activity.Title.ADDED_QUALIFIED),
+            (self.george_prospect2, Activity.Title.ADDED_QUALIFIED),
+            (self.george_prospect3, Activity.Title.ADDED_AUTODEAD),
+        ]:
+            mommy.make('sherpa.Activity', prospect=prospect, title=title)
+        self.assertEqual(CampaignDailyStats.objects.rollup(today, campaigns), 2)
+
+        # Stats of many prospects and batches of a campaign are added up.
+        stats = CampaignDailyStats.objects.get(campaign=self.george_campaign, date=today)
+        self.assertEqual(stats.sent, 1)
+        self.assertEqual(stats.delivered, 1)
+        self.assertEqual(stats.new_leads, 2)
+        self.assertEqual(stats.auto_dead, 1)
+        self.assertEqual(stats.skipped, 0)
+        stats2 = CampaignDailyStats.objects.get(campaign=self.george_campaign2, date=today)
+        self.assertEqual(stats2.sent, 2)
+        self.assertEqual(stats2.delivered, 0)
+        self.assertEqual(stats2.skipped, 7)
+
+        # Existing stats are updated.
+        mommy.make('sherpa.SMSMessage', campaign=self.george_campaign)
+        CampaignDailyStats.objects.rollup(today, campaigns)
+        stats.refresh_from_db()
+        self.assertEqual(stats.sent, 2)
+        self.assertEqual(CampaignDailyStats.objects.filter(date=today).count(), 2)
+
     def test_create_campaign_with_filters(self):
         # Test filtering of response and DNC or priority.
         self.george_campaign_prospect.has_responded_via_sms = 'yes'
@@ -1709,6 +1878,132 @@ class CampaignModelTestCase(CampaignDataMixin, BaseTestCase):
             self.george_prospect.OwnerVerifiedStatus.VERIFIED,
         )
 
+    def test_update_direct_mail_stats_by_piece(self):
+        order = mommy.make('campaigns.DirectMailOrder')
+        status = DirectMailTrackingByPiece.Status
+        order.update_stats_by_piece({
+            status.DELIVERED: [{'imb': '1', 'barcode': 'a'}, {'imb': '2', 'barcode': 'b'}],
+            status.RETURNED: [{'imb': '3', 'barcode': 'c'}],
+            status.REDIRECTED: None,
+        })
+        # Refreshing again updates the existing pieces instead of duplicating them.
+        order.update_stats_by_piece({
+            status.DELIVERED: [{'imb': '9', 'barcode': 'a'}],
+            status.REDIRECTED: [{'imb': '3', 'barcode': 'c'}],
+        })
+
+        self.assertEqual(order.total_delivered, 2)
+        self.assertEqual(order.total_returned, 1)
+        self.assertEqual(order.total_redirected, 1)
+        piece = order.directmailtrackingbypiece_set.get(
+            tracking_barcode='a',
+            status=status.DELIVERED,
+        )
+        self.assertEqual(piece.tracking_imb, '9')
+
+    def test_bulk_campaign_push(self):
+        campaign = self.george_campaign3
+        mommy.make('sherpa.LitigatorList', phone='5550001002')
+        mommy.make('sherpa.PhoneType', phone='5550001002', type='landline')
+        related = [
+            mommy.make(
+                'sherpa.Prospect',
+                company=self.company1,
+                phone_raw=phone,
+                related_record_id='related',
+            )
+            for phone in ['5550001001', '5550001002']
+        ]
+        single = mommy.make('sherpa.Prospect', company=self.company1, phone_raw='5550001003')
+        dnc = mommy.make(
+            'sherpa.Prospect',
+            company=self.company1,
+            phone_raw='5550001004',
+            do_not_call=True,
+        )
+        monthly_upload_count = self.company1.monthly_upload_count
+
+        campaign_push = BulkCampaignPush(campaign)
+        charge = campaign_push.push([prospect.id for prospect in related + [single, dnc]])
+        campaign_push.finish()
+
+        # The landline isn't charged.
+        self.assertEqual(charge, 3)
+        self.company1.refresh_from_db()
+        self.assertEqual(self.company1.monthly_upload_count, monthly_upload_count + 3)
+
+        first, litigator = [
+            campaign.campaignprospect_set.get(prospect=prospect) for prospect in related
+        ]
+        self.assertEqual((first.sort_order, litigator.sort_order), (1, 2))
+        self.assertTrue(first.count_as_unique)
+        self.assertTrue(first.skipped and first.is_associated_litigator)
+        self.assertTrue(litigator.skipped and litigator.is_litigator)
+        self.assertTrue(related[1].tags.filter(name='Litigator').exists())
+        self.assertTrue(campaign.campaignprospect_set.get(prospect=dnc).skipped)
+        self.assertFalse(campaign.campaignprospect_set.get(prospect=single).skipped)
+        self.assertEqual(
+            PhoneType.objects.filter(phone__startswith='555000100', campaign=campaign).count(),
+            4,
+        )
+
+        # Pushing again doesn't duplicate the campaign prospects.
+        BulkCampaignPush(campaign).push([single.id])
+        self.assertEqual(campaign.campaignprospect_set.count(), 4)
+
+    def test_bulk_campaign_push_chunks(self):
+        campaign = self.george_campaign3
+        related = [
+            mommy.make(
+                'sherpa.Prospect',
+                company=self.company1,
+                phone_raw=phone,
+                related_record_id='related',
+            )
+            for phone in ['5550001001', '5550001002', '5550001003']
+        ]
+        campaign_push = BulkCampaignPush(campaign)
+        campaign_push.push([prospect.id for prospect in related[:2]])
+        campaign_push.push([related[2].id])
+        campaign_push.finish()
+
+        # Campaign prospects of a related record are sorted across the chunks.
+        self.assertEqual(
+            [campaign.campaignprospect_set.get(prospect=prospect).sort_order
+             for prospect in related],
+            [1, 2, 3],
+        )
+
+    def test_bulk_campaign_push_wrong_numbers(self):
+        campaign = self.george_campaign3
+        mommy.make(
+            'sherpa.Prospect',
+            company=self.company1,
+            phone_raw='5550001001',
+            first_name='Bob',
+            wrong_number=True,
+            _quantity=2,
+        )
+        duplicate = mommy.make(
+            'sherpa.Prospect',
+            company=self.company1,
+            phone_raw='5550001001',
+            first_name='Bob',
+        )
+        other = mommy.make(
+            'sherpa.Prospect',
+            company=self.company1,
+            phone_raw='5550001002',
+            first_name='Bob',
+        )
+        BulkCampaignPush(campaign).push([duplicate.id, other.id])
+
+        # Prospects are wrong numbers when others with the same phone and name are.
+        duplicate.refresh_from_db()
+        other.refresh_from_db()
+        self.assertTrue(duplicate.wrong_number)
+        self.assertFalse(other.wrong_number)
+
     def test_prospect_multiple_campaigns_priority(self):
         mommy.make(
             'sherpa.CampaignProspect',
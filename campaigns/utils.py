@@ -1,7 +1,19 @@
 from datetime import datetime
 
-from django.db.models import Case, ExpressionWrapper, F, IntegerField, Value, When
-from django.db.models.functions import Round
+from django.db.models import (
+    Case,
+    Count,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Round
 from django.utils import timezone as django_tz
 
 from core.settings.base import (
@@ -9,8 +21,15 @@ from core.settings.base import (
     DISCOUNT_START_DATE,
     POST_CARD_DISCOUNT_PRICE,
 )
-from properties.utils import get_or_create_attom_tags
-from sherpa.models import Campaign, CampaignProspect, LitigatorList, Prospect, SiteSettings
+from sherpa.models import (
+    Campaign,
+    Market,
+    PhoneNumber,
+    SiteSettings,
+    StatsBatch,
+    UserProfile,
+)
+from .push import BulkCampaignPush
 
 
 def get_campaigns_by_access(user):
@@ -37,6 +56,43 @@ def get_campaigns_by_access(user):
     )
 
 
+def prefetch_campaign_serializer_data(queryset):
+    """
+    Load the data used by the campaign serializers for all the campaigns of the queryset at once,
+    so that serializing a page of campaigns runs a constant amount of queries.
+
+    :param queryset: `Campaign` queryset, such as the campaigns a user has access to.
+    """
+    active_phone_count = PhoneNumber.objects.filter(
+        market=OuterRef('pk'),
+        status=PhoneNumber.Status.ACTIVE,
+    ).order_by().values('market').annotate(total=Count('id')).values('total')
+    markets = Market.objects.select_related('company').annotate(
+        active_phone_count=Coalesce(Subquery(active_phone_count, output_field=IntegerField()), 0),
+        active_campaign_count=Count('campaign', filter=Q(campaign__is_archived=False)),
+    )
+    # Same profiles as `Company.profiles`.
+    profiles = UserProfile.objects.filter(Q(company_id=1) | Q(user__is_staff=False))
+    # `Campaign.current_batch_status` is the first batch that was created.
+    latest_batch = StatsBatch.objects.filter(campaign=OuterRef('pk')).order_by('created_utc')
+
+    return queryset.select_related(
+        'campaign_stats',
+        'company',
+        'created_by',
+        'directmail',
+        'directmail__order',
+        'directmail__return_address',
+    ).prefetch_related(
+        'campaignaccess_set',
+        Prefetch('company__userprofile_set', queryset=profiles, to_attr='profile_list'),
+        Prefetch('market', queryset=markets),
+    ).annotate(
+        latest_batch_number=Subquery(latest_batch.values('batch_number')[:1]),
+        latest_batch_attempts=Subquery(latest_batch.values('send_attempt')[:1]),
+    )
+
+
 def push_to_campaign(campaign, prospect, tags=None, upload_skip_trace=None, sms=True):
     """
     Pushes prospect to specified campaign.
@@ -48,43 +104,9 @@ def push_to_campaign(campaign, prospect, tags=None, upload_skip_trace=None, sms=
     :param tags list: List of tag IDs to add to newly created CampaignProspect.
     :return charge int: Determines if this push should be charged.
     """
-    tags = tags or []
-    charge = 0
-    related = Prospect.objects.filter(related_record_id=prospect.related_record_id)
-    related_phones = related.values('phone_raw')
-    has_litigator_list = LitigatorList.objects.filter(phone__in=related_phones)
-    sort_order = CampaignProspect.objects.filter(
-        prospect__in=related,
-        campaign=campaign,
-    ).count() + 1
-
-    campaign_prospect, _ = prospect.push_to_campaign(
-        campaign=campaign,
-        is_new_prospect=not prospect.upload_duplicate,
-        has_litigator_list=has_litigator_list,
-        sort_order=sort_order,
-        sms=sms,
-    )
-    campaign_prospect.from_upload_skip_trace = upload_skip_trace
-
-    address_obj = prospect.prop.address
-    if address_obj:
-        attom_tags = get_or_create_attom_tags(address_obj, campaign.company)
-        tags.extend(attom_tags)
-
-    if tags and prospect.prop:
-        prospect.prop.tags.add(*tags)
-    prospect.apply_auto_tags(campaign_prospect=campaign_prospect)
-
-    # If not sms, skip the following sms campaign related tasks
-    if not sms or campaign.is_direct_mail:
-        return charge
-
-    if campaign_prospect.include_in_upload_count and not prospect.upload_duplicate:
-        charge = 1
-
-    campaign.update_campaign_stats()
-
+    campaign_push = BulkCampaignPush(campaign, tags, upload_skip_trace, sms)
+    charge = campaign_push.push([prospect.id])
+    campaign_push.finish()
     return charge
 
 
@@ -31,7 +31,7 @@ from companies.tasks import generate_download, modify_freshsuccess_account
 from core.filters import NullsAlwaysLastOrderingFilter
 from core.mixins import CompanyAccessMixin, CreatedByMixin, CSVBulkExporterMixin
 from properties.models import PropertyTagAssignment
-from prospects.serializers import CampaignProspectSerializer
+from prospects.serializers import CampaignProspectBatchSerializer
 from prospects.tasks import upload_prospects_task2
 from search.serializers import StackerSinglePropertyTagSerializer
 from search.tasks import (
@@ -43,7 +43,6 @@ from sherpa.csv_uploader import CSVFieldMapper
 from sherpa.docs import expandable_query_parameters
 from sherpa.models import (
     Campaign,
-    CampaignProspect,
     LeadStage,
     Prospect,
     SMSTemplate,
@@ -64,6 +63,7 @@ from .docs import (
 )
 from .filters import CampaignFilter
 from .models import CampaignNote, CampaignTag, DirectMailCampaign
+from .send_queue import CampaignSendQueue
 from .serializers import (
     CampaignBulkArchiveSerializer,
     CampaignFullStatsSerializer,
@@ -95,7 +95,7 @@ from .serializers import (
     YellowLetterTargetDateResponseSerializer,
 )
 from .tasks import transfer_campaign_prospects
-from .utils import get_campaigns_by_access
+from .utils import get_campaigns_by_access, prefetch_campaign_serializer_data
 
 User = get_user_model()
 
@@ -124,7 +124,22 @@ class CampaignViewSet(
         Returns a queryset of campaigns the request user has access to and calculates the percent
         complete of each campaign for the purpose of sorting and filtering.
         """
-        return get_campaigns_by_access(self.request.user)
+        queryset = get_campaigns_by_access(self.request.user)
+        if self.action in ['list', 'retrieve']:
+            queryset = prefetch_campaign_serializer_data(queryset)
+        return queryset
+
+    @staticmethod
+    def __get_after(query_params):
+        """
+        Return the id of the campaign prospect that the batch prospects should follow, if any.
+        """
+        after = query_params.get('after')
+        if not after:
+            return None
+        if not after.isdigit():
+            raise ValidationError('`after` must be a campaign prospect id.')
+        return int(after)
 
     def __get_cp_queryset(self, query_params):
         """
@@ -544,6 +559,8 @@ class CampaignViewSet(
     def batch_prospects(self, request, pk=None):
         """
         Return the next 100 prospects with their formatted message.
+
+        Pass the id of the last campaign prospect in `after` to get the prospects that follow it.
         """
         campaign = self.get_object()
 
@@ -594,25 +611,9 @@ class CampaignViewSet(
                 campaign.market.current_spam_cooldown_period_end = None
                 campaign.market.save(update_fields=['current_spam_cooldown_period_end'])
 
-        qs = CampaignProspect.objects.filter(
-            campaign=campaign,
-            scheduled=False,
-            skipped=False,
-            sent=False,
-            prospect__phone_type='mobile',
-        ).order_by(
-            '-has_unread_sms',
-            'sort_order',
-            '-last_updated',
-        ).prefetch_related(
-            'campaign',
-            'prospect',
-            'prospect__company',
-            'prospect__tags',
-            'prospect__messages',
-        )[:100]
-
-        serializer = CampaignProspectSerializer(
+        qs = CampaignSendQueue(campaign).get_page(after=self.__get_after(request.query_params))
+
+        serializer = CampaignProspectBatchSerializer(
             qs,
             many=True,
             context={
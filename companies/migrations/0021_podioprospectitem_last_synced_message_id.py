@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0020_auto_20210728_2250'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podioprospectitem',
+            name='last_synced_message_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -336,6 +336,8 @@ class PodioProspectItem(models.Model):
     """
     prospect = models.OneToOneField('sherpa.Prospect', on_delete=models.CASCADE)
     item_id = models.PositiveIntegerField()
+    # Highest message id synced as a comment of the item. Messages up to it are not synced again.
+    last_synced_message_id = models.PositiveIntegerField(null=True, blank=True)
 
 
 class CompanyPropStackFilterSettings(models.Model):
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+import time
+
+from django.core.cache import cache
+
+# Reference data kept for each company, with the function that loads it from the database.
+LEAD_STAGES = 'lead_stages'
+PROPERTY_TAGS = 'property_tags'
+PROSPECT_TAGS = 'prospect_tags'
+
+
+def load_lead_stages(company):
+    from sherpa.models import LeadStage
+    return {stage.lead_stage_title: stage for stage in LeadStage.objects.filter(company=company)}
+
+
+def load_property_tags(company):
+    from properties.models import PropertyTag
+    return {tag.name: tag for tag in PropertyTag.objects.filter(company=company, is_custom=False)}
+
+
+def load_prospect_tags(company):
+    from prospects.models import ProspectTag
+    return {tag.name: tag for tag in ProspectTag.objects.filter(company=company, is_custom=False)}
+
+
+LOADERS = {
+    LEAD_STAGES: load_lead_stages,
+    PROPERTY_TAGS: load_property_tags,
+    PROSPECT_TAGS: load_prospect_tags,
+}
+
+
+class ReferenceCache:
+    """
+    Reference data of companies that rarely changes, such as their lead stages by title.
+
+    Data is kept in a process-local LRU in front of the redis cache, so the lookups in hot paths
+    don't run queries once they are loaded. Signals clear the data when it changes, which clears the
+    redis cache and the LRU of the process where it changed. Other processes keep their copy for
+    `local_timeout` seconds at most.
+    """
+    max_size = 1000
+    local_timeout = 60
+    timeout = 60 * 60 * 24
+
+    def __init__(self):
+        self.local = OrderedDict()
+
+    @staticmethod
+    def get_key(company, name):
+        return f'company_reference_{company.uuid}_{name}'
+
+    def get(self, company, name):
+        """
+        Return the reference data of the company, loading it when it's not cached.
+
+        :param name str: Name of the data, one of `LOADERS`.
+        """
+        key = self.get_key(company, name)
+        entry = self.local.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.local.move_to_end(key)
+            return entry[1]
+
+        value = cache.get(key)
+        if value is None:
+            value = LOADERS[name](company)
+            cache.set(key, value, self.timeout)
+        self.local[key] = (time.monotonic() + self.local_timeout, value)
+        self.local.move_to_end(key)
+        if len(self.local) > self.max_size:
+            self.local.popitem(last=False)
+        return value
+
+    def invalidate(self, company, name):
+        key = self.get_key(company, name)
+        self.local.pop(key, None)
+        cache.delete(key)
+
+    def clear(self):
+        self.local.clear()
+
+
+reference_cache = ReferenceCache()
+
+
+def get_lead_stage(company, title):
+    """
+    Return the company's `LeadStage` with the title, or None when it doesn't exist.
+    """
+    return reference_cache.get(company, LEAD_STAGES).get(title)
+
+
+def get_property_tag(company, name):
+    """
+    Return the company's system `PropertyTag` with the name, or None when it doesn't exist.
+    """
+    return reference_cache.get(company, PROPERTY_TAGS).get(name)
+
+
+def get_prospect_tag(company, name):
+    """
+    Return the company's system `ProspectTag` with the name, or None when it doesn't exist.
+    """
+    return reference_cache.get(company, PROSPECT_TAGS).get(name)
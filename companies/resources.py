@@ -27,7 +27,7 @@ class DNCResource(SherpaModelResource):
 
 
 class CampaignMetaStatsResource(SherpaModelResource):
-    campaign = Field(attribute='campaign', column_name='Campaign')
+    campaign = Field(attribute='campaign__name', column_name='Campaign')
     sent = Field(attribute='sent', column_name='Sent')
     delivered = Field(attribute='delivered', column_name='Delivered')
     responses = Field(attribute='responses', column_name='Responses')
@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 
-from sherpa.models import Company, SubscriptionCancellationRequest
+from properties.models import PropertyTag
+from prospects.models import ProspectTag
+from sherpa.models import Company, LeadStage, SubscriptionCancellationRequest
 from sms.models import CarrierApprovedTemplate, SMSTemplateCategory
+from .reference import LEAD_STAGES, PROPERTY_TAGS, PROSPECT_TAGS, reference_cache
 from .tasks import modify_freshsuccess_account
 
 
@@ -45,5 +48,23 @@ def subscription_cancellation_request_pre_save(sender, instance, *args, **kwargs
         instance.cancellation_date = instance.company.next_billing_date
 
 
+def reference_data_changed(sender, instance, **kwargs):
+    """
+    Clear the cached reference data of the company when its lead stages or tags change.
+    """
+    if kwargs.get('raw'):
+        return
+
+    name = {
+        LeadStage: LEAD_STAGES,
+        PropertyTag: PROPERTY_TAGS,
+        ProspectTag: PROSPECT_TAGS,
+    }[sender]
+    reference_cache.invalidate(instance.company, name)
+
+
 post_save.connect(company_post_save, sender=Company)
 pre_save.connect(subscription_cancellation_request_pre_save, sender=SubscriptionCancellationRequest)
+for model in (LeadStage, PropertyTag, ProspectTag):
+    post_save.connect(reference_data_changed, sender=model)
+    post_delete.connect(reference_data_changed, sender=model)
@@ -1,3 +1,4 @@
+from collections import defaultdict
 import csv
 from datetime import datetime, timedelta
 
@@ -10,6 +11,7 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import MultipleObjectsReturned
 from django.core.files.storage import default_storage
+from django.db import transaction
 from django.db.models import Count, Q, Sum
 from django.utils import timezone
 
@@ -18,6 +20,7 @@ from companies.models import CompanyUploadHistory, PodioFieldMapping, PodioProsp
 from core.utils import clean_phone
 from services.crm.podio import podio, utils
 from services.freshsuccess import FreshsuccessClient, get_dimensions
+from services.http import run_concurrently, TokenBucket
 from sherpa.models import (
     CampaignProspect,
     Company,
@@ -217,178 +220,154 @@ def update_churn_stats():
             churn_company.delete()
 
 
-@shared_task  # noqa:C901
+def get_roi_counts(queryset, company_field='company_id', **annotations):
+    """
+    Return the annotations of the queryset grouped by company, by company id.
+
+    :param queryset: Queryset already filtered to the companies and period of the ROI stats.
+    :param company_field str: The field of the queryset that has the company id.
+    """
+    rows = queryset.order_by().values(company_field).annotate(**annotations)
+    return {row.pop(company_field): row for row in rows}
+
+
+@shared_task
 def update_roi_stats(start_date=None):
     """
     This command will calculate all the ROI stats for sherpa by finding all the revenue and expense
     and calculating data on the profits for each company.
-    """
-    for roi_stat in RoiStat.objects.all():
-        roi_stat.delete()
 
+    Each stat is calculated for all the companies with a single query grouped by company, and the
+    previous stats are replaced with the new ones in a single transaction.
+    """
     # Setup the start and end dates for the ROI period
     now = timezone.now()
     ago = timedelta(days=90)
     period_start = timezone.make_aware(parse(start_date)) if start_date else now - ago
     period_end = now
 
-    company_list = Company.objects.filter(braintree_id__isnull=False)
+    company_list = list(Company.objects.filter(braintree_id__isnull=False))
+    company_ids = [company.id for company in company_list]
 
-    for company in company_list:
-        """
-        Loop through all the eligible companies and get each of their revenue and expense amounts.
-        """
-        # =============== Subscription Sum ===============
-        transaction_subscription_sum_dict = Transaction.objects.filter(
-            company=company,
-            type=Transaction.Type.SUBSCRIPTION,
-            dt_charged__gte=period_start,
-            dt_charged__lte=period_end,
-        ).aggregate(
-            Sum('amount_charged'),
-            subscription_fee_count=Count('amount_charged'),
-        )
-        transaction_subscription_sum = transaction_subscription_sum_dict.get(
-            "amount_charged__sum", 0)
-        if not transaction_subscription_sum:
-            transaction_subscription_sum = 0
-        transaction_subscription_count = transaction_subscription_sum_dict.get(
-            "subscription_fee_count", 0)
-        if not transaction_subscription_count:
-            transaction_subscription_count = 0
-
-        # =============== Skip Trace Sum ===============
-        transaction_skip_trace_sum_dict = Transaction.objects.filter(
-            company=company,
-            type='skip trace fee',
-            dt_charged__gte=period_start,
-            dt_charged__lte=period_end,
-        ).aggregate(
-            Sum('amount_charged'),
-            skip_trace_fee_count=Count('amount_charged'),
-        )
-        transaction_skip_trace_sum = transaction_skip_trace_sum_dict.get("amount_charged__sum", 0)
-        if not transaction_skip_trace_sum:
-            transaction_skip_trace_sum = 0
-        transaction_skip_trace_count = transaction_skip_trace_sum_dict.get(
-            "skip_trace_fee_count", 0)
-        if not transaction_skip_trace_count:
-            transaction_skip_trace_count = 0
-
-        skip_traces = UploadSkipTrace.objects.filter(
-            company=company,
+    # =============== Transaction Sums ===============
+    transaction_fields = {
+        Transaction.Type.SUBSCRIPTION: 'revenue_subscription',
+        'skip trace fee': 'revenue_skip_trace',
+        'upload fee': 'revenue_additional_uploads',
+        'other': 'revenue_other',
+    }
+    transactions = Transaction.objects.filter(
+        company_id__in=company_ids,
+        type__in=transaction_fields,
+        dt_charged__gte=period_start,
+        dt_charged__lte=period_end,
+    ).values('company_id', 'type').annotate(
+        amount=Sum('amount_charged'),
+        count=Count('amount_charged'),
+    )
+    revenue = defaultdict(dict)
+    for row in transactions:
+        field = transaction_fields[row['type']]
+        revenue[row['company_id']][field] = row['amount'] or 0
+        revenue[row['company_id']][f'{field}_count'] = row['count']
+
+    # =============== Skip Trace Hits & Uploads ===============
+    skip_traces = get_roi_counts(
+        UploadSkipTrace.objects.filter(
+            company_id__in=company_ids,
             upload_end__gte=period_start,
             upload_end__lte=period_end,
-        )
+        ),
+        count_skip_trace_hits=Sum('total_billable_hits'),
+        count_skip_trace_uploads=Count('id'),
+    )
 
-        count_skip_trace_hits = skip_traces.aggregate(
-            Sum('total_billable_hits'),
-        ).get('total_billable_hits__sum') or 0
-        count_skip_trace_uploads = skip_traces.count()
+    # =============== Total SMS Sent/Received Counts ===============
+    sms_counts = get_roi_counts(
+        SMSMessage.objects.filter(
+            company_id__in=company_ids,
+            dt__gte=period_start,
+            dt__lte=period_end,
+        ),
+        count_sms_received=Count('pk', filter=Q(from_prospect=True)),
+        count_sms_sent=Count('pk', filter=~Q(from_prospect=True)),
+    )
 
-        # =============== Additional Uploads Sum ===============
-        transaction_upload_sum_dict = Transaction.objects.filter(
-            company=company,
-            type='upload fee',
-            dt_charged__gte=period_start,
-            dt_charged__lte=period_end,
-        ).aggregate(
-            Sum('amount_charged'),
-            upload_fee_count=Count('amount_charged'),
-        )
-        transaction_upload_sum = transaction_upload_sum_dict.get("amount_charged__sum", 0)
-        if not transaction_upload_sum:
-            transaction_upload_sum = 0
-        transaction_upload_count = transaction_upload_sum_dict.get("upload_fee_count", 0)
-        if not transaction_upload_count:
-            transaction_upload_count = 0
-
-        # =============== Other Sum ===============
-        transaction_other_sum_dict = Transaction.objects.filter(
-            company=company,
-            type='other',
-            dt_charged__gte=period_start,
-            dt_charged__lte=period_end,
-        ).aggregate(
-            Sum('amount_charged'),
-            other_fee_count=Count('amount_charged'),
-        )
-        transaction_other_sum = transaction_other_sum_dict.get("amount_charged__sum", 0)
-        if not transaction_other_sum:
-            transaction_other_sum = 0
-        transaction_other_count = transaction_other_sum_dict.get("other_fee_count", 0)
-        if not transaction_other_count:
-            transaction_other_count = 0
-
-        # =============== Total SMS Sent/Received Counts ===============
-        sms_sent_and_received_count = SMSMessage.objects.filter(
-            Q(company_id=company.pk),
-            Q(dt__gte=period_start),
-            Q(dt__lte=period_end),
-        ).values(
-            "company_id",
-        ).annotate(
-            count_from_prospect=Count("pk", filter=Q(from_prospect=True)),
-            count_not_from_prospect=Count("pk", filter=~Q(from_prospect=True)),
-        )[0]
-
-        count_sms_sent = sms_sent_and_received_count['count_not_from_prospect']
-        count_sms_received = sms_sent_and_received_count['count_from_prospect']
-
-        # =============== Total Phone Lookup Count ===============
-        count_phone_type_lookup = PhoneType.objects.filter(
-            company=company,
+    # =============== Total Phone Lookup Count ===============
+    phone_type_lookups = get_roi_counts(
+        PhoneType.objects.filter(
+            company_id__in=company_ids,
             checked_datetime__gte=period_start,
             checked_datetime__lte=period_end,
-        ).count()
+        ),
+        count_phone_type_lookup=Count('id'),
+    )
 
-        # =============== Total Prospects added  ===============
-        count_prospects = company.prospect_set.filter(
+    # =============== Total Prospects added  ===============
+    prospects = get_roi_counts(
+        Prospect.objects.filter(
+            company_id__in=company_ids,
             created_date__gte=period_start,
             created_date__lte=period_end,
-        ).count()
+        ),
+        count_prospects=Count('id'),
+    )
 
-        # =============== Total UNIQUE Prospects added (counts against limit) ===============
-        count_unique_prospects = CampaignProspect.objects.filter(
-            prospect__company=company,
+    # =============== Total UNIQUE Prospects added (counts against limit) ===============
+    unique_prospects = get_roi_counts(
+        CampaignProspect.objects.filter(
+            prospect__company_id__in=company_ids,
             include_in_upload_count=True,
             created_date__gte=period_start,
             created_date__lte=period_end,
-        ).count()
+        ),
+        company_field='prospect__company_id',
+        count_unique_prospects=Count('id'),
+    )
 
-        # =============== Total Phone Number Count ===============
-        count_phone_numbers = PhoneNumber.objects.filter(
-            company=company, status='active').count()
+    # =============== Total Phone Number Count ===============
+    phone_numbers = get_roi_counts(
+        PhoneNumber.objects.filter(company_id__in=company_ids, status='active'),
+        count_phone_numbers=Count('id'),
+    )
 
-        # =============== Save Stats ==============
-        if company.subscription:
-            next_billing_date = company.subscription.next_billing_date
-        else:
-            next_billing_date = None
+    # =============== Next Billing Dates ===============
+    def get_next_billing_date(company):
+        subscription = company.subscription
+        return subscription.next_billing_date if subscription else None
 
-        RoiStat.objects.create(
+    next_billing_dates = run_concurrently(
+        get_next_billing_date,
+        company_list,
+        settings.BRAINTREE_MAX_WORKERS,
+    )
+
+    # =============== Save Stats ==============
+    roi_stats = []
+    for company, next_billing_date in zip(company_list, next_billing_dates):
+        roi_stat = RoiStat(
             company=company,
             period_start=period_start,
             period_end=period_end,
-            revenue_subscription=transaction_subscription_sum,
-            revenue_subscription_count=transaction_subscription_count,
-            revenue_skip_trace=transaction_skip_trace_sum,
-            revenue_skip_trace_count=transaction_skip_trace_count,
-            revenue_additional_uploads=transaction_upload_sum,
-            revenue_additional_uploads_count=transaction_upload_count,
-            revenue_other=transaction_other_sum,
-            revenue_other_count=transaction_other_count,
-            count_sms_sent=count_sms_sent,
-            count_sms_received=count_sms_received,
-            count_phone_type_lookup=count_phone_type_lookup,
-            count_prospects=count_prospects,
-            count_unique_prospects=count_unique_prospects,
             subscription_signup_date=company.subscription_signup_date,
-            count_phone_numbers=count_phone_numbers,
             next_billing_date=next_billing_date,
-            count_skip_trace_hits=count_skip_trace_hits,
-            count_skip_trace_uploads=count_skip_trace_uploads,
         )
+        for counts in [
+            revenue,
+            skip_traces,
+            sms_counts,
+            phone_type_lookups,
+            prospects,
+            unique_prospects,
+            phone_numbers,
+        ]:
+            for field, value in counts.get(company.id, {}).items():
+                setattr(roi_stat, field, value or 0)
+        roi_stats.append(roi_stat)
+
+    with transaction.atomic():
+        RoiStat.objects.all().delete()
+        RoiStat.objects.bulk_create(roi_stats)
 
 
 @shared_task
@@ -599,29 +578,91 @@ def set_freshsuccess_billing(company_id):
     fresh_client.update('accounts', company.id, payload)
 
 
-def sync_prospect_messages_to_podio(client, prospect, item_id):
+def get_podio_comment_ids(client, item_id, limit=100):
+    """
+    Return the external ids of all the comments of a podio item, paging through the comments.
+    """
+    comment_ids = set()
+    offset = 0
+    while True:
+        comments = client.api.Comment.get_comments_for_item(item_id, limit=limit, offset=offset)\
+                                     .get('response')\
+                                     .get('data', [])
+        comment_ids.update(comment['external_id'] for comment in comments)
+        if len(comments) < limit:
+            return comment_ids
+        offset += limit
+
+
+def sync_prospect_messages_to_podio(client, prospect_items):
     """Sync the prospect messages to podio after a successful prospect sync
 
-    :param client PodioClient: Podio Client instance to interact with podio
-    :param prospect Prospect:  The Prospect we're syncing
-    :param item_id  Int:       Item id that was returned by podio after syncing the prospect
+    The prospects are synced concurrently, limited by `PODIO_MAX_WORKERS` and `PODIO_RATE_LIMIT`,
+    but the comments of a prospect are posted one at a time so that they stay in chronological
+    order in podio.
+
+    :param client PodioClient:                Podio Client instance to interact with podio
+    :param prospect_items list:               The synced prospects and their podio items
     """
-    existing_comments = client.api.Comment.get_comments_for_item(item_id)\
-                                          .get('response')\
-                                          .get('data', [])
-    existing_comment_ids = [comment['external_id'] for comment in existing_comments]
-
-    for message in prospect.messages.all():
-        message_id = str(message.pk)
-
-        if message_id not in existing_comment_ids:
-            date = str(message.dt.date())
-            message_string = f'**From: {message.from_name}**\n**{date}**\n{message.message}'
-            payload = {
-                'value': message_string,
-                'external_id': message_id,
-            }
+    rate_limiter = TokenBucket(settings.PODIO_RATE_LIMIT)
+    errors = [
+        error for error in run_concurrently(
+            lambda prospect_item: sync_podio_item_messages(client, prospect_item, rate_limiter),
+            prospect_items,
+            settings.PODIO_MAX_WORKERS,
+        )
+        if error
+    ]
+    if errors:
+        raise errors[0]
+
+
+def sync_podio_item_messages(client, prospect_item, rate_limiter):
+    """Post the prospect messages as comments of its podio item, in order
+
+    Only the messages after the item's `last_synced_message_id` are synced. When the item has not
+    been synced yet, the existing comments are fetched to avoid posting duplicates.
+
+    :param client PodioClient:                Podio Client instance to interact with podio
+    :param prospect_item PodioProspectItem:   The synced prospect and its podio item
+    :param rate_limiter TokenBucket:          Rate limit shared by the prospects being synced
+    :return:                                  The error that stopped the sync, if any
+    """
+    item_id = prospect_item.item_id
+    messages = prospect_item.prospect.messages.order_by('pk')
+    if prospect_item.last_synced_message_id:
+        messages = messages.filter(pk__gt=prospect_item.last_synced_message_id)
+    messages = list(messages)
+    if not messages:
+        return None
+
+    existing_comment_ids = set()
+    if not prospect_item.last_synced_message_id:
+        existing_comment_ids = get_podio_comment_ids(client, item_id)
+
+    error = None
+    for message in messages:
+        if str(message.pk) in existing_comment_ids:
+            prospect_item.last_synced_message_id = message.pk
+            continue
+
+        date = str(message.dt.date())
+        message_string = f'**From: {message.from_name}**\n**{date}**\n{message.message}'
+        payload = {
+            'value': message_string,
+            'external_id': str(message.pk),
+        }
+        rate_limiter.acquire()
+        try:
             client.api.Comment.create('item', str(item_id), payload)
+        except Exception as e:
+            # The next sync continues from the last message that was posted.
+            error = e
+            break
+        prospect_item.last_synced_message_id = message.pk
+
+    prospect_item.save(update_fields=['last_synced_message_id'])
+    return error
 
 
 def push_data_to_podio_error_rollback(attributes, prospect, task, e: Exception):
@@ -678,22 +719,20 @@ def push_data_to_podio(task_id):
         podio_prospect_item = PodioProspectItem.objects.filter(
             prospect=attributes.get('prospect_id'),
         )
-        item_id = None
 
         if(podio_prospect_item.exists()):
             prospect_item = podio_prospect_item.first()
             prospect = prospect_item.prospect
-            item_id = prospect_item.item_id
-            response = client.api.Item.update(item_id, data_to_sync)
+            response = client.api.Item.update(prospect_item.item_id, data_to_sync)
         else:
             response = client.api.Item.create(app_id, data_to_sync)
             item_id = response['response']['data']['item_id']
 
             prospect = Prospect.objects.get(pk=attributes.get('prospect_id'))
-            PodioProspectItem.objects.create(prospect=prospect, item_id=item_id)
+            prospect_item = PodioProspectItem.objects.create(prospect=prospect, item_id=item_id)
 
         # sync the messages
-        sync_prospect_messages_to_podio(client, prospect, item_id)
+        sync_prospect_messages_to_podio(client, [prospect_item])
 
         task.complete_task()
 
@@ -1,7 +1,9 @@
 from datetime import date, timedelta
 import os
+from types import SimpleNamespace
 
 from model_mommy import mommy
+from pypodio2.transport import TransportException
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -10,7 +12,7 @@ from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APIClient
 
-from billing.models import product
+from billing.models import product, Transaction
 from campaigns.models import CampaignDailyStats
 from campaigns.tests import CampaignDataMixin
 from services.crm.podio import podio
@@ -20,6 +22,7 @@ from sherpa.models import (
     InvitationCode,
     PhoneNumber,
     Prospect,
+    RoiStat,
     SubscriptionCancellationRequest,
 )
 from sherpa.tests import (
@@ -32,7 +35,12 @@ from sherpa.tests import (
 )
 from sms.models import CarrierApprovedTemplate
 from .models import CompanyPodioCrm, TelephonyConnection
-from .tasks import process_cancellation_requests
+from .reference import get_lead_stage, get_property_tag, get_prospect_tag, reference_cache
+from .tasks import (
+    process_cancellation_requests,
+    sync_prospect_messages_to_podio,
+    update_roi_stats,
+)
 
 User = get_user_model()
 
@@ -544,6 +552,38 @@ class CompanyCampaignStatsAPITestCase(CampaignDataMixin, BaseAPITestCase):
         )
         self.assertEqual(len(response_data), expected_queryset.count())
 
+    def test_campaign_meta_stats_with_rollups(self):
+        start_date = date(2021, 1, 27)
+        end_date = date(2021, 4, 10)
+        stats = dict(new_leads=1, skipped=0, delivered=2, sent=4, auto_dead=0, responses=1)
+        current = start_date - timedelta(days=3)
+        while current <= end_date + timedelta(days=3):
+            CampaignDailyStats.objects.upsert(current, {self.george_campaign.id: stats})
+            current += timedelta(days=1)
+        mommy.make(
+            'campaigns.CampaignDailyStats',
+            campaign=self.george_campaign2,
+            date=date(2021, 3, 15),
+            sent=10,
+            delivered=5,
+            responses=0,
+            skipped=0,
+            auto_dead=0,
+            new_leads=1,
+        )
+
+        days = (end_date - start_date).days + 1
+        meta_stats = self.company1.campaign_meta_stats(str(start_date), str(end_date))
+        self.assertEqual(len(meta_stats), 2)
+        george_stats, george2_stats = meta_stats
+        self.assertEqual(george_stats['campaign']['name'], self.george_campaign.name)
+        self.assertEqual(george_stats['sent'], days * 4)
+        self.assertEqual(george_stats['delivered'], days * 2)
+        self.assertEqual(george_stats['delivery_rate'], 50)
+        self.assertEqual(george_stats['response_rate'], 50)
+        self.assertEqual(george2_stats['sent'], 10)
+        self.assertEqual(george2_stats['performance_rating'], 10)
+
 
 class CompanyGoalAPITestCase(CompanyTwoMixin, CompanyOneMixin, NoDataBaseTestCase):
 
@@ -872,6 +912,121 @@ class CompanyTaskTestCase(CompanyTwoMixin, CompanyOneMixin, NoDataBaseTestCase):
             self.assertEqual(company.subscription_status, cancelled_status)
             self.assertEqual(company.subscription_id, '')
 
+    def test_update_roi_stats(self):
+        now = timezone.now()
+        Company.objects.filter(id=self.company2.id).update(braintree_id='7834579')
+        mommy.make(
+            'billing.Transaction',
+            company=self.company1,
+            type=Transaction.Type.SUBSCRIPTION,
+            amount_charged=100,
+            dt_charged=now,
+            _quantity=2,
+        )
+        mommy.make(
+            'billing.Transaction',
+            company=self.company1,
+            type='skip trace fee',
+            amount_charged=20,
+            dt_charged=now,
+        )
+        # Transactions outside of the period are not included.
+        mommy.make(
+            'billing.Transaction',
+            company=self.company2,
+            type=Transaction.Type.SUBSCRIPTION,
+            amount_charged=100,
+            dt_charged=now - timedelta(days=100),
+        )
+        mommy.make('sherpa.SMSMessage', company=self.company1, from_prospect=True)
+        mommy.make('sherpa.SMSMessage', company=self.company1, from_prospect=False, _quantity=3)
+        mommy.make('sherpa.PhoneNumber', company=self.company2, status='active')
+        old_stat = mommy.make('sherpa.RoiStat', company=self.company1)
+
+        update_roi_stats()
+
+        self.assertFalse(RoiStat.objects.filter(id=old_stat.id).exists())
+        stats = RoiStat.objects.get(company=self.company1)
+        self.assertEqual(stats.revenue_subscription, 200)
+        self.assertEqual(stats.revenue_subscription_count, 2)
+        self.assertEqual(stats.revenue_skip_trace, 20)
+        self.assertEqual(stats.revenue_skip_trace_count, 1)
+        self.assertEqual(stats.revenue_other, 0)
+        self.assertEqual(stats.count_sms_sent, 3)
+        self.assertEqual(stats.count_sms_received, 1)
+        self.assertEqual(stats.count_phone_numbers, 0)
+
+        stats2 = RoiStat.objects.get(company=self.company2)
+        self.assertEqual(stats2.revenue_subscription, 0)
+        self.assertEqual(stats2.count_phone_numbers, 1)
+
+    def test_sync_prospect_messages_to_podio(self):
+        class FakeComments:
+            def __init__(self, existing, failing=()):
+                self.existing = existing
+                self.failing = failing
+                self.created = []
+
+            def get_comments_for_item(self, item_id, limit=100, offset=0):
+                page = self.existing[offset:offset + limit]
+                return {'response': {'data': [{'external_id': i} for i in page]}}
+
+            def create(self, object_type, object_id, attrs):
+                if attrs['external_id'] in self.failing:
+                    raise TransportException({'status': '500'}, 'error')
+                self.created.append((object_id, attrs['external_id']))
+
+        prospect = mommy.make('sherpa.Prospect', company=self.company1)
+        messages = mommy.make(
+            'sherpa.SMSMessage',
+            prospect=prospect,
+            dt=timezone.now(),
+            _quantity=3,
+        )
+        prospect_item = mommy.make('companies.PodioProspectItem', prospect=prospect, item_id=12)
+        message_ids = [str(pk) for pk in sorted(message.pk for message in messages)]
+
+        # First sync skips the comments that already exist in podio, paging through them.
+        comments = FakeComments([message_ids[0]] + [f'x{i}' for i in range(100)])
+        client = SimpleNamespace(api=SimpleNamespace(Comment=comments))
+        sync_prospect_messages_to_podio(client, [prospect_item])
+        self.assertEqual(comments.created, [('12', pk) for pk in message_ids[1:]])
+        prospect_item.refresh_from_db()
+        self.assertEqual(prospect_item.last_synced_message_id, int(message_ids[-1]))
+
+        # Re-syncs only send the new messages, without fetching the existing comments.
+        new_message = mommy.make('sherpa.SMSMessage', prospect=prospect, dt=timezone.now())
+        comments = FakeComments(None)
+        client = SimpleNamespace(api=SimpleNamespace(Comment=comments))
+        sync_prospect_messages_to_podio(client, [prospect_item])
+        self.assertEqual(comments.created, [('12', str(new_message.pk))])
+
+        # The comments of each prospect are posted in order, and a failed comment stops the
+        # prospect's sync at the last posted message.
+        new_messages = mommy.make(
+            'sherpa.SMSMessage',
+            prospect=prospect,
+            dt=timezone.now(),
+            _quantity=3,
+        )
+        new_ids = [str(pk) for pk in sorted(message.pk for message in new_messages)]
+        other_prospect = mommy.make('sherpa.Prospect', company=self.company1)
+        other_message = mommy.make('sherpa.SMSMessage', prospect=other_prospect, dt=timezone.now())
+        other_item = mommy.make(
+            'companies.PodioProspectItem',
+            prospect=other_prospect,
+            item_id=13,
+        )
+        comments = FakeComments([], failing=[new_ids[1]])
+        client = SimpleNamespace(api=SimpleNamespace(Comment=comments))
+        with self.assertRaises(TransportException):
+            sync_prospect_messages_to_podio(client, [prospect_item, other_item])
+        self.assertEqual(comments.created, [('12', new_ids[0]), ('13', str(other_message.pk))])
+        prospect_item.refresh_from_db()
+        other_item.refresh_from_db()
+        self.assertEqual(prospect_item.last_synced_message_id, int(new_ids[0]))
+        self.assertEqual(other_item.last_synced_message_id, other_message.pk)
+
 
 class CompanyCancellationFlowTestCase(AdminUserMixin, CompanyOneMixin, NoDataBaseTestCase):
     def setUp(self):
@@ -979,6 +1134,35 @@ class SubscriptionCancellationRequestModelTestCase(CompanyOneMixin, NoDataBaseTe
         self.assertRaises(Exception, self.cancellation_request.handle_downgrade)
 
 
+class ReferenceCacheTestCase(CompanyOneMixin, NoDataBaseTestCase):
+
+    def test_lead_stages_are_cached_until_changed(self):
+        dead = get_lead_stage(self.company1, 'Dead')
+        self.assertEqual(dead.lead_stage_title, 'Dead')
+        self.assertIsNone(get_lead_stage(self.company1, 'Missing'))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_lead_stage(self.company1, 'Dead'), dead)
+
+        # Other processes load the stages from redis.
+        reference_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_lead_stage(self.company1, 'Dead'), dead)
+
+        dead.is_active = False
+        dead.save()
+        self.assertFalse(get_lead_stage(self.company1, 'Dead').is_active)
+        dead.delete()
+        self.assertIsNone(get_lead_stage(self.company1, 'Dead'))
+
+    def test_system_tags(self):
+        tag = mommy.make('prospects.ProspectTag', company=self.company1, name='Litigator')
+        self.assertEqual(get_prospect_tag(self.company1, 'Litigator'), tag)
+        self.assertEqual(get_property_tag(self.company1, 'Vacant').name, 'Vacant')
+
+        mommy.make('properties.PropertyTag', company=self.company1, name='Custom', is_custom=True)
+        self.assertIsNone(get_property_tag(self.company1, 'Custom'))
+
+
 class TelephonyConnectionModelTestCase(CompanyOneMixin, NoDataBaseTestCase):
 
     def test_api_secret_is_encoded(self):
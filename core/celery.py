@@ -32,6 +32,7 @@ app.conf.task_routes = {
     'companies.tasks.update_churn_stats': {'queue': 'slow'},
     'companies.tasks.upload_internal_dnc_task': {'queue': 'slow'},
     'litigation.tasks.upload_litigator_list_task': {'queue': 'slow'},
+    'prospects.tasks.flush_address_validation_queue': {'queue': 'slow'},
     'prospects.tasks.update_prospect_after_create': {'queue': 'slow'},
     'prospects.tasks.update_prospect_async': {'queue': 'slow'},
     'prospects.tasks.upload_prospects_task2': {'queue': 'slow'},
@@ -21,7 +21,13 @@ class SherpaResource(resources.Resource):
         This method is used internally and should not be called manually.
         """
         if isinstance(obj, dict):
-            return obj.get(field.attribute)
+            if field.attribute in obj:
+                return obj[field.attribute]
+            # Follow nested dicts, like `Field` does for related objects.
+            value = obj
+            for attr in field.attribute.split('__'):
+                value = value.get(attr) if isinstance(value, dict) else None
+            return value
         field_name = self.get_field_name(field)
         method = getattr(self, f'dehydrate_{ field_name }', None)
         if method is not None:
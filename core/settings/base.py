@@ -298,6 +298,8 @@ else:
 
 BRAINTREE_PRIVATE_KEY = os.getenv('BRAINTREE_PRIVATE_KEY')
 BRAINTREE_TESTING_ENABLED = False
+# Number of braintree api requests made at the same time by batch tasks.
+BRAINTREE_MAX_WORKERS = 1 if TEST_MODE else int(os.getenv('BRAINTREE_MAX_WORKERS', 8))
 
 
 # User Roles
@@ -319,6 +321,8 @@ TELNYX_RELAY_MESSAGING_PROFILE_ID = os.getenv(
     'TELNYX_RELAY_MESSAGING_PROFILE_ID', '37bc298e-6a06-4472-af3e-8b80d31c2379')
 TELNYX_RELAY_CONNECTIONS = 16
 TELNYX_CREDENTIAL_ID = '76d610a2-3cf1-41a4-a47a-d74867c5134c'
+# Number of phone carriers looked up in telnyx at the same time.
+CARRIER_LOOKUP_MAX_WORKERS = 1 if TEST_MODE else int(os.getenv('CARRIER_LOOKUP_MAX_WORKERS', 8))
 
 TWILIO_TEST_SID = 'AC69ad8d1a3e9ded3f7f11d029619df871'
 TWILIO_TEST_PRIVATE_TOKEN = os.getenv('TWILIO_TEST_PRIVATE_TOKEN')
@@ -375,6 +379,11 @@ SPAM_WORDS = [
 # Direct Mail Settings
 YELLOW_LETTER_TOKEN = os.getenv('YELLOW_LETTER_TOKEN')
 ACCUZIP_TOKEN = os.getenv('ACCUZIP_TOKEN')
+# Seconds to wait for AccuTrace to respond before the request is retried.
+ACCUTRACE_TIMEOUT = 30
+# Number of direct mail orders that have their tracking refreshed at the same time.
+DIRECTMAIL_TRACKING_MAX_WORKERS = 1 if TEST_MODE else int(
+    os.getenv('DIRECTMAIL_TRACKING_MAX_WORKERS', 8))
 
 # Use redis from localhost if not set in environment variable.
 REDIS_URL = os.environ['REDIS_URL']
@@ -394,6 +403,13 @@ IDI_CLIENT_ID = 'api-client@snowy2_test'
 IDI_CLIENT_SECRET = os.getenv('IDI_CLIENT_SECRET')
 IDI_LOGIN_BASE_URL = 'https://login-api-test.idicore.com/'
 IDI_API_BASE_URL = 'https://api-test.idicore.com/'
+# Seconds to wait for IDI to respond before the request is retried.
+IDI_TIMEOUT = 30
+# Number of records of an upload batch searched in IDI at the same time. Tests need to run in the
+# main thread to see the data in the test transaction.
+IDI_MAX_WORKERS = 1 if TEST_MODE else int(os.getenv('IDI_MAX_WORKERS', 8))
+# Maximum IDI searches per second for each worker process.
+IDI_RATE_LIMIT = int(os.getenv('IDI_RATE_LIMIT', 20))
 
 
 # Skip Trace Credit settings
@@ -425,6 +441,10 @@ TELEPHONY_WEBHOOK_DOMAIN = 'localhost:8000'
 # Podio credentials
 PODIO_CLIENT_ID = os.getenv('PODIO_CLIENT_ID')
 PODIO_CLIENT_SECRET = os.getenv('PODIO_CLIENT_SECRET')
+# Number of prospects whose messages are posted to podio at the same time.
+PODIO_MAX_WORKERS = 1 if TEST_MODE else int(os.getenv('PODIO_MAX_WORKERS', 4))
+# Maximum podio comments posted per second for each worker process.
+PODIO_RATE_LIMIT = int(os.getenv('PODIO_RATE_LIMIT', 5))
 SHERPA_FIELDS_MAPPING = [
     {"label": "First Name", "value": "first_name", "example": "John"},
     {"label": "Last Name", "value": "last_name", "example": "Doe"},
@@ -583,6 +603,7 @@ SALESFORCE_USERNAME = ''.join((
 # TODO: re-12-factor
 SALESFORCE_PASSWORD = 'pqEX%B%BAW2M+iD'  # os.environ['SALESFORCE_PASSWORD']
 SALESFORCE_SECURITY_TOKEN = 'Db5ZbMjIF7BIrfnWsrJEuxxBD'  # os.environ['SALESFORCE_SECURITY_TOKEN']
+SALESFORCE_MAX_WORKERS = 1 if TEST_MODE else int(os.getenv('SALESFORCE_MAX_WORKERS', 4))
 
 # logging configuration will be merged with default so only put adds/changes here
 LOGGING = DEFAULT_LOGGING
@@ -0,0 +1,180 @@
+from datetime import datetime, time, timedelta
+
+from django_redis import get_redis_connection
+import pytz
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone as django_tz
+
+# The amounts sent today in the database are cleared every night at this time by the
+# `clear_today_sent_received_count` command.
+DAILY_RESET_TIMEZONE = pytz.timezone('US/Eastern')
+DAILY_RESET_HOUR = 3
+
+# Count a send unless the market went over its daily limit. Counters that don't exist yet are
+# created with the amount that was sent before they existed. The company counter is only
+# incremented once it has been created when read.
+RESERVE_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 0 then
+    redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+end
+if tonumber(redis.call('get', KEYS[1])) > tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('incr', KEYS[1])
+if redis.call('exists', KEYS[2]) == 1 then
+    redis.call('incr', KEYS[2])
+end
+return 1
+"""
+
+RELEASE_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if tonumber(redis.call('get', key) or 0) > 0 then
+        redis.call('decr', key)
+    end
+end
+"""
+
+
+def get_last_reset(now):
+    """
+    Return the time of the last nightly reset of the amounts sent today in the database.
+    """
+    reset_date = now.astimezone(DAILY_RESET_TIMEZONE).date()
+    if now.astimezone(DAILY_RESET_TIMEZONE).hour < DAILY_RESET_HOUR:
+        reset_date -= timedelta(days=1)
+    return DAILY_RESET_TIMEZONE.localize(datetime.combine(reset_date, time(DAILY_RESET_HOUR)))
+
+
+class SendCapacity:
+    """
+    Daily limit of initial bulk sends of a company and its markets, and the amount sent today.
+
+    The limits are cached until the phone numbers of a market change. The amount sent today is kept
+    in redis counters for the company's local day, so they start over at the company's midnight,
+    and sends are counted with `reserve`, which checks the market limit and counts the send at
+    once so that concurrent sends can't go over the limit.
+    """
+    limit_timeout = 60 * 15
+    # Counters are kept a bit longer than a day, as they are for the company's local day.
+    counter_timeout = 60 * 60 * 48
+
+    def __init__(self, company, now=None):
+        """
+        :param now datetime: Time to count the sends at, the current time when not given.
+        """
+        self.company = company
+        self.now = now
+        self.redis = get_redis_connection()
+
+    @property
+    def local_now(self):
+        return (self.now or django_tz.now()).astimezone(pytz.timezone(self.company.timezone))
+
+    @property
+    def local_date(self):
+        return self.local_now.date()
+
+    def get_limit_key(self, market=None):
+        suffix = market.id if market else 'company'
+        return f'send_limit_{self.company.uuid}_{suffix}'
+
+    def get_sent_key(self, market=None):
+        suffix = market.id if market else 'company'
+        return cache.make_key(f'sent_today_{self.company.uuid}_{self.local_date}_{suffix}')
+
+    def get_limit(self, market=None):
+        """
+        Return the daily limit of the market, or of the company when there's no market.
+        """
+        key = self.get_limit_key(market)
+        limit = cache.get(key)
+        if limit is None:
+            if market:
+                limit = market.calculate_send_sms_daily_limit()
+            else:
+                limit = self.company.calculate_send_sms_daily_limit()
+            cache.set(key, limit, self.limit_timeout)
+        return limit
+
+    def invalidate(self, market=None):
+        """
+        Clear the cached limits after the phone numbers of a market changed, or of all the
+        company's markets when there's no market.
+        """
+        if market:
+            market_ids = [market.id]
+        else:
+            market_ids = self.company.market_set.values_list('id', flat=True)
+        cache.delete_many([self.get_limit_key()] + [
+            f'send_limit_{self.company.uuid}_{market_id}' for market_id in market_ids
+        ])
+
+    def get_initial_sent(self, market=None):
+        """
+        Return the amount sent today in the database, to create the counters with when they don't
+        exist yet.
+
+        The database amounts are cleared at night in eastern time, so they are still the amounts of
+        the previous day until then for companies that are already in their next day. Counters of
+        those days start with 0.
+        """
+        local_now = self.local_now
+        midnight = local_now.tzinfo.localize(datetime.combine(local_now.date(), time()))
+        if get_last_reset(local_now) < midnight:
+            return 0
+
+        if market:
+            return market.total_intial_sms_sent_today_count
+        return self.company.market_set.aggregate(
+            total=Sum('total_intial_sms_sent_today_count'),
+        )['total'] or 0
+
+    def get_sent_today(self, market=None):
+        """
+        Return the amount of initial messages sent today by the market, or by the company when
+        there's no market.
+        """
+        key = self.get_sent_key(market)
+        sent = self.redis.get(key)
+        if sent is not None:
+            return int(sent)
+
+        sent = self.get_initial_sent(market)
+        if not self.redis.set(key, sent, ex=self.counter_timeout, nx=True):
+            # The counter was created at the same time.
+            sent = int(self.redis.get(key))
+        return sent
+
+    def get_available(self, market):
+        """
+        Return the amount of initial messages the market can still send today.
+        """
+        return max(self.get_limit(market) - self.get_sent_today(market), 0)
+
+    def is_over_limit(self, market):
+        return self.get_sent_today(market) > self.get_limit(market)
+
+    def reserve(self, market):
+        """
+        Count an initial message of the market unless it went over its daily limit.
+
+        :return bool: Whether the message can be sent.
+        """
+        return bool(self.redis.eval(
+            RESERVE_SCRIPT,
+            2,
+            self.get_sent_key(market),
+            self.get_sent_key(),
+            self.get_limit(market),
+            self.get_initial_sent(market),
+            self.counter_timeout,
+        ))
+
+    def release(self, market):
+        """
+        Stop counting a reserved message that was not sent.
+        """
+        self.redis.eval(RELEASE_SCRIPT, 2, self.get_sent_key(market), self.get_sent_key())
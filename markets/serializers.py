@@ -9,6 +9,9 @@ class MarketSerializer(serializers.ModelSerializer):
     total_initial_send_sms_daily_limit = serializers.IntegerField()
 
     def get_campaign_count(self, obj):
+        active_campaign_count = getattr(obj, 'active_campaign_count', None)
+        if active_campaign_count is not None:
+            return active_campaign_count
         return obj.active_campaigns.count()
 
     def validate_call_forwarding_number(self, value):
@@ -1,6 +1,13 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 
-from sherpa.models import Market
+from sherpa.models import Market, PhoneNumber
+from sms.routing import InboundRoutes
+from .capacity import SendCapacity
+
+# Fields that change the daily send limit of a market.
+MARKET_SEND_LIMIT_FIELDS = {'is_active', 'name'}
+PHONE_NUMBER_SEND_LIMIT_FIELDS = {'market', 'provider', 'status'}
+PHONE_NUMBER_ROUTE_FIELDS = {'company', 'market', 'phone', 'provider', 'status'}
 
 
 def market_post_save(sender, instance, created, **kwargs):
@@ -17,4 +24,40 @@ def market_post_save(sender, instance, created, **kwargs):
         instance.save()
 
 
+def market_send_limit_post_save(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Clear the cached send limits of the market when it's activated or deactivated.
+    """
+    if update_fields and not MARKET_SEND_LIMIT_FIELDS.intersection(update_fields):
+        return
+    SendCapacity(instance.company).invalidate(instance)
+
+
+def phone_number_post_save(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Clear the cached send limits of the phone number's market when its status changes.
+    """
+    if update_fields and not PHONE_NUMBER_SEND_LIMIT_FIELDS.intersection(update_fields):
+        return
+    SendCapacity(instance.market.company).invalidate(instance.market)
+
+
+def phone_number_post_delete(sender, instance, **kwargs):
+    SendCapacity(instance.market.company).invalidate(instance.market)
+
+
+def phone_number_route_changed(sender, instance, update_fields=None, **kwargs):
+    """
+    Clear the inbound route of the number, it's loaded again with the next received message.
+    """
+    if update_fields and not PHONE_NUMBER_ROUTE_FIELDS.intersection(update_fields):
+        return
+    InboundRoutes().remove_number(instance.phone)
+
+
 post_save.connect(market_post_save, sender=Market)
+post_save.connect(market_send_limit_post_save, sender=Market)
+post_save.connect(phone_number_post_save, sender=PhoneNumber)
+post_delete.connect(phone_number_post_delete, sender=PhoneNumber)
+post_save.connect(phone_number_route_changed, sender=PhoneNumber)
+post_delete.connect(phone_number_route_changed, sender=PhoneNumber)
@@ -1,9 +1,15 @@
+from datetime import datetime, time
+
 from model_mommy import mommy
+import pytz
 
+from django.conf import settings
 from django.urls import reverse
+from django.utils import timezone
 
-from sherpa.models import AreaCodeState, Market
+from sherpa.models import AreaCodeState, Market, PhoneNumber
 from sherpa.tests import BaseTestCase, CompanyOneMixin, CompanyTwoMixin, NoDataBaseTestCase
+from .capacity import SendCapacity
 from .utils import format_telnyx_available_numbers
 
 
@@ -57,6 +63,66 @@ class MarketModelTestCase(MarketDataMixin, BaseTestCase):
         self.assertEqual(self.market1.active_campaigns.count(), active_count)
 
 
+class SendCapacityTestCase(MarketDataMixin, CompanyTwoMixin, CompanyOneMixin, NoDataBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.capacity = SendCapacity(self.company1)
+        self.limit = settings.MESSAGES_PER_PHONE_PER_DAY
+
+    def test_limit_is_cached_until_numbers_change(self):
+        self.assertEqual(self.capacity.get_limit(self.market1), self.limit * 2)
+        self.assertEqual(self.capacity.get_limit(), self.limit * 2)
+
+        self.phone_number_2.status = PhoneNumber.Status.INACTIVE
+        self.phone_number_2.save(update_fields=['status'])
+        self.assertEqual(self.capacity.get_limit(self.market1), self.limit)
+        self.assertEqual(self.company1.total_initial_send_sms_daily_limit, self.limit)
+
+    def test_reserve(self):
+        # Count at noon of the company's current day, after the nightly reset of the database.
+        tz = pytz.timezone(self.company1.timezone)
+        noon = datetime.combine(timezone.now().astimezone(tz).date(), time(12))
+        self.capacity = SendCapacity(self.company1, now=tz.localize(noon))
+
+        self.market1.total_intial_sms_sent_today_count = self.limit * 2 - 2
+        self.market1.save(update_fields=['total_intial_sms_sent_today_count'])
+        self.assertEqual(self.capacity.get_sent_today(), self.limit * 2 - 2)
+
+        # Sends are counted until the market goes over its limit.
+        for _ in range(3):
+            self.assertTrue(self.capacity.reserve(self.market1))
+        self.assertFalse(self.capacity.reserve(self.market1))
+        self.assertTrue(self.capacity.is_over_limit(self.market1))
+        self.assertEqual(self.market1.total_sends_available, 0)
+
+        self.capacity.release(self.market1)
+        self.assertEqual(self.capacity.get_sent_today(self.market1), self.limit * 2)
+        self.assertEqual(self.capacity.get_sent_today(), self.limit * 2)
+        self.assertEqual(self.capacity.get_sent_today(self.market2), 0)
+
+    def test_sent_today_rollover(self):
+        self.market1.total_intial_sms_sent_today_count = 10
+        self.market1.save(update_fields=['total_intial_sms_sent_today_count'])
+        self.company1.timezone = 'US/Central'
+        tz = pytz.timezone(self.company1.timezone)
+
+        # Between the company's midnight and the nightly reset the database still has the amounts
+        # of the previous day.
+        capacity = SendCapacity(self.company1, now=tz.localize(datetime(2021, 3, 10, 1, 30)))
+        self.assertEqual(capacity.get_sent_today(), 0)
+        self.assertTrue(capacity.reserve(self.market1))
+        self.assertEqual(capacity.get_sent_today(self.market1), 1)
+        self.assertEqual(capacity.get_sent_today(), 1)
+
+        # After the reset they are the amounts of the day.
+        capacity = SendCapacity(self.company1, now=tz.localize(datetime(2021, 3, 11, 2, 30)))
+        self.assertEqual(capacity.get_sent_today(), 10)
+        self.assertTrue(capacity.reserve(self.market1))
+        self.assertEqual(capacity.get_sent_today(self.market1), 11)
+        self.assertEqual(capacity.get_sent_today(), 11)
+
+
 class MarketAPITestCase(MarketDataMixin, CompanyTwoMixin, CompanyOneMixin, NoDataBaseTestCase):
     list_url = reverse('market-list')
     purchase_url = reverse('market-purchase')
@@ -288,6 +354,28 @@ class MarketAPITestCase(MarketDataMixin, CompanyTwoMixin, CompanyOneMixin, NoDat
         phone3.refresh_from_db()
         self.assertEqual(phone3.market.name, payload['name'])
 
+    def test_telephony_market_clears_send_limits(self):
+        capacity = SendCapacity(self.company1)
+        limit = settings.MESSAGES_PER_PHONE_PER_DAY
+        self.assertEqual(capacity.get_limit(self.market1), limit * 2)
+        self.assertEqual(capacity.get_limit(), limit * 2)
+
+        url = reverse('market-telephony-market')
+        payload = {
+            'name': 'Twilio Test',
+            'call_forwarding': 9999999999,
+            'numbers': [self.phone_number_2.pk],
+            'provider_id': 0,
+        }
+        response = self.master_admin_client.post(url, payload)
+        self.assertEqual(response.status_code, 200)
+        market = Market.objects.get(id=response.json()['id'])
+
+        # The numbers moved from the old market to the new one.
+        self.assertEqual(capacity.get_limit(self.market1), limit)
+        self.assertEqual(capacity.get_limit(market), limit)
+        self.assertEqual(capacity.get_limit(), limit * 2)
+
 
 class ParentMarketAPITestCase(CompanyOneMixin, NoDataBaseTestCase):
     parent_market_list_url = reverse('areacodestate-list')
@@ -11,6 +11,7 @@ from core.utils import clean_phone
 from phone.choices import Provider
 from sherpa.models import AreaCodeState, Market, PhoneNumber
 from sms.clients import TelnyxClient
+from .capacity import SendCapacity
 from .docs import (
     market_availability_query_parameters,
     market_best_effort_query_parameter,
@@ -80,6 +81,9 @@ class MarketViewSet(
             company=request.user.profile.company,
             id__in=phone_number_ids,
         ).update(market=market, provider=Provider.get(provider_id))
+        # The update skips the signals, so clear the limits of the new market and the markets the
+        # numbers were moved from here.
+        SendCapacity(request.user.profile.company).invalidate()
 
         serializer = MarketSerializer(market)
         return Response(serializer.data)
@@ -1,5 +1,3 @@
-import re
-
 from model_utils import FieldTracker
 
 from django.contrib.auth import get_user_model
@@ -8,6 +6,7 @@ from django.utils import timezone as django_tz
 from accounts.models.company import Company
 from core import models
 from core.mixins import SortOrderModelMixin
+from sms.renderer import get_renderer
 from sms.utils import all_tags_valid, find_banned_words, find_spam_words, has_tag
 from .smsmessage import SMSMessage
 
@@ -157,21 +156,7 @@ class SMSTemplate(models.Model):
             # like the normal messages.
             raise Exception('Carrier approved templates no longer supported.')
 
-        message = self.alternate_message
-        match = re.findall(r'(?<=\{CompanyName:)([^]]*?)(?=\})', message)
-        if match:
-            found_index = match[0]
-            i = int(match[0]) if match[0].isnumeric() else 0
-            if i >= len(self.company.outgoing_company_names):
-                i = 0
-            company_name = self.company.outgoing_company_names[i]
-            tag = '{CompanyName:' + found_index + '}'
-            message = message.replace(tag, company_name)
-
-        return message.replace(
-            '{CompanyName}',
-            self.company.random_outgoing_company_name,
-        ) + opt_out_language
+        return get_renderer(self).render_alternate(self.company, opt_out_language)
 
     def get_delivery_percent(self):
         """
@@ -4,6 +4,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from markets.capacity import SendCapacity
 from sherpa.models import PhoneNumber
 from sherpa.permissions import AdminPlusModifyPermission
 from sherpa.serializers import IntegerListSerializer
@@ -44,6 +45,7 @@ class PhoneNumberViewSet(ListModelMixin, UpdateModelMixin, GenericViewSet):
         update_count = PhoneNumber.objects.filter(
             pk__in=serializer.validated_data.get('values'),
         ).update(status=PhoneNumber.Status.INACTIVE)
+        SendCapacity(request.user.profile.company).invalidate()
         return Response({'rows_updated': update_count})
 
     @action(
@@ -1,5 +1,6 @@
 from django.db.models.signals import m2m_changed, post_save
 
+from companies.reference import get_property_tag
 from search.tasks import stacker_update_property_tags
 from .models import AttomRecorder, PropertyTag, PropertyTagAssignment
 
@@ -11,9 +12,11 @@ def attomrecorder_post_save(sender, instance, **kwargs):
     addresses = instance.attom_id.address_set.all()
     is_qc = instance.quitclaim_flag == 1
     for address in addresses:
-        properties = address.properties.all()
+        properties = address.properties.select_related('company')
         for prop in properties:
-            tag = PropertyTag.objects.get(name="Quitclaim", company_id=prop.company_id)
+            tag = get_property_tag(prop.company, 'Quitclaim')
+            if tag is None:
+                continue
             if is_qc:
                 prop.tags.add(tag)
             else:
@@ -1,12 +1,14 @@
 from datetime import date
+from types import SimpleNamespace
 
 from model_mommy import mommy
 
 from django.urls import reverse
 
 from sherpa.tests import CompanyOneMixin, CompanyTwoMixin, NoDataBaseTestCase
-from .models import PropertyTag
+from .models import AddressLastValidated, Property, PropertyTag, PropertyTagAssignment
 from .utils import get_or_create_address, get_or_create_attom_tags
+from .vacancy import PropertyVacancyValidation, VacancyValidationSchedule
 
 
 class PropertyTagAPITestCase(CompanyTwoMixin, CompanyOneMixin, NoDataBaseTestCase):
@@ -97,3 +99,62 @@ class PropertiesUtilTestCase(CompanyOneMixin, NoDataBaseTestCase):
         tags_name = PropertyTag.objects.filter(id__in=created_attom_tags). \
             values_list('name', flat=True)
         self.assertEqual(set(tags_name), set(['Pre-foreclosure']))
+
+
+class FakeSmartyClient:
+    """
+    Smarty Streets client that reports the addresses on 'Vacant St' as vacant.
+    """
+    def __init__(self):
+        self.sent = []
+
+    def send_batch(self, batch):
+        for lookup in batch:
+            self.sent.append(lookup.street)
+            vacant = 'Y' if 'Vacant St' in lookup.street else 'N'
+            lookup.result = [SimpleNamespace(analysis=SimpleNamespace(vacant=vacant))]
+
+
+class PropertyVacancyValidationTestCase(CompanyTwoMixin, CompanyOneMixin, NoDataBaseTestCase):
+
+    def test_schedule_ranges(self):
+        prop_ids = [prop.id for prop in mommy.make('properties.Property', _quantity=5)]
+        schedule = VacancyValidationSchedule(limit=4)
+        schedule.chunk_size = 2
+
+        self.assertEqual(list(schedule.get_ranges()), [
+            (0, prop_ids[1]),
+            (prop_ids[1], prop_ids[3]),
+        ])
+        self.assertEqual(AddressLastValidated.load().property_id, prop_ids[3])
+
+        # The next schedule continues from the last property and starts over once.
+        schedule = VacancyValidationSchedule(limit=10)
+        schedule.chunk_size = 2
+        self.assertEqual(list(schedule.get_ranges()), [
+            (prop_ids[3], prop_ids[4]),
+            (0, prop_ids[1]),
+            (prop_ids[1], prop_ids[3]),
+        ])
+
+    def test_validate(self):
+        vacant_address = mommy.make('properties.Address', address='1 Vacant St', zip_code='80202')
+        address = mommy.make('properties.Address', address='2 Main St', zip_code='80202')
+        vacant_props = [
+            mommy.make('properties.Property', company=company, address=vacant_address)
+            for company in [self.company1, self.company2]
+        ]
+        prop = mommy.make('properties.Property', company=self.company1, address=address)
+        tag, _ = PropertyTag.objects.get_or_create(company=self.company1, name='Vacant')
+        mommy.make('properties.PropertyTagAssignment', prop=prop, tag=tag)
+
+        smarty_client = FakeSmartyClient()
+        validation = PropertyVacancyValidation(client=smarty_client)
+        self.assertEqual(validation.validate(Property.objects.all()), 2)
+
+        # Properties that share an address are validated once.
+        self.assertEqual(sorted(smarty_client.sent), ['1 Vacant St', '2 Main St'])
+        self.assertEqual(
+            set(PropertyTagAssignment.objects.values_list('prop_id', 'tag__company_id')),
+            {(vacant_props[0].id, self.company1.id), (vacant_props[1].id, self.company2.id)},
+        )
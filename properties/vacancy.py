@@ -0,0 +1,150 @@
+from collections import defaultdict
+
+from smartystreets_python_sdk import Batch
+from smartystreets_python_sdk.exceptions import SmartyException
+from smartystreets_python_sdk.us_street import Lookup
+
+from services.smarty import smarty_client
+from .models import AddressLastValidated, Property, PropertyTag, PropertyTagAssignment
+
+
+class VacancyValidationSchedule:
+    """
+    Split the nightly vacancy validation of properties into ranges of property ids.
+
+    Properties are paged by primary key from the last property that was scheduled, which is kept in
+    `AddressLastValidated` so that each night continues where the last one stopped, starting over
+    once all the properties have been scheduled. Only the id ranges are sent to the workers.
+    """
+    chunk_size = 1000
+
+    def __init__(self, limit):
+        """
+        :param limit int: Maximum amount of properties to schedule.
+        """
+        self.limit = limit
+        self.last_checked = AddressLastValidated.load()
+
+    def get_ranges(self):
+        """
+        Yield the `(start_id, end_id)` of each chunk of properties, excluding `start_id`.
+
+        The cursor is saved after each chunk, so the ranges that were yielded are not scheduled
+        again if the schedule is interrupted.
+        """
+        first_id = cursor = self.last_checked.property_id or 0
+        remaining = self.limit
+        wrapped = False
+        while remaining > 0:
+            properties = Property.objects.filter(pk__gt=cursor).order_by('pk')
+            if wrapped:
+                properties = properties.filter(pk__lte=first_id)
+            size = min(self.chunk_size, remaining)
+            end_ids = list(properties.values_list('pk', flat=True)[size - 1:size])
+            end_id = end_ids[0] if end_ids else None
+            if end_id is None:
+                # Last chunk before starting over.
+                end_id = properties.values_list('pk', flat=True).last()
+                if end_id is None:
+                    if wrapped or not first_id:
+                        break
+                    cursor = 0
+                    wrapped = True
+                    continue
+                size = properties.count()
+
+            yield cursor, end_id
+            remaining -= size
+            cursor = end_id
+            self.last_checked.property_id = end_id
+            self.last_checked.save(update_fields=['property_id', 'last_checked'])
+
+
+class PropertyVacancyValidation:
+    """
+    Update the 'Vacant' tag of properties with the vacancy reported by Smarty Streets.
+
+    Properties that share an address are validated with one lookup, in batches of up to 100
+    lookups, and their tags are added and removed with a bulk write for each batch.
+    """
+    batch_size = 100
+
+    def __init__(self, client=smarty_client):
+        """
+        :param client: Smarty Streets client used to send the batches.
+        """
+        self.client = client
+        self.tag_ids = {}
+
+    def validate(self, properties):
+        """
+        :param properties: `Property` queryset to validate.
+        :return: The amount of properties that are vacant.
+        """
+        prop_ids = defaultdict(list)
+        addresses = {}
+        for prop in properties.select_related('address'):
+            prop_ids[prop.address_id].append((prop.id, prop.company_id))
+            addresses[prop.address_id] = prop.address
+
+        address_ids = [
+            address_id for address_id, address in addresses.items()
+            if address.address and (address.zip_code or address.city and address.state)
+        ]
+        vacant = 0
+        for i in range(0, len(address_ids), self.batch_size):
+            batch = Batch()
+            for address_id in address_ids[i:i + self.batch_size]:
+                batch.add(self.build_lookup(addresses[address_id]))
+            try:
+                self.client.send_batch(batch)
+            except SmartyException:
+                continue
+
+            vacant_props = []
+            not_vacant_ids = []
+            for lookup in batch:
+                if not lookup.result:
+                    continue
+                props = prop_ids[int(lookup.input_id)]
+                if lookup.result[0].analysis.vacant == 'Y':
+                    vacant_props.extend(props)
+                else:
+                    not_vacant_ids.extend(prop_id for prop_id, _ in props)
+            self.tag_vacant(vacant_props, not_vacant_ids)
+            vacant += len(vacant_props)
+
+        return vacant
+
+    @staticmethod
+    def build_lookup(address):
+        lookup = Lookup()
+        lookup.input_id = str(address.id)
+        lookup.street = address.address
+        lookup.city = address.city or None
+        lookup.state = address.state or None
+        lookup.zipcode = address.zip_code or None
+        return lookup
+
+    def tag_vacant(self, vacant_props, not_vacant_ids):
+        """
+        Add the 'Vacant' tag to the vacant properties and remove it from the rest.
+
+        :param vacant_props list: `(property id, company id)` of the vacant properties.
+        :param not_vacant_ids list: Ids of the properties that are not vacant.
+        """
+        PropertyTagAssignment.objects.bulk_create([
+            PropertyTagAssignment(prop_id=prop_id, tag_id=self.get_tag_id(company_id))
+            for prop_id, company_id in vacant_props
+        ], ignore_conflicts=True)
+        if not_vacant_ids:
+            PropertyTagAssignment.objects.filter(
+                prop_id__in=not_vacant_ids,
+                tag__name='Vacant',
+            ).delete()
+
+    def get_tag_id(self, company_id):
+        if company_id not in self.tag_ids:
+            tag, _ = PropertyTag.objects.get_or_create(company_id=company_id, name='Vacant')
+            self.tag_ids[company_id] = tag.id
+        return self.tag_ids[company_id]
@@ -0,0 +1,142 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone as django_tz
+
+from services.http import build_session, run_concurrently
+from sherpa.models import PhoneType, Prospect
+from sms.clients import get_client
+
+# Phone type and carrier set on prospects whose phone could not be looked up.
+LOOKUP_ERROR = 'error on lookup'
+
+
+class CarrierLookup:
+    """
+    Look up the phone type and carrier of many phones at once.
+
+    `PhoneType` works as the cache of the lookups: phones that were looked up recently are served
+    from it and only the rest are looked up with the provider, using a pooled session shared by a
+    bounded amount of threads. Results are saved with bulk updates.
+    """
+    # Phones are looked up again when their last lookup is older than this.
+    ttl = timedelta(days=90)
+
+    def __init__(self, client=None, max_workers=None):
+        """
+        :param client: Messaging client used to fetch the phone numbers, defaults to the client
+                       used for all lookups.
+        :param max_workers int: Maximum amount of phones looked up at the same time.
+        """
+        self.max_workers = max_workers or settings.CARRIER_LOOKUP_MAX_WORKERS
+        if client is None:
+            client = get_client()
+            client.session = build_session(pool_size=self.max_workers)
+        self.client = client
+
+    def is_stale(self, phone_type):
+        if phone_type.carrier is None or not phone_type.last_carrier_lookup:
+            return True
+        return phone_type.last_carrier_lookup < django_tz.now().date() - self.ttl
+
+    def fetch(self, phone):
+        try:
+            return self.client.fetch_number(phone)
+        except Exception:
+            return None
+
+    def lookup(self, phones, force=False):
+        """
+        Return the `PhoneType` of each phone, looking up the phones that are missing or stale.
+
+        :param phones: Iterable of raw phones, which can have duplicates.
+        :param force bool: Look up all the phones, even if they were looked up recently.
+        :return: A dictionary of `PhoneType` by phone and the set of phones that failed the lookup.
+        """
+        phones = {phone for phone in phones if phone}
+        phone_types = {
+            phone_type.phone: phone_type
+            for phone_type in PhoneType.objects.filter(phone__in=phones)
+        }
+        misses = [
+            phone for phone in phones
+            if force or phone not in phone_types or self.is_stale(phone_types[phone])
+        ]
+
+        today = django_tz.now().date()
+        new_phone_types = []
+        updated_phone_types = []
+        failed = set()
+        for phone, carrier in zip(misses, run_concurrently(self.fetch, misses, self.max_workers)):
+            phone_type = phone_types.get(phone)
+            if phone_type is None:
+                phone_type = PhoneType(phone=phone)
+                phone_types[phone] = phone_type
+                new_phone_types.append(phone_type)
+            elif carrier is not None:
+                updated_phone_types.append(phone_type)
+
+            if carrier is None:
+                # Phones that were looked up before keep their last lookup.
+                if phone_type.carrier is None:
+                    failed.add(phone)
+                continue
+
+            phone_type.type = carrier['type'] or PhoneType.Type.NA
+            phone_type.carrier = carrier['name']
+            phone_type.last_carrier_lookup = today
+
+        # Phones that failed are still saved so that they are looked up again, as they don't have a
+        # carrier. Phones saved by a concurrent lookup are left as they are.
+        PhoneType.objects.bulk_create(new_phone_types, ignore_conflicts=True)
+        PhoneType.objects.bulk_update(
+            updated_phone_types,
+            ['type', 'carrier', 'last_carrier_lookup'],
+        )
+
+        return phone_types, failed
+
+    def update_prospects(self, prospects):
+        """
+        Set the phone type and carrier of the prospects that don't have a phone type yet.
+
+        :param prospects: List of saved `Prospect` instances, such as the prospects of an upload.
+        """
+        prospects = [prospect for prospect in prospects if prospect.phone_raw and
+                     not prospect.phone_type]
+        if not prospects:
+            return
+
+        phone_types, failed = self.lookup(prospect.phone_raw for prospect in prospects)
+        for prospect in prospects:
+            if prospect.phone_raw in failed:
+                prospect.phone_type = prospect.phone_carrier = LOOKUP_ERROR
+                continue
+
+            phone_type = phone_types[prospect.phone_raw]
+            prospect.phone_type = phone_type.type or PhoneType.Type.NA
+            prospect.phone_carrier = phone_type.carrier
+        Prospect.objects.bulk_update(prospects, ['phone_type', 'phone_carrier'])
+
+    def update_phones(self, phones, force=False):
+        """
+        Look up the phones and update all the prospects that use them, across all companies.
+
+        :return: The amount of prospects that were updated.
+        """
+        phone_types, failed = self.lookup(phones, force=force)
+
+        # Update the prospects with one query for each phone type and carrier.
+        phones_by_carrier = defaultdict(list)
+        for phone, phone_type in phone_types.items():
+            if phone not in failed:
+                phones_by_carrier[(phone_type.type, phone_type.carrier)].append(phone)
+
+        updated = 0
+        for (phone_type, carrier), phones in phones_by_carrier.items():
+            updated += Prospect.objects.filter(phone_raw__in=phones).update(
+                phone_type=phone_type,
+                phone_carrier=carrier,
+            )
+        return updated
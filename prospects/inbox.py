@@ -0,0 +1,107 @@
+from django_redis import get_redis_connection
+
+from django.core.cache import cache
+from django.utils import timezone as django_tz
+
+# Only add to the sorted set when it exists, otherwise the set would be created with a single
+# prospect and the rest of the unread prospects would be missing until it expires.
+ADD_IF_EXISTS_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('zadd', KEYS[1], ARGV[1], ARGV[2])
+end
+return 0
+"""
+
+
+class UnreadInbox:
+    """
+    Prospects of a company that have unread messages, sorted by their last received message.
+
+    The inbox is a redis sorted set that is updated when a prospect's `has_unread_sms` is saved so
+    that the unread messages don't require scanning the company's prospects. `has_unread_sms` is
+    still the source of truth: the set is rebuilt from it when missing, expires regularly and the
+    prospects read from it are verified.
+    """
+    timeout = 60 * 15
+    chunk_size = 200
+
+    def __init__(self, company):
+        self.company = company
+        self.key = cache.make_key(f'unread_inbox_{company.uuid}')
+        self.redis = get_redis_connection()
+
+    def add(self, prospect):
+        """
+        Add a prospect to the inbox, sorted by the time its last message was received.
+        """
+        received = prospect.last_sms_received_utc or django_tz.now()
+        self.redis.eval(ADD_IF_EXISTS_SCRIPT, 1, self.key, received.timestamp(), prospect.id)
+
+    def remove(self, *prospect_ids):
+        if prospect_ids:
+            self.redis.zrem(self.key, *prospect_ids)
+
+    def rebuild(self):
+        """
+        Fill the inbox with the company's unread prospects.
+        """
+        from sherpa.models import Prospect
+
+        unread = Prospect.objects.filter(
+            company=self.company,
+            has_unread_sms=True,
+        ).values_list('id', 'last_sms_received_utc')
+        mapping = {
+            prospect_id: received.timestamp() if received else 0
+            for prospect_id, received in unread
+        }
+        if not mapping:
+            return
+
+        pipeline = self.redis.pipeline()
+        pipeline.zadd(self.key, mapping)
+        pipeline.expire(self.key, self.timeout)
+        pipeline.execute()
+
+    def get_prospect_ids(self, limit, queryset=None):
+        """
+        Return the ids of the most recent unread prospects.
+
+        Prospects that are no longer unread are removed from the inbox as they are found.
+
+        :param limit int: Maximum amount of prospect ids to return.
+        :param queryset: `Prospect` queryset to restrict the results to, such as the prospects that
+                         a user has access to.
+        """
+        from sherpa.models import Prospect
+
+        if not self.redis.exists(self.key):
+            self.rebuild()
+
+        prospect_ids = []
+        start = 0
+        while len(prospect_ids) < limit:
+            candidates = [
+                int(prospect_id) for prospect_id in
+                self.redis.zrevrange(self.key, start, start + self.chunk_size - 1)
+            ]
+            if not candidates:
+                break
+            start += self.chunk_size
+
+            unread_ids = set(Prospect.objects.filter(
+                id__in=candidates,
+                has_unread_sms=True,
+            ).values_list('id', flat=True))
+            stale_ids = set(candidates) - unread_ids
+            self.remove(*stale_ids)
+            # Removing read prospects shifts the next chunk.
+            start -= len(stale_ids)
+
+            if queryset is not None and unread_ids:
+                unread_ids = set(
+                    queryset.filter(id__in=unread_ids).values_list('id', flat=True))
+            prospect_ids.extend(
+                prospect_id for prospect_id in candidates if prospect_id in unread_ids)
+
+        return prospect_ids[:limit]
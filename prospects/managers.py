@@ -1,9 +1,22 @@
+from collections import defaultdict
 import uuid
 
+from django.utils import timezone
+
 from core import models
 
 
 class ProspectManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Create the prospects and route the messages of their phones to them.
+        """
+        from sms.routing import InboundRoutes
+
+        objs = super().bulk_create(objs, *args, **kwargs)
+        InboundRoutes().add_prospects(objs)
+        return objs
+
     def search(self, user, filters=None):
         from prospects.utils import ProspectSearch
         search = ProspectSearch(
@@ -14,6 +27,81 @@ class ProspectManager(models.Manager):
         search.search()
         return search.result
 
+    def invalidate_related_records(self, verified_ids, user=None, index_update=True):
+        """
+        Mark the prospects that share a related record with the verified prospects as not valid
+        and skip their unsent campaign prospects.
+
+        :param verified_ids: List of ids of the prospects that were verified as the owner.
+        :param user: `User` that verified the owners, or None when verified by the system.
+        :param index_update: Whether the invalidated prospects should be updated in stacker.
+        :return: List of ids of the invalidated prospects.
+        """
+        from campaigns.models import CampaignAggregatedStats
+        from search.tasks import stacker_full_update
+        from sherpa.models import Activity, CampaignProspect, LeadStage
+
+        related_record_ids = self.filter(
+            id__in=verified_ids,
+            related_record_id__isnull=False,
+        ).exclude(related_record_id='').values('related_record_id')
+        invalid_ids = list(self.filter(
+            related_record_id__in=related_record_ids,
+        ).exclude(id__in=verified_ids).values_list('id', flat=True))
+        if not invalid_ids:
+            return []
+
+        self.filter(id__in=invalid_ids).update(
+            owner_verified_status=self.model.OwnerVerifiedStatus.UNVERIFIED,
+            wrong_number=True,
+            lead_stage=models.Subquery(LeadStage.objects.filter(
+                company_id=models.OuterRef('company_id'),
+                lead_stage_title="Dead",
+            ).values('id')[:1]),
+            last_modified=timezone.now(),
+        )
+
+        # Skipping mobile campaign prospects changes their campaigns' initial sent & skipped.
+        campaign_prospects = CampaignProspect.objects.filter(
+            prospect_id__in=invalid_ids,
+            sent=False,
+            skipped=False,
+        )
+        skipped_mobile = campaign_prospects.filter(
+            prospect__phone_type='mobile',
+            campaign__campaign_stats__isnull=False,
+        ).order_by().values('campaign__campaign_stats').annotate(total=models.Count('id'))
+        stats_by_total = defaultdict(list)
+        for row in skipped_mobile:
+            stats_by_total[row['total']].append(row['campaign__campaign_stats'])
+        for total, stats_ids in stats_by_total.items():
+            CampaignAggregatedStats.objects.filter(id__in=stats_ids).update(
+                total_initial_sent_skipped=models.F('total_initial_sent_skipped') + total,
+            )
+        campaign_prospects.update(skipped=True)
+
+        description = 'Owner set to not valid by system'
+        if user:
+            description = f'Owner set to not valid by {user.get_full_name()}'
+        Activity.objects.bulk_create([
+            Activity(
+                title=Activity.Title.OWNER_NOT_VALID,
+                prospect_id=prospect_id,
+                description=description,
+                icon="fa fa-times-circle",
+            )
+            for prospect_id in invalid_ids
+        ])
+
+        if index_update:
+            property_ids = list(self.filter(
+                id__in=invalid_ids,
+                prop__isnull=False,
+            ).values_list('prop_id', flat=True))
+            stacker_full_update.delay(invalid_ids, property_ids)
+
+        return invalid_ids
+
     def create_from_skip_trace_property(self, skip_trace_property):
         """
         Create `Prospect` objects  from `SkipTraceProperty` and `Property`
@@ -36,6 +124,7 @@ class ProspectManager(models.Manager):
             upload=None,
             prop=None,
             skip_trace_prop=None,
+            carrier_lookup=None,
     ):
         """
         Create `Prospect`s from a list of phones (already cleaned).
@@ -45,6 +134,8 @@ class ProspectManager(models.Manager):
         :param prop: `Property` object to add to `Prospect`s created.
         :param upload: Upload object phones came from (ex UploadProspects)
         :param skip_trace_prop: `SkipTraceProperty` object phones came from
+        :param carrier_lookup: `CarrierLookup` used to look up the phones of all the `Prospect`s at
+                               once, instead of one by one after they are created.
         """
         from sherpa.models import LitigatorList
 
@@ -86,6 +177,12 @@ class ProspectManager(models.Manager):
         # Bulk create or bulk update Prospects and run final update tasks.
         if create_prospects:
             self.bulk_create(create_prospects)
+        if update_prospects:
+            self.bulk_update(update_prospects, list(update_fields))
+        if carrier_lookup:
+            carrier_lookup.update_prospects(create_prospects + update_prospects)
+
+        if create_prospects:
             self.__update_new_or_updated_prospects(
                 create_prospects,
                 upload,
@@ -94,7 +191,6 @@ class ProspectManager(models.Manager):
                 is_new_prospect=True,
             )
         if update_prospects:
-            self.bulk_update(update_prospects, list(update_fields))
             self.__update_new_or_updated_prospects(
                 update_prospects,
                 upload,
@@ -249,6 +249,24 @@ class CampaignProspectSerializer(FlexFieldsSerializerMixin, serializers.ModelSer
         """
         Add sender name so it displays correctly in preview in case 'use_sender_name' enabled.
         """
+        self.next_template(obj)
+        request = self.context.get("request")
+        data = {
+            'msg': '',
+            'template': self.current_template.id,
+        }
+        if not request:
+            data['msg'] = obj.sms_msg_text(template=self.current_template)
+        else:
+            data['msg'] = obj.sms_msg_text(request.user.first_name, template=self.current_template)
+
+        return data
+
+    def next_template(self, obj):
+        """
+        Move on to the template of the next campaign prospect, the templates of the category are
+        used in turns.
+        """
         if self.current_template is None:
             if self.category:
                 self.current_template = self.category.first_template
@@ -264,17 +282,81 @@ class CampaignProspectSerializer(FlexFieldsSerializerMixin, serializers.ModelSer
             self.current_template = self.current_template.category.next_template(
                 self.current_template,
             ) if self.current_template.category else self.current_template
-        request = self.context.get("request")
-        data = {
-            'msg': '',
-            'template': self.current_template.id,
+        return self.current_template
+
+
+class BatchProspectSerializer(serializers.ModelSerializer):
+    """
+    Data of a prospect shown when sending bulk messages, without its messages and relations.
+    """
+    phone_formatted_display = serializers.CharField(source='phone_formatted_display_calculated')
+
+    class Meta:
+        model = Prospect
+        fields = (
+            'id',
+            'first_name',
+            'last_name',
+            'name',
+            'phone_display',
+            'phone_raw',
+            'phone_formatted_display',
+            'phone_type',
+            'property_address',
+            'property_city',
+            'property_state',
+            'property_zip',
+            'address_display',
+            'has_unread_sms',
+            'is_priority',
+            'is_qualified_lead',
+            'do_not_call',
+            'opted_out',
+            'owner_verified_status',
+            'wrong_number',
+            'lead_stage',
+            'token',
+        )
+
+
+class CampaignProspectBatchListSerializer(serializers.ListSerializer):
+    """
+    Page of the bulk send queue, with the messages of all its campaign prospects rendered at once.
+    """
+
+    def to_representation(self, data):
+        campaign_prospects = list(data)
+        templates = [self.child.next_template(obj) for obj in campaign_prospects]
+        request = self.context.get('request')
+        messages = CampaignProspect.bulk_sms_msg_texts(
+            campaign_prospects,
+            templates,
+            request.user.first_name if request else None,
+        )
+        self.child.messages = {
+            obj.id: {'msg': message, 'template': template.id}
+            for obj, template, message in zip(campaign_prospects, templates, messages)
         }
-        if not request:
-            data['msg'] = obj.sms_msg_text(template=self.current_template)
-        else:
-            data['msg'] = obj.sms_msg_text(request.user.first_name, template=self.current_template)
+        return super().to_representation(campaign_prospects)
 
-        return data
+
+class CampaignProspectBatchSerializer(CampaignProspectSerializer):
+    """
+    Campaign prospects of the bulk send queue with their formatted message.
+    """
+    prospect = BatchProspectSerializer(read_only=True)
+
+    class Meta(CampaignProspectSerializer.Meta):
+        list_serializer_class = CampaignProspectBatchListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messages = {}
+
+    def get_sms_msg_text(self, obj):
+        if obj.id in self.messages:
+            return self.messages[obj.id]
+        return super().get_sms_msg_text(obj)
 
 
 class CampaignProspectUnreadSerializer(FlexFieldsSerializerMixin, serializers.ModelSerializer):
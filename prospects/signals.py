@@ -1,9 +1,10 @@
 import uuid
 
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 
-from prospects.models import ProspectTag
+from prospects.models import ProspectTag, RelayNumber
 from sherpa.models import Prospect
+from sms.routing import InboundRoutes
 
 
 def prospect_pre_save(sender, instance, raw, **kwargs):
@@ -48,7 +49,18 @@ def prospect_tag_post_save(sender, instance, created, raw, **kwargs):
     instance.save(update_fields=['order'])
 
 
+def prospect_post_delete(sender, instance, **kwargs):
+    InboundRoutes().remove_prospect(instance.company_id, instance.phone_raw)
+
+
+def relay_number_route_changed(sender, instance, **kwargs):
+    InboundRoutes().remove_number(instance.phone)
+
+
 pre_save.connect(prospect_pre_save, sender=Prospect)
 
 post_save.connect(prospect_post_save, sender=Prospect)
 post_save.connect(prospect_tag_post_save, sender=ProspectTag)
+post_delete.connect(prospect_post_delete, sender=Prospect)
+post_save.connect(relay_number_route_changed, sender=RelayNumber)
+post_delete.connect(relay_number_route_changed, sender=RelayNumber)
@@ -1,9 +1,11 @@
 import csv
-from datetime import datetime, time, timedelta
+from datetime import date, datetime, time, timedelta
 import io
+from types import SimpleNamespace
 
 from dateutil.parser import parse
 from model_mommy import mommy
+from smartystreets_python_sdk.exceptions import SmartyException
 
 from django.conf import settings
 from django.urls import reverse
@@ -12,9 +14,12 @@ from django.utils import timezone
 from campaigns.tests import CampaignDataMixin
 from companies.models import DownloadHistory, PodioFieldMapping
 from companies.resources import PodioResource
+from prospects.carriers import CarrierLookup, LOOKUP_ERROR
 from prospects.models import ProspectTag
 from prospects.resources import ProspectResource
+from prospects.toggles import BulkProspectToggle
 from prospects.utils import is_empty_search, record_phone_number_opt_outs
+from prospects.validation import AddressValidationQueue
 from services.crm.podio.utils import fetch_data_to_sync
 from sherpa.models import (
     Activity,
@@ -26,6 +31,7 @@ from sherpa.models import (
     LitigatorList,
     LitigatorReportQueue,
     PhoneNumber,
+    PhoneType,
     Prospect,
     SMSPrefillText,
 )
@@ -579,6 +585,15 @@ class ProspectAPITestCase(CampaignDataMixin, BaseAPITestCase):
         self.assertEqual(len(results2), 1)
         self.assertEqual(results2[0].get('name'), self.george_prospect.get_full_name())
 
+    def test_can_search_name_without_last_name(self):
+        self.george_prospect.last_name = None
+        self.george_prospect.save(update_fields=['last_name'])
+        url = self.prospect_search_url + '?search=' + self.george_prospect.first_name
+        response = self.george_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        results = response.json().get('results')
+        self.assertIn(self.george_prospect.id, [result.get('id') for result in results])
+
     def test_can_search_address(self):
         self.george_prospect.property_zip = 12345
         self.george_prospect.save(update_fields=['property_zip'])
@@ -1360,6 +1375,105 @@ class ProspectModelTestCase(CampaignDataMixin, BaseTestCase):
         message.refresh_from_db()
         self.assertFalse(message.unread_by_recipient)
 
+    def test_bulk_toggle(self):
+        prospects = [self.george_prospect, self.george_prospect2]
+        message = mommy.make(
+            'sherpa.SMSMessage',
+            prospect=self.george_prospect,
+            from_prospect=True,
+            unread_by_recipient=True,
+        )
+        Prospect.objects.filter(id=self.george_prospect.id).update(has_unread_sms=True)
+        priority = self.george_campaign.campaign_stats.total_priority
+        activities = Activity.objects.filter(prospect__in=prospects)
+        activity_count = activities.count()
+
+        bulk_toggle = BulkProspectToggle(self.george_user, [p.id for p in prospects])
+        updated = bulk_toggle.apply({'do_not_call': True, 'is_priority': True})
+        self.assertEqual(updated, 2)
+
+        dead = self.company1.leadstage_set.get(lead_stage_title='Dead')
+        for prospect in prospects:
+            prospect.refresh_from_db()
+            self.assertTrue(prospect.do_not_call)
+            self.assertTrue(prospect.is_priority)
+            self.assertFalse(prospect.has_unread_sms)
+            self.assertEqual(prospect.lead_stage, dead)
+            self.assertEqual(prospect.owner_verified_status, Prospect.OwnerVerifiedStatus.VERIFIED)
+            self.assertTrue(InternalDNC.objects.filter(
+                company=self.company1,
+                phone_raw=prospect.phone_raw,
+            ).exists())
+        message.refresh_from_db()
+        self.assertFalse(message.unread_by_recipient)
+
+        # A dnc, priority and owner verified activity is created for each prospect.
+        self.assertEqual(activities.count(), activity_count + 6)
+        self.george_campaign.refresh_from_db()
+        self.assertTrue(self.george_campaign.has_priority)
+        self.assertEqual(self.george_campaign.campaign_stats.total_priority, priority + 2)
+
+        # Prospects that already have the value are not toggled again.
+        bulk_toggle = BulkProspectToggle(self.george_user, [p.id for p in prospects])
+        self.assertEqual(bulk_toggle.apply({'do_not_call': True}), 0)
+        self.assertEqual(activities.count(), activity_count + 6)
+
+    def test_bulk_toggle_qualified_lead(self):
+        prospects = [self.george_prospect, self.george_prospect2, self.george_prospect3]
+        stats = self.george_campaign.campaign_stats
+        total_leads = stats.total_leads
+
+        # The campaign's total leads changes by the amount of its prospects that were toggled.
+        bulk_toggle = BulkProspectToggle(self.george_user, [p.id for p in prospects])
+        self.assertEqual(bulk_toggle.apply({'is_qualified_lead': True}), 3)
+        stats.refresh_from_db()
+        self.assertEqual(stats.total_leads, total_leads + 3)
+
+        bulk_toggle = BulkProspectToggle(self.george_user, [p.id for p in prospects[:2]])
+        self.assertEqual(bulk_toggle.apply({'is_qualified_lead': False}), 2)
+        stats.refresh_from_db()
+        self.assertEqual(stats.total_leads, total_leads + 1)
+
+    def test_invalidate_related_records(self):
+        related, related2 = mommy.make(
+            'sherpa.Prospect',
+            company=self.company1,
+            related_record_id=self.george_prospect.related_record_id,
+            phone_type='mobile',
+            _quantity=2,
+        )
+        campaign_prospect = mommy.make(
+            'sherpa.CampaignProspect',
+            prospect=related,
+            campaign=self.george_campaign,
+        )
+        mommy.make('sherpa.CampaignProspect', prospect=related2, campaign=self.george_campaign)
+        # Prospects without a related record are not related to each other.
+        Prospect.objects.filter(id=self.george_prospect2.id).update(related_record_id='')
+        unrelated = mommy.make('sherpa.Prospect', company=self.company1, related_record_id='')
+        stats = self.george_campaign.campaign_stats
+        sent_skipped = stats.total_initial_sent_skipped
+
+        invalid_ids = Prospect.objects.invalidate_related_records(
+            [self.george_prospect.id, self.george_prospect2.id],
+            user=self.george_user,
+        )
+        self.assertEqual(sorted(invalid_ids), [related.id, related2.id])
+
+        related.refresh_from_db()
+        self.assertEqual(related.owner_verified_status, Prospect.OwnerVerifiedStatus.UNVERIFIED)
+        self.assertTrue(related.wrong_number)
+        self.assertEqual(related.lead_stage.lead_stage_title, 'Dead')
+        self.assertTrue(related.activity_set.filter(title=Activity.Title.OWNER_NOT_VALID).exists())
+        campaign_prospect.refresh_from_db()
+        self.assertTrue(campaign_prospect.skipped)
+        stats.refresh_from_db()
+        # Each of the campaign's skipped prospects is counted.
+        self.assertEqual(stats.total_initial_sent_skipped, sent_skipped + 2)
+
+        unrelated.refresh_from_db()
+        self.assertFalse(unrelated.wrong_number)
+
     def test_creating_cloned_prospect_saves_related_record_id(self):
         self.assertNotEqual(self.george_prospect.related_record_id, '')
         self.assertNotEqual(self.george_prospect.related_record_id, None)
@@ -1921,6 +2035,201 @@ class ProspectUtilTestCase(CompanyOneMixin, NoDataBaseTestCase):
         self.assertTrue(prospect.opted_out)
 
 
+class FakeCarrierClient:
+    """
+    Messaging client that returns the carriers without calling the provider.
+    """
+    def __init__(self, carriers):
+        self.carriers = carriers
+        self.fetched = []
+
+    def fetch_number(self, phone):
+        self.fetched.append(phone)
+        if phone not in self.carriers:
+            raise ConnectionError()
+        return self.carriers[phone]
+
+
+class CarrierLookupTestCase(CompanyOneMixin, NoDataBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.carrier_client = FakeCarrierClient({
+            '5555550001': {'name': 'Verizon', 'type': 'mobile'},
+            '5555550002': {'name': 'AT&T', 'type': 'landline'},
+        })
+        self.lookup = CarrierLookup(client=self.carrier_client)
+
+    def test_update_prospects(self):
+        mommy.make(
+            'sherpa.PhoneType',
+            phone='5555550002',
+            type='landline',
+            carrier='Comcast',
+            last_carrier_lookup=timezone.now().date(),
+        )
+        prospects = [
+            mommy.make('sherpa.Prospect', company=self.company1, phone_raw=phone)
+            for phone in ['5555550001', '5555550001', '5555550002', '5555550003']
+        ]
+        self.lookup.update_prospects(prospects)
+
+        # Phones are only looked up once and recent lookups are served from `PhoneType`.
+        self.assertEqual(sorted(self.carrier_client.fetched), ['5555550001', '5555550003'])
+        for prospect in prospects:
+            prospect.refresh_from_db()
+        self.assertEqual(prospects[0].phone_type, 'mobile')
+        self.assertEqual(prospects[1].phone_carrier, 'Verizon')
+        self.assertEqual(prospects[2].phone_carrier, 'Comcast')
+        self.assertEqual(prospects[3].phone_type, LOOKUP_ERROR)
+        self.assertEqual(PhoneType.objects.get(phone='5555550001').carrier, 'Verizon')
+        self.assertIsNone(PhoneType.objects.get(phone='5555550003').carrier)
+
+    def test_update_phones(self):
+        phone_type = mommy.make(
+            'sherpa.PhoneType',
+            phone='5555550002',
+            carrier='Comcast',
+            last_carrier_lookup=date(2020, 1, 1),
+        )
+        mommy.make('sherpa.Prospect', company=self.company1, phone_raw='5555550002', _quantity=2)
+
+        self.assertEqual(self.lookup.update_phones(['5555550002']), 2)
+        phone_type.refresh_from_db()
+        self.assertEqual(phone_type.type, 'landline')
+        self.assertEqual(phone_type.carrier, 'AT&T')
+        self.assertEqual(Prospect.objects.filter(phone_carrier='AT&T').count(), 2)
+
+
+class FakeSmartyClient:
+    """
+    SmartyStreets client that validates the addresses with a street number without calling the API.
+    """
+    def __init__(self):
+        self.sent = []
+
+    def send_batch(self, batch):
+        for lookup in batch:
+            self.sent.append(lookup.street)
+            if not lookup.street[0].isdigit():
+                lookup.result = []
+                continue
+            lookup.result = [SimpleNamespace(
+                delivery_line_1=lookup.street.split(',')[0],
+                delivery_line_2=None,
+                components=SimpleNamespace(
+                    city_name='Denver',
+                    state_abbreviation='CO',
+                    zipcode='80202',
+                    plus4_code='1234',
+                ),
+                metadata=SimpleNamespace(latitude=39.75, longitude=-104.99),
+                analysis=SimpleNamespace(vacant='N'),
+            )]
+
+
+class AddressValidationQueueTestCase(CompanyOneMixin, NoDataBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.smarty_client = FakeSmartyClient()
+        self.queue = AddressValidationQueue(client=self.smarty_client)
+        self.queue.redis.delete(
+            self.queue.key,
+            self.queue.scheduled_key,
+            self.queue.attempts_key,
+            self.queue.failed_key,
+        )
+        self.scheduled = []
+        self.queue.schedule_flush = self.scheduled.append
+
+    def test_flush(self):
+        addresses = [
+            ('123 Main St', 'Denver', 'CO', '80202'),
+            ('123  main st', 'denver', 'CO', '80202'),
+            ('Main St', '', '', '80202'),
+            ('', '', '', ''),
+        ]
+        prospects = [
+            mommy.make(
+                'sherpa.Prospect',
+                company=self.company1,
+                property_address=address,
+                property_city=city,
+                property_state=state,
+                property_zip=zip_code,
+            )
+            for address, city, state, zip_code in addresses
+        ]
+        self.queue.redis.rpush(self.queue.key, *[prospect.id for prospect in prospects])
+        self.queue.batch_size = 3
+
+        self.assertEqual(self.queue.flush(), 4)
+        self.assertEqual(len(self.queue), 0)
+        # Identical raw addresses are validated with one lookup.
+        self.assertEqual(self.smarty_client.sent, ['123 MAIN ST, DENVER CO 80202', 'MAIN ST'])
+        for prospect in prospects:
+            prospect.refresh_from_db()
+        self.assertEqual(prospects[0].validated_property_status, 'validated')
+        self.assertEqual(prospects[1].validated_property_plus4_code, '1234')
+        self.assertEqual(prospects[1].property_address, '123 MAIN ST')
+        self.assertEqual(prospects[2].validated_property_status, 'invalid')
+        self.assertEqual(prospects[3].validated_property_status, 'invalid')
+
+    def test_failed_batch_is_requeued(self):
+        prospects = mommy.make(
+            'sherpa.Prospect',
+            company=self.company1,
+            property_address='123 Main St',
+            property_zip='80202',
+            _quantity=3,
+        )
+        prospect_ids = [prospect.id for prospect in prospects]
+        self.queue.redis.rpush(self.queue.key, *prospect_ids)
+        self.queue.batch_size = 2
+
+        def send_batch(batch):
+            raise SmartyException('Timeout')
+        self.smarty_client.send_batch = send_batch
+
+        with self.assertRaises(SmartyException):
+            self.queue.flush()
+        self.assertEqual(self.scheduled, [self.queue.retry_delay])
+        self.assertEqual(self.queue.pop(), prospect_ids[:2])
+        self.assertEqual(self.queue.pop(), prospect_ids[2:])
+
+    def test_failed_batch_is_moved_to_failed_list(self):
+        prospects = mommy.make(
+            'sherpa.Prospect',
+            company=self.company1,
+            property_address='123 Main St',
+            property_zip='80202',
+            _quantity=3,
+        )
+        prospect_ids = [prospect.id for prospect in prospects]
+        self.queue.redis.rpush(self.queue.key, *prospect_ids)
+        self.queue.batch_size = 2
+        self.queue.max_attempts = 2
+
+        def send_batch(batch):
+            raise SmartyException('Timeout')
+        self.smarty_client.send_batch = send_batch
+
+        for _ in range(self.queue.max_attempts):
+            with self.assertRaises(SmartyException):
+                self.queue.flush()
+        self.assertEqual(len(self.scheduled), 1)
+        failed = self.queue.redis.lrange(self.queue.failed_key, 0, -1)
+        self.assertEqual([int(prospect_id) for prospect_id in failed], prospect_ids[:2])
+        self.assertEqual(self.queue.pop(), prospect_ids[2:])
+
+        # Batches that succeed start counting their attempts again.
+        del self.smarty_client.send_batch
+        self.queue.requeue(prospect_ids[2:])
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertFalse(self.queue.redis.exists(self.queue.attempts_key))
+
+
 """
 class PhoneTypeModelTestCase(CampaignDataMixin, BaseTestCase):
     def setUp(self):
@@ -1,7 +1,10 @@
+from datetime import timedelta
+
 from dateutil.parser import parse
 from model_mommy import mommy
 
 from django.urls import reverse
+from django.utils import timezone as django_tz
 
 from campaigns.tests import CampaignDataMixin
 from sherpa.models import (
@@ -326,6 +329,37 @@ class CampaignProspectAPITestCase(CampaignDataMixin, BaseAPITestCase):
         count_only_response = self.george_client.get(f'{self.cp_unread_url}?include_messages=false')
         self.assertEqual(len(count_only_response.json().get('results')), 0)
 
+    def test_unread_is_sorted_by_last_received_message(self):
+        now = django_tz.now()
+        older = self.george_campaign_prospect.prospect
+        newer = self.george_campaign_prospect2.prospect
+        for prospect, received in [(older, now - timedelta(hours=1)), (newer, now)]:
+            prospect.has_unread_sms = True
+            prospect.last_sms_received_utc = received
+            prospect.save(update_fields=['has_unread_sms', 'last_sms_received_utc'])
+        messages = [
+            mommy.make(
+                'sherpa.SMSMessage',
+                prospect=older,
+                from_prospect=True,
+                unread_by_recipient=True,
+                dt=dt,
+            )
+            for dt in [now - timedelta(hours=2), now - timedelta(hours=1)]
+        ]
+
+        results = self.george_client.get(self.cp_unread_url).json().get('results')
+        prospects = [result['prospect'] for result in results]
+        self.assertEqual([prospect['id'] for prospect in prospects], [newer.id, older.id])
+        self.assertEqual([message['id'] for message in prospects[1]['messages']], [messages[1].id])
+
+        # A new message moves the prospect to the top and reading removes it from the inbox.
+        older.last_sms_received_utc = now + timedelta(minutes=1)
+        older.save(update_fields=['last_sms_received_utc'])
+        newer.mark_as_read()
+        results = self.george_client.get(self.cp_unread_url).json().get('results')
+        self.assertEqual([result['prospect']['id'] for result in results], [older.id])
+
     def test_is_campaign_prospects_unread_count_and_results_consistent(self):
         """
         In cases where prospects are in many campaigns, and have unread messages on more than
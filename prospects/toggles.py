@@ -0,0 +1,332 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Greatest
+from django.utils import timezone as django_tz
+
+from campaigns.models import CampaignAggregatedStats
+from sherpa.models import (
+    Activity,
+    Campaign,
+    CampaignAccess,
+    CampaignProspect,
+    Company,
+    InternalDNC,
+    LeadStage,
+    Prospect,
+    SMSMessage,
+    UserProfile,
+)
+from .inbox import UnreadInbox
+
+
+class BulkProspectToggle:
+    """
+    Toggle the flags of many prospects at once.
+
+    Works the same as the `Prospect.toggle_*` methods, but each flag is changed with a single
+    update of all the prospects that need it. Activities, campaign flags and the search index are
+    updated once in `finish`, instead of once per prospect.
+    """
+    # Toggles that can be applied by `apply`, in the order they are applied.
+    toggle_methods = {
+        'wrong_number': 'toggle_wrong_number',
+        'do_not_call': 'toggle_do_not_call',
+        'is_priority': 'toggle_is_priority',
+        'is_qualified_lead': 'toggle_qualified_lead',
+        'owner_verified_status': 'toggle_owner_verified',
+    }
+
+    def __init__(self, user, prospect_ids, index_update=True):
+        """
+        :param user User: The user performing the toggles, or None when done by the system.
+        :param prospect_ids list: Ids of the prospects to toggle.
+        :param index_update bool: Whether the updated prospects should be updated in stacker.
+        """
+        self.user = user
+        self.prospect_ids = list(prospect_ids)
+        self.index_update = index_update
+        self.actor = user.get_full_name() if user else 'system'
+
+        self.activities = []
+        self.updated_ids = set()
+        self.priority_campaign_ids = set()
+        self.unread_campaign_ids = set()
+
+    @property
+    def prospects(self):
+        return Prospect.objects.filter(id__in=self.prospect_ids)
+
+    def apply(self, toggles):
+        """
+        Apply the toggles to the prospects and finish the toggle.
+
+        :param toggles dict: Values of the prospect fields to toggle, by field name. Fields without
+                             a toggle are ignored.
+        :return: The amount of prospects that were updated.
+        """
+        with transaction.atomic():
+            # Lock the prospects so that concurrent toggles don't create duplicated activities.
+            list(self.prospects.select_for_update().values_list('id', flat=True))
+            for field, method in self.toggle_methods.items():
+                if field in toggles:
+                    getattr(self, method)(toggles[field])
+            self.finish()
+
+        return len(self.updated_ids)
+
+    def finish(self):
+        """
+        Save the activities and update the campaigns and stacker for the toggled prospects.
+        """
+        Activity.objects.bulk_create(self.activities)
+        self.activities = []
+
+        for campaign in Campaign.objects.filter(id__in=self.priority_campaign_ids):
+            campaign.update_has_priority()
+        self.priority_campaign_ids = set()
+
+        if self.unread_campaign_ids:
+            Campaign.objects.filter(
+                id__in=self.unread_campaign_ids,
+                has_unread_sms=True,
+            ).exclude(campaignprospect__has_unread_sms=True).update(has_unread_sms=False)
+            self.unread_campaign_ids = set()
+
+        if self.index_update and self.updated_ids:
+            from search.tasks import stacker_full_update
+
+            prospect_ids = list(self.updated_ids)
+            property_ids = list(Prospect.objects.filter(
+                id__in=prospect_ids,
+                prop__isnull=False,
+            ).values_list('prop_id', flat=True))
+            transaction.on_commit(lambda: stacker_full_update.delay(prospect_ids, property_ids))
+
+    def toggle_do_not_call(self, value):
+        """
+        Toggle 'do_not_call' of the prospects that don't have the value yet.
+        """
+        prospects = list(
+            self.prospects.exclude(do_not_call=value).values_list('id', 'company_id', 'phone_raw'))
+        if not prospects:
+            return
+
+        prospect_ids = [prospect_id for prospect_id, _, _ in prospects]
+        self.__update_dead(prospect_ids, value, do_not_call=value)
+
+        phone_numbers = defaultdict(set)
+        for _, company_id, phone_raw in prospects:
+            phone_numbers[company_id].add(phone_raw)
+        if value:
+            self.__add_internal_dnc(phone_numbers)
+        else:
+            for company_id, phones in phone_numbers.items():
+                InternalDNC.objects.filter(company_id=company_id, phone_raw__in=phones).delete()
+
+        verb = "Added to" if value else "Removed from"
+        self.__add_activities(
+            prospect_ids,
+            title=Activity.Title.ADDED_DNC if value else Activity.Title.REMOVED_DNC,
+            description=f'{verb} Do Not Call list by {self.actor}',
+            icon="fa fa-plus-circle" if value else "fa fa-minus-circle",
+        )
+
+    def toggle_wrong_number(self, value):
+        """
+        Toggle 'wrong_number' of the prospects that don't have the value yet.
+        """
+        prospect_ids = list(self.prospects.exclude(wrong_number=value).values_list('id', flat=True))
+        if not prospect_ids:
+            return
+
+        self.__update_dead(prospect_ids, value, wrong_number=value)
+        self.__add_activities(
+            prospect_ids,
+            title=Activity.Title.ADDED_WRONG if value else Activity.Title.REMOVED_WRONG,
+            description=f'{"Set " if value else "Unset "} wrong number by {self.actor}',
+            icon="fa fa-plus-circle" if value else "fa fa-minus-circle",
+        )
+
+    def toggle_is_priority(self, value):
+        """
+        Toggle 'is_priority' of the prospects, verifying the owner when set as priority.
+        """
+        prospect_ids = list(self.prospects.exclude(is_priority=value).values_list('id', flat=True))
+        if not prospect_ids:
+            return
+
+        self.__update(prospect_ids, is_priority=value)
+        self.priority_campaign_ids.update(CampaignProspect.objects.filter(
+            prospect_id__in=prospect_ids,
+        ).values_list('campaign_id', flat=True))
+        self.__add_activities(
+            prospect_ids,
+            title=Activity.Title.ADDED_PRIORITY if value else Activity.Title.REMOVED_PRIORITY,
+            description=f'{"Added" if value else "Removed"} as a priority by {self.actor}',
+            icon="fa fa-plus-circle" if value else "fa fa-minus-circle",
+        )
+
+        # Giver ownership if this is a priority.
+        if value:
+            self.toggle_owner_verified(Prospect.OwnerVerifiedStatus.VERIFIED, prospect_ids)
+
+    def toggle_owner_verified(self, value, prospect_ids=None):
+        """
+        Toggle 'owner_verified_status' of the prospects that don't have the value yet.
+
+        :param prospect_ids list: Restrict the toggle to these prospects.
+        """
+        prospects = self.prospects.exclude(owner_verified_status=value)
+        if prospect_ids is not None:
+            prospects = prospects.filter(id__in=prospect_ids)
+        prospect_ids = list(prospects.values_list('id', flat=True))
+        if not prospect_ids:
+            return
+
+        self.__update(prospect_ids, owner_verified_status=value)
+
+        verified = value == Prospect.OwnerVerifiedStatus.VERIFIED
+        description = 'Owner verified by system'
+        if self.user:
+            description = f'Owner {"un" if not verified else ""}verified by {self.actor}'
+        self.__add_activities(
+            prospect_ids,
+            title=Activity.Title.OWNER_VERIFIED if verified else Activity.Title.OWNER_UNVERIFIED,
+            description=description,
+            icon="fa fa-plus-circle" if verified else 'fa fa-unlink',
+        )
+
+        if verified:
+            invalid_ids = Prospect.objects.invalidate_related_records(
+                prospect_ids,
+                user=self.user,
+                index_update=False,
+            )
+            self.updated_ids.update(invalid_ids)
+
+    def toggle_qualified_lead(self, value):
+        """
+        Toggle 'is_qualified_lead' of the prospects, verifying the owner when qualified.
+        """
+        prospect_ids = list(
+            self.prospects.exclude(is_qualified_lead=value).values_list('id', flat=True))
+        if not prospect_ids:
+            return
+
+        self.__update(
+            prospect_ids,
+            is_qualified_lead=value,
+            qualified_lead_dt=django_tz.now() if value else None,
+            qualified_lead_created_by=self.user if value else None,
+        )
+
+        # Update the campaigns' total leads, grouped by the amount of leads they changed by.
+        leads = CampaignProspect.objects.filter(
+            prospect_id__in=prospect_ids,
+            campaign__campaign_stats__isnull=False,
+        ).order_by().values('campaign__campaign_stats').annotate(total=Count('id'))
+        stats_by_total = defaultdict(list)
+        for row in leads:
+            stats_by_total[row['total']].append(row['campaign__campaign_stats'])
+        for total, stats_ids in stats_by_total.items():
+            CampaignAggregatedStats.objects.filter(id__in=stats_ids).update(
+                total_leads=F('total_leads') + (total if value else -total),
+            )
+
+        self.__add_activities(
+            prospect_ids,
+            title=Activity.Title.ADDED_QUALIFIED if value else Activity.Title.REMOVED_QUALIFIED,
+            description=f'{"Added" if value else "Removed"} as a qualified lead by {self.actor}',
+            icon="fa fa-plus-circle" if value else "fa fa-minus-circle",
+        )
+
+        # Giver ownership if this is a qualified lead.
+        if value:
+            self.toggle_owner_verified(Prospect.OwnerVerifiedStatus.VERIFIED, prospect_ids)
+
+    def mark_as_read(self, prospect_ids):
+        """
+        Set the prospects, their campaign prospects and messages to be read.
+        """
+        SMSMessage.objects.filter(
+            prospect_id__in=prospect_ids,
+            from_prospect=True,
+            unread_by_recipient=True,
+        ).update(unread_by_recipient=False)
+
+        campaign_prospects = CampaignProspect.objects.filter(prospect_id__in=prospect_ids)
+        self.unread_campaign_ids.update(campaign_prospects.values_list('campaign_id', flat=True))
+        campaign_prospects.update(has_unread_sms=False)
+
+        unread = defaultdict(list)
+        for prospect_id, company_id in Prospect.objects.filter(
+                id__in=prospect_ids,
+                has_unread_sms=True,
+        ).values_list('id', 'company_id'):
+            unread[company_id].append(prospect_id)
+        if not unread:
+            return
+
+        unread_ids = [prospect_id for ids in unread.values() for prospect_id in ids]
+        Prospect.objects.filter(id__in=unread_ids).update(has_unread_sms=False)
+        for company in Company.objects.filter(id__in=unread):
+            UnreadInbox(company).remove(*unread[company.id])
+
+        # Decrement the unread count of the profiles by the amount of prospects they had access to.
+        access = CampaignAccess.objects.filter(
+            campaign__campaignprospect__prospect_id__in=unread_ids,
+        ).values('user_profile').annotate(
+            total=Count('campaign__campaignprospect__prospect', distinct=True),
+        )
+        totals = {row['user_profile']: row['total'] for row in access}
+        profiles = []
+        for profile in UserProfile.objects.filter(id__in=totals, unread_prospect_count__gt=0):
+            profile.unread_prospect_count = Greatest(
+                F('unread_prospect_count') - totals[profile.id], 0)
+            profiles.append(profile)
+        UserProfile.objects.bulk_update(profiles, ['unread_prospect_count'])
+
+    def __update(self, prospect_ids, **values):
+        Prospect.objects.filter(id__in=prospect_ids).update(
+            last_modified=django_tz.now(),
+            **values,
+        )
+        self.updated_ids.update(prospect_ids)
+
+    def __update_dead(self, prospect_ids, dead, **values):
+        """
+        Update the prospects, setting them to their company's "Dead" lead stage and read if `dead`.
+        """
+        if dead:
+            values['lead_stage'] = Subquery(LeadStage.objects.filter(
+                company_id=OuterRef('company_id'),
+                lead_stage_title="Dead",
+            ).values('id')[:1])
+        self.__update(prospect_ids, **values)
+
+        if dead:
+            self.mark_as_read(prospect_ids)
+
+    def __add_internal_dnc(self, phone_numbers):
+        """
+        Add the phone numbers to the companies' `InternalDNC`, unless they are already there.
+
+        :param phone_numbers dict: Set of phone numbers by company id.
+        """
+        internal_dnc = []
+        for company_id, phones in phone_numbers.items():
+            existing = set(InternalDNC.objects.filter(
+                company_id=company_id,
+                phone_raw__in=phones,
+            ).values_list('phone_raw', flat=True))
+            internal_dnc.extend(
+                InternalDNC(company_id=company_id, phone_raw=phone_raw)
+                for phone_raw in phones - existing
+            )
+        InternalDNC.objects.bulk_create(internal_dnc)
+
+    def __add_activities(self, prospect_ids, **fields):
+        self.activities.extend(
+            Activity(prospect_id=prospect_id, **fields) for prospect_id in prospect_ids)
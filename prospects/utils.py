@@ -2,12 +2,13 @@ import re
 
 from django.conf import settings
 from django.contrib.postgres.aggregates import ArrayAgg
-from django.db.models import CharField, Count, F, Q, Value
-from django.db.models.functions import Concat
+from django.db.models import CharField, Count, F, Func, Q, Value
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 
 from core.utils import clean_phone
 from properties.utils import get_or_create_attom_tags
+from prospects.carriers import CarrierLookup
 from prospects.tasks import upload_prospects_task2
 from search.tasks import stacker_full_update
 from sherpa.csv_uploader import ProcessUpload
@@ -24,6 +25,25 @@ PROSPECT_EXPORT_HEADERS = [
 CP_EXPORT_HEADERS = PROSPECT_EXPORT_HEADERS + ['Skip Reason', 'Litigator', 'Associated Litigator']
 
 
+class FullName(Func):
+    """
+    Prospect's first and last name separated by a space.
+
+    The generated sql must stay the same as the expression of the `sherpa_prospect_fullname_trgm`
+    index so that searching names can use it.
+    """
+    arg_joiner = " || ' ' || "
+    template = '(%(expressions)s)'
+    output_field = CharField()
+
+    def __init__(self, **extra):
+        super().__init__(
+            Coalesce('first_name', Value('')),
+            Coalesce('last_name', Value('')),
+            **extra,
+        )
+
+
 class ProspectSearch:
     """
     Search for matching `Prospects` given text to search, and a `LeadStage`.
@@ -94,14 +114,7 @@ class ProspectSearch:
         # Execute search with chosen filter
         self.result = Prospect.objects.filter(company=self.user.profile.company)
         if not input_has_number:
-            self.result = self.result.annotate(
-                fn_search=Concat(
-                    'first_name',
-                    Value(' '),
-                    'last_name',
-                    output_field=CharField(),
-                ),
-            )
+            self.result = self.result.annotate(fn_search=FullName())
         self.result = self.result.filter(search_filter)
 
     def __filter_by_custom_options(self):
@@ -143,7 +156,7 @@ class ProspectSearch:
 
         # Only search name if there's no numbers in search input
         # Search full name by `fn_search`, an annotation of the concatenation of `first_name` and
-        # `last_name`.
+        # `last_name`. All the searched fields have trigram indexes that `icontains` can use.
         extended_search_criteria = phone_and_address_criteria if input_has_number else (
             Q(fn_search__icontains=self.search_input_text) | phone_and_address_criteria)
 
@@ -434,6 +447,8 @@ class ProcessProspectUpload(ProcessUpload):
         super().__init__(upload, upload_type='prospect')
         self.tags = tags or []
         self.is_property_upload = not upload.campaign
+        # Phone types are not looked up in tests.
+        self.carrier_lookup = None if settings.TEST_MODE else CarrierLookup()
 
     def requeue_task(self):
         upload_prospects_task2.delay(self.upload.pk, self.tags)
@@ -474,7 +489,13 @@ class ProcessProspectUpload(ProcessUpload):
             if not phones:
                 Prospect.objects.create_from_data(data, self.upload, prop)
             elif not self.is_property_upload or (data or phones or prop.mailing_address):
-                Prospect.objects.create_from_phones(phones, data, self.upload, prop)
+                Prospect.objects.create_from_phones(
+                    phones,
+                    data,
+                    self.upload,
+                    prop,
+                    carrier_lookup=self.carrier_lookup,
+                )
 
             address_obj = prop.address
             if address_obj:
@@ -0,0 +1,234 @@
+from django_redis import get_redis_connection
+from smartystreets_python_sdk import Batch
+from smartystreets_python_sdk.us_street import Lookup
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from services.smarty import smarty_client
+from sherpa.models import Prospect
+
+# Prospect fields that are saved with the result of a validation.
+VALIDATED_FIELDS = [
+    'property_address',
+    'property_city',
+    'property_state',
+    'property_zip',
+    'validated_property_status',
+    'validated_property_vacant',
+    'validated_property_delivery_line_1',
+    'validated_property_delivery_line_2',
+    'validated_property_plus4_code',
+    'validated_property_latitude',
+    'validated_property_longitude',
+]
+
+
+class AddressValidationQueue:
+    """
+    Prospects waiting for their property address to be validated with SmartyStreets.
+
+    New prospects are added to a redis list instead of being validated one at a time. The queue is
+    flushed in batches of up to 100 lookups, the most that SmartyStreets accepts in a request, as
+    soon as a batch is full or `delay` seconds after the first prospect was queued. Prospects with
+    the same raw address share their lookup and the results are saved with a bulk update.
+
+    Batches that fail are retried by a flush `retry_delay` seconds later, and are moved to a failed
+    list once they failed `max_attempts` times.
+    """
+    batch_size = 100
+    # Seconds that a prospect can wait in the queue for the batch to fill up.
+    delay = 10
+    max_attempts = 5
+    retry_delay = 60
+
+    def __init__(self, client=smarty_client):
+        """
+        :param client: SmartyStreets client used to send the batches.
+        """
+        self.client = client
+        self.key = cache.make_key('address_validation_queue')
+        self.scheduled_key = cache.make_key('address_validation_queue_scheduled')
+        self.attempts_key = cache.make_key('address_validation_queue_attempts')
+        self.failed_key = cache.make_key('address_validation_queue_failed')
+        self.redis = get_redis_connection()
+
+    def __len__(self):
+        return self.redis.llen(self.key)
+
+    def add(self, *prospect_ids):
+        """
+        Queue prospects for validation and schedule the flush of the queue.
+        """
+        from .tasks import flush_address_validation_queue
+
+        if not prospect_ids:
+            return
+
+        length = self.redis.rpush(self.key, *prospect_ids)
+        if length >= self.batch_size:
+            flush_address_validation_queue.delay()
+        elif self.redis.set(self.scheduled_key, 1, nx=True, ex=self.delay * 6):
+            # The scheduled flag expires in case the flush is lost, so that it can be scheduled
+            # again by the next prospect.
+            self.schedule_flush(self.delay)
+
+    def schedule_flush(self, countdown):
+        from .tasks import flush_address_validation_queue
+
+        flush_address_validation_queue.apply_async(countdown=countdown)
+
+    def pop(self):
+        """
+        Remove and return the ids of the next batch of prospects.
+        """
+        pipeline = self.redis.pipeline()
+        pipeline.lrange(self.key, 0, self.batch_size - 1)
+        pipeline.ltrim(self.key, self.batch_size, -1)
+        prospect_ids, _ = pipeline.execute()
+        return [int(prospect_id) for prospect_id in prospect_ids]
+
+    def requeue(self, prospect_ids):
+        """
+        Put back a popped batch that failed at the front of the queue and schedule a flush to retry
+        it, or move it to the failed list when it already failed `max_attempts` times.
+
+        The attempts are counted by prospect, as the batches of a flush are not always the same.
+
+        :return bool: Whether the batch was put back in the queue.
+        """
+        pipeline = self.redis.pipeline()
+        for prospect_id in prospect_ids:
+            pipeline.hincrby(self.attempts_key, prospect_id)
+        pipeline.expire(self.attempts_key, self.retry_delay * self.max_attempts * 6)
+        *attempts, _ = pipeline.execute()
+
+        if max(attempts) >= self.max_attempts:
+            pipeline.rpush(self.failed_key, *prospect_ids)
+            pipeline.hdel(self.attempts_key, *prospect_ids)
+            pipeline.execute()
+            return False
+
+        self.redis.lpush(self.key, *reversed(prospect_ids))
+        if self.redis.set(self.scheduled_key, 1, nx=True, ex=self.retry_delay * 6):
+            self.schedule_flush(self.retry_delay)
+        return True
+
+    def flush(self):
+        """
+        Validate all the queued prospects, one batch at a time.
+
+        :return: The amount of prospects that were validated.
+        """
+        # Prospects queued from now on schedule another flush.
+        self.redis.delete(self.scheduled_key)
+
+        total = 0
+        while True:
+            prospect_ids = self.pop()
+            if not prospect_ids:
+                break
+            try:
+                total += self.validate(prospect_ids)
+            except Exception:
+                # The prospects of a batch that failed, such as when SmartyStreets times out, are
+                # validated by a later flush instead of being lost.
+                self.requeue(prospect_ids)
+                raise
+            self.redis.hdel(self.attempts_key, *prospect_ids)
+        return total
+
+    def validate(self, prospect_ids):
+        """
+        Validate the property address of the prospects with a single batch.
+
+        :return: The amount of prospects that were validated.
+        """
+        # Prospects that were validated since they were queued are skipped.
+        prospects = Prospect.objects.filter(id__in=prospect_ids).filter(
+            Q(validated_property_status=None) | Q(validated_property_status=''),
+        )
+
+        # Prospects with the same raw address are validated with the same lookup.
+        batch = Batch()
+        prospects_by_key = {}
+        updated = []
+        for prospect in prospects:
+            key = self.get_lookup_key(prospect)
+            if key is None:
+                self.update_prospect(prospect, None)
+                updated.append(prospect)
+                continue
+            if key not in prospects_by_key:
+                prospects_by_key[key] = []
+                batch.add(self.build_lookup(*key))
+            prospects_by_key[key].append(prospect)
+
+        if len(batch):
+            self.client.send_batch(batch)
+
+        for lookup, lookup_prospects in zip(batch, prospects_by_key.values()):
+            candidate = lookup.result[0] if lookup.result else None
+            for prospect in lookup_prospects:
+                self.update_prospect(prospect, candidate)
+            updated.extend(lookup_prospects)
+
+        Prospect.objects.bulk_update(updated, VALIDATED_FIELDS)
+        return len(updated)
+
+    @staticmethod
+    def get_lookup_key(prospect):
+        """
+        Return the normalized parts of the prospect's raw address that are sent to SmartyStreets,
+        in priority: full address, street + zip, street + city + state.
+        """
+        validate_type = prospect.raw_address_to_validate_type
+        parts = [
+            prospect.property_address,
+            prospect.property_city,
+            prospect.property_state,
+            prospect.property_zip,
+        ]
+        if validate_type == 'address_zip':
+            parts[1] = parts[2] = ''
+        elif validate_type == 'address_city_state':
+            parts[3] = ''
+        elif validate_type != 'full_address':
+            return None
+        return (validate_type, *[' '.join((part or '').upper().split()) for part in parts])
+
+    @staticmethod
+    def build_lookup(validate_type, street, city, state, zip_code):
+        lookup = Lookup()
+        if validate_type == 'full_address':
+            lookup.street = f'{street}, {city} {state} {zip_code}'
+        else:
+            lookup.street = street
+            lookup.city = city or None
+            lookup.state = state or None
+            lookup.zipcode = zip_code or None
+        return lookup
+
+    @staticmethod
+    def update_prospect(prospect, candidate):
+        """
+        Set the validated address of the SmartyStreets candidate on the prospect.
+        """
+        if candidate is None:
+            prospect.validated_property_status = 'invalid'
+            return
+
+        components = candidate.components
+        metadata = candidate.metadata
+        prospect.validated_property_status = 'validated'
+        prospect.property_address = f'{candidate.delivery_line_1} {candidate.delivery_line_2}' \
+            if candidate.delivery_line_2 else candidate.delivery_line_1
+        prospect.property_city = components.city_name
+        prospect.property_state = components.state_abbreviation
+        prospect.property_zip = components.zipcode
+        prospect.validated_property_vacant = candidate.analysis.vacant
+        prospect.validated_property_delivery_line_1 = candidate.delivery_line_1
+        prospect.validated_property_delivery_line_2 = candidate.delivery_line_2
+        prospect.validated_property_plus4_code = components.plus4_code
+        prospect.validated_property_latitude = metadata.latitude
+        prospect.validated_property_longitude = metadata.longitude
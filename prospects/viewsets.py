@@ -2,7 +2,8 @@ from drf_yasg.utils import no_body, swagger_auto_schema
 from pytz import timezone
 
 from django.conf import settings
-from django.db.models import F, Q, Window
+from django.db import transaction
+from django.db.models import F, Prefetch, Q, Window
 from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from django.utils import timezone as dj_timezone
@@ -26,6 +27,7 @@ from campaigns.utils import push_to_campaign
 from companies.models import DownloadHistory
 from companies.tasks import generate_download
 from core.mixins import CompanyAccessMixin, CreatedByMixin
+from markets.capacity import SendCapacity
 from phone.choices import Provider
 from prospects.utils import record_phone_number_opt_outs
 from sherpa.docs import expandable_query_parameters
@@ -38,6 +40,7 @@ from sherpa.models import (
     Note,
     PhoneNumber,
     Prospect,
+    SMSMessage,
     UserProfile,
 )
 from sherpa.permissions import (
@@ -59,6 +62,7 @@ from .docs import (
     unread_parameters,
 )
 from .filters import CampaignProspectFilter
+from .inbox import UnreadInbox
 from .models import ProspectRelay, ProspectTag
 from .permissions import CustomTagModify
 from .serializers import (
@@ -82,6 +86,7 @@ from .serializers import (
     PublicProspectSerializer,
     UnreadMessagesSerializer,
 )
+from .toggles import BulkProspectToggle
 from .utils import is_empty_search, ProspectSearch
 
 
@@ -751,8 +756,9 @@ class CampaignProspectViewSet(RetrieveModelMixin, ListModelMixin, CreateModelMix
         campaign_prospect = self.get_object()
         campaign = campaign_prospect.campaign
         market = campaign.market
+        capacity = SendCapacity(campaign.company)
 
-        if market.total_intial_sms_sent_today_count > market.total_initial_send_sms_daily_limit:
+        if capacity.is_over_limit(market):
             return Response({'detail': "Daily limit has been reached"}, status=400)
 
         if not campaign.sms_template:
@@ -769,6 +775,11 @@ class CampaignProspectViewSet(RetrieveModelMixin, ListModelMixin, CreateModelMix
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
+        # The send is counted towards the daily limit here, and released by the task if the
+        # message is not sent.
+        if not capacity.reserve(market):
+            return Response({'detail': "Daily limit has been reached"}, status=400)
+
         action = serializer.validated_data.get('action', None)
         default_template_id = campaign_prospect.sms_template_id if campaign_prospect.\
             sms_template_id else campaign.sms_template_id
@@ -821,14 +832,10 @@ class CampaignProspectViewSet(RetrieveModelMixin, ListModelMixin, CreateModelMix
         is_count_only = request.query_params.get('include_messages') == 'false'
 
         if profile.is_admin:
-            unread_prospect_query = Prospect.objects.filter(
+            unread_prospect_count = Prospect.objects.filter(
                 company=request.user.profile.company,
                 has_unread_sms=True,
-            )
-            unread_campaign_prospect_query = CampaignProspect.objects.filter(
-                prospect__in=unread_prospect_query,
-            )
-            unread_prospect_count = unread_prospect_query.count()
+            ).count()
         else:
             accessible_campaign_ids = Campaign.objects.has_access(request.user).filter(
                 has_unread_sms=True,
@@ -848,31 +855,54 @@ class CampaignProspectViewSet(RetrieveModelMixin, ListModelMixin, CreateModelMix
             }
             return Response(count_only_response_data)
 
-        # Limit to just 100 prospects to avoid performance issues.
+        # Get the 100 most recent unread prospects from the company's inbox to avoid performance
+        # issues, instead of sorting all the unread prospects.
+        accessible_prospects = None
+        if not profile.is_admin:
+            accessible_prospects = Prospect.objects.filter(
+                campaignprospect__campaign_id__in=accessible_campaign_ids,
+            )
+        inbox = UnreadInbox(profile.company)
+        prospect_ids = inbox.get_prospect_ids(100, accessible_prospects)
+        inbox_order = {prospect_id: i for i, prospect_id in enumerate(prospect_ids)}
+
         # We also create an order for limiting the total amount of campaignprospects while
         # making sure we are not including many entries for some prospects and omitting others
         # because we hit the campaignprospect limit before we hit the prospect limit)
-        unread_campaign_prospect_query = unread_campaign_prospect_query.filter(
-            prospect__in=unread_prospect_query[:100],
-        ).annotate(
+        unread_campaign_prospect_query = CampaignProspect.objects.filter(
+            prospect_id__in=prospect_ids,
+        )
+        if not profile.is_admin:
+            unread_campaign_prospect_query = unread_campaign_prospect_query.filter(
+                campaign_id__in=accessible_campaign_ids,
+            )
+        unread_campaign_prospect_query = unread_campaign_prospect_query.annotate(
             campaign_prospect_order=Window(
                 expression=RowNumber(),
                 partition_by=[F('prospect__pk')],
                 order_by=F('prospect__pk').desc(),
             ),
-        ).order_by("campaign_prospect_order")
+        ).order_by("campaign_prospect_order", "prospect_id")
 
-        # this cuts queries by over 10% and query time by about a third
-        # further select or prefetch related make performance worse... need to evaluate if
-        # fully hydrated serializer is necessary here.... relay for agent_profile and prospect?
+        # Only the latest message of each prospect is needed to display the unread messages.
+        latest_messages = SMSMessage.objects.filter(
+            prospect_id__in=prospect_ids,
+        ).order_by('prospect_id', '-dt').distinct('prospect_id').values('id')
         campaign_prospect_list = unread_campaign_prospect_query.prefetch_related(
-            'prospect__messages',
+            Prefetch(
+                'prospect__messages',
+                queryset=SMSMessage.objects.filter(id__in=latest_messages),
+            ),
         )
 
         # Limit to just 200 campaign prospects to avoid performance issues.
         # 200 is enough so the 100 prospects are included and some can be on more than 1 campaign
         # while limiting the performance impact
-        cp_serializer = CampaignProspectUnreadSerializer(campaign_prospect_list[:200], many=True)
+        campaign_prospect_list = sorted(
+            campaign_prospect_list[:200],
+            key=lambda cp: (cp.campaign_prospect_order, inbox_order[cp.prospect_id]),
+        )
+        cp_serializer = CampaignProspectUnreadSerializer(campaign_prospect_list, many=True)
         response_data = {
             'count': unread_prospect_count,
             'results': cp_serializer.data,
@@ -899,17 +929,25 @@ class CampaignProspectViewSet(RetrieveModelMixin, ListModelMixin, CreateModelMix
 
         pk_list = serializer.validated_data.get('values')
         action = serializer.validated_data.get('action')
-        toggle_action_count = 0
-        for cp in CampaignProspect.objects.filter(pk__in=pk_list):
-            toggle_method = CampaignProspect.BulkToggleActions.TOGGLE_METHODS.get(action, None)
-            if toggle_method:
-                method = toggle_method['method']
-                value = toggle_method['value']
-                if toggle_method['object'] == 'Prospect':
-                    getattr(cp.prospect, method)(request.user, value)
-                else:
-                    getattr(cp, method)(request.user, value)
-                toggle_action_count += 1
+        campaign_prospects = CampaignProspect.objects.filter(pk__in=pk_list)
+        toggle_method = CampaignProspect.BulkToggleActions.TOGGLE_METHODS.get(action, None)
+        if not toggle_method:
+            return Response({'rows_updated': 0})
+
+        toggle_action_count = campaign_prospects.count()
+        value = toggle_method['value']
+        if toggle_method['object'] == 'Prospect':
+            # Toggle all the prospects at once rather than calling the prospect's toggle method
+            # for each of them.
+            bulk_toggle = BulkProspectToggle(
+                request.user,
+                set(campaign_prospects.values_list('prospect_id', flat=True)),
+            )
+            with transaction.atomic():
+                getattr(bulk_toggle, toggle_method['method'])(value)
+                bulk_toggle.finish()
+        else:
+            campaign_prospects.update(has_been_viewed=value)
         return Response({'rows_updated': toggle_action_count})
 
 
@@ -10,6 +10,7 @@ from django.db import transaction
 from django.db.models import Q
 
 from billing.models import Transaction
+from prospects.toggles import BulkProspectToggle
 from sherpa.models import CampaignProspect, Prospect, SherpaTask
 from sherpa.utils import get_upload_additional_cost
 from skiptrace.models import UploadSkipTrace
@@ -144,18 +145,9 @@ def handle_prospect_tag_update(
         if properties_ids:
             handle_property_tagging(properties_ids, tags, is_adding)
 
-    with transaction.atomic():
-        for p in Prospect.objects.select_for_update().filter(id__in=prospect_id):
-            if "wrong_number" in toggles:
-                p.toggle_wrong_number(user, toggles["wrong_number"], index_update=False)
-            if "do_not_call" in toggles:
-                p.toggle_do_not_call(user, toggles["do_not_call"], index_update=False)
-            if "is_priority" in toggles:
-                p.toggle_is_priority(user, toggles["is_priority"], index_update=False)
-            if "is_qualified_lead" in toggles:
-                p.toggle_qualified_lead(user, toggles["is_qualified_lead"], index_update=False)
-        if "opted_out" in toggles:
-            Prospect.objects.filter(id__in=prospect_id).update(opted_out=toggles["opted_out"])
+    BulkProspectToggle(user, prospect_id, index_update=False).apply(toggles)
+    if "opted_out" in toggles:
+        Prospect.objects.filter(id__in=prospect_id).update(opted_out=toggles["opted_out"])
     if toggles:
         stacker_update_prospect_data.delay(prospect_id, toggles)
 
@@ -165,7 +157,7 @@ def push_to_campaign_task(task_id):
     """
     A task
     """
-    from campaigns.utils import push_to_campaign
+    from campaigns.push import BulkCampaignPush
 
     task = SherpaTask.objects.get(id=task_id)
     if task.pause:
@@ -178,25 +170,31 @@ def push_to_campaign_task(task_id):
         campaign = get_or_create_campaign(task)
         if not campaign:
             return
-        remaining_prospects = Prospect.objects.filter(
+        remaining_ids = list(Prospect.objects.filter(
             id__in=attributes.get("id_list"),
             company_id=task.company_id,
-        ).exclude(pk__in=campaign.prospects.values_list("id", flat=True))
-        for prospect in remaining_prospects:
-            task.refresh_from_db()
-            if task.pause:
+        ).exclude(
+            pk__in=campaign.prospects.values_list("id", flat=True),
+        ).order_by("id").values_list("id", flat=True))
+
+        # Prospects are pushed in chunks, saving the charge with each chunk so that the task can
+        # resume from the last chunk when paused or restarted.
+        campaign_push = BulkCampaignPush(
+            campaign,
+            tags=attributes.get("tags"),
+            sms=not is_direct_mail,
+        )
+        for start in range(0, len(remaining_ids), campaign_push.chunk_size):
+            if SherpaTask.objects.filter(id=task.id, pause=True).exists():
+                campaign_push.finish()
                 return
-            charge = push_to_campaign(
-                campaign,
-                prospect,
-                tags=attributes.get("tags"),
-                upload_skip_trace=None,
-                sms=not is_direct_mail,
-            )
-            if not is_direct_mail:
-                attributes["charge"] += charge
-                task.attributes = attributes
-                task.save(update_fields=["attributes"])
+            with transaction.atomic():
+                charge = campaign_push.push(remaining_ids[start:start + campaign_push.chunk_size])
+                if not is_direct_mail:
+                    attributes["charge"] += charge
+                    task.attributes = attributes
+                    task.save(update_fields=["attributes"])
+        campaign_push.finish()
 
         campaign_prospects = CampaignProspect.objects.filter(
             campaign=campaign,
@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from django.db import connection
+
+
+def build_session(pool_size=10, max_retries=3, backoff_factor=0.5,
+                  status_forcelist=(429, 500, 502, 503, 504), methods=('GET',), retry_reads=True):
+    """
+    Return a `requests.Session` with a connection pool and retry with exponential backoff.
+
+    :param pool_size: Number of connections to keep alive per host. Should be at least as large
+                      as the number of threads sharing the session.
+    :param max_retries: Number of retries for connection errors and `status_forcelist` responses.
+    :param backoff_factor: Sleep `backoff_factor * 2 ** (retry - 1)` seconds between retries.
+    :param status_forcelist: Response status codes that should be retried.
+    :param methods: HTTP methods that are safe to retry for this api. Connection errors are
+                    retried for every method, as the request never reached the server.
+    :param retry_reads: Whether to retry when the request was sent but the response could not be
+                        read. Should be disabled when retrying `methods` that are not idempotent.
+    """
+    retry = Retry(
+        total=max_retries,
+        read=None if retry_reads else 0,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        allowed_methods=frozenset(methods),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket used to rate limit calls to an external api.
+    """
+    def __init__(self, rate, capacity=None):
+        """
+        :param rate: Tokens added to the bucket per second. A falsy rate disables the limit.
+        :param capacity: Maximum burst size, defaults to `rate`.
+        """
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available and consume it.
+        """
+        if not self.rate:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def run_concurrently(func, items, max_workers):
+    """
+    Call `func` for each item in `items` using a bounded thread pool and return the results in
+    the same order as `items`.
+
+    Each worker takes the next item until there are none left and then closes its database
+    connection, since django opens one per thread. When `max_workers` is 1 the items are processed
+    in the calling thread, which is required in tests as the worker threads can't see data inside
+    the test transaction.
+    """
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    results = [None] * len(items)
+    pending = iter(enumerate(items))
+    lock = threading.Lock()
+
+    def work():
+        try:
+            while True:
+                with lock:
+                    index, item = next(pending, (None, None))
+                if index is None:
+                    return
+                results[index] = func(item)
+        finally:
+            connection.close()
+
+    workers = min(max_workers, len(items))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(work) for _ in range(workers)]
+    for future in futures:
+        future.result()
+    return results
@@ -0,0 +1,131 @@
+import base64
+import threading
+import time
+
+from django.conf import settings
+
+from .http import build_session, TokenBucket
+
+
+class IDIClient:
+    """
+    Client to run searches against the IDI api.
+
+    A single client is meant to be shared by all the workers of a skip trace so they reuse the
+    same connection pool, authentication token and rate limit.
+    """
+    # IDI tokens are valid for 30 minutes, refresh a few minutes early.
+    token_lifetime = 1500
+    # Every search that reaches IDI is billed, so searches are only retried when they were throttled
+    # or could not be sent.
+    retry_status_codes = (429,)
+
+    def __init__(
+            self,
+            client_id=None,
+            client_secret=None,
+            login_url=None,
+            api_url=None,
+            rate_limit=None,
+            pool_size=None,
+            timeout=None,
+            session=None,
+    ):
+        self.client_id = client_id or settings.IDI_CLIENT_ID
+        self.client_secret = client_secret or settings.IDI_CLIENT_SECRET
+        self.login_url = login_url or settings.IDI_LOGIN_BASE_URL
+        self.api_url = api_url or settings.IDI_API_BASE_URL
+        self.timeout = timeout or settings.IDI_TIMEOUT
+        self.session = session or build_session(
+            pool_size=pool_size or settings.IDI_MAX_WORKERS,
+            status_forcelist=self.retry_status_codes,
+            methods=('POST',),
+            retry_reads=False,
+        )
+        self.rate_limiter = TokenBucket(
+            rate_limit if rate_limit is not None else settings.IDI_RATE_LIMIT)
+        self.token = None
+        self.token_expires = 0
+        self.token_lock = threading.Lock()
+
+    @property
+    def has_valid_token(self):
+        return bool(self.token) and time.monotonic() < self.token_expires
+
+    def get_token(self):
+        """
+        Return the current token, authenticating first if there's no valid token.
+        """
+        if self.has_valid_token:
+            return self.token
+        return self.refresh_token()
+
+    def refresh_token(self, stale_token=None):
+        """
+        Authenticate with IDI and store the new token.
+
+        :param stale_token: Token that was rejected by IDI. If another worker already replaced
+                            it, the current token is returned without authenticating again.
+        """
+        with self.token_lock:
+            if self.has_valid_token and self.token != stale_token:
+                return self.token
+
+            credentials = f'{self.client_id}:{self.client_secret}'.encode()
+            headers = {
+                'authorization': 'Basic ' + base64.b64encode(credentials).decode(),
+                'content-type': 'application/json',
+            }
+            response = self.session.post(
+                self.login_url + 'apiclient',
+                json={'glba': 'liability', 'dppa': 'verification'},
+                headers=headers,
+                timeout=self.timeout,
+            )
+            if response.status_code != 200:
+                raise ConnectionRefusedError('Could not authenticate with IDI.')
+
+            self.token = response.text
+            self.token_expires = time.monotonic() + self.token_lifetime
+            return self.token
+
+    def invalidate_token(self):
+        """
+        Force the next search to authenticate again.
+        """
+        with self.token_lock:
+            self.token_expires = 0
+
+    def search(self, search_criteria):
+        """
+        Run IDI search and return the response for the given criteria.
+
+        Connection errors and throttled responses are retried with backoff by the session. Failed
+        responses are not retried, as IDI may have already billed the search. An unauthorized
+        response refreshes the shared token and retries once.
+        """
+        token = self.get_token()
+        response = self.__post_search(search_criteria, token)
+        if response.status_code == 401:
+            response = self.__post_search(search_criteria, self.refresh_token(stale_token=token))
+        return response
+
+    def __post_search(self, search_criteria, token):
+        """
+        Wait for the rate limit and send the search request.
+        """
+        self.rate_limiter.acquire()
+        headers = {
+            'authorization': token,
+            'content-type': 'application/json',
+            'accept': 'application/json',
+        }
+        return self.session.post(
+            self.api_url + 'search/',
+            json=search_criteria,
+            headers=headers,
+            timeout=self.timeout,
+        )
+
+
+idi_client = IDIClient()
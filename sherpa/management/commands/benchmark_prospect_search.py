@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from prospects.utils import ProspectSearch
+
+SEED_PROSPECTS_SQL = """
+INSERT INTO sherpa_prospect (
+    company_id, first_name, last_name, phone_raw, property_address, property_city, property_state,
+    property_zip, has_unread_sms, wrong_number, do_not_call, is_priority, is_qualified_lead,
+    has_reminder, reminder_email_sent, owner_verified_status, total_sms_sent_count,
+    total_sms_received_count
+)
+SELECT
+    %(company_id)s,
+    (ARRAY['John', 'Mary', 'Robert', 'Linda', 'James', 'Patricia'])[1 + i %% 6] || (i %% 5000),
+    (ARRAY['Smith', 'Johnson', 'Brown', 'Jones', 'Garcia', 'Davis'])[1 + (i / 6) %% 6],
+    (5550000000 + i)::text,
+    (i %% 99999) || ' ' || (ARRAY['Main', 'Oak', 'Pine', 'Maple', 'Cedar'])[1 + i %% 5] || ' St',
+    (ARRAY['Austin', 'Dallas', 'Houston', 'Denver', 'Phoenix'])[1 + i %% 5],
+    (ARRAY['TX', 'CO', 'AZ', 'CA'])[1 + i %% 4],
+    lpad((i %% 99999)::text, 5, '0'),
+    false, false, false, false, false, false, false, 'open', 0, 0
+FROM generate_series(1, %(amount)s) AS i;
+"""
+
+DEFAULT_SEARCH_TERMS = ['Patricia', 'Garcia', 'mary smith', '4242 Oak', 'Dallas', '55500042']
+
+
+class Command(BaseCommand):
+    """
+    Seeds prospects for the user's company and reports `ProspectSearch` latency.
+    """
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--amount', nargs='?', type=int, default=0)
+        parser.add_argument('--runs', nargs='?', type=int, default=3)
+        parser.add_argument('--terms', nargs='*', default=DEFAULT_SEARCH_TERMS)
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG:
+            print('You cannot use this command while DEBUG mode is off.')
+            return
+
+        user = User.objects.get(username=options['username'])
+        company_id = user.profile.company_id
+        amount = options['amount']
+        if amount:
+            print(f'Creating {amount} prospects for company {company_id}.')
+            with connection.cursor() as cursor:
+                cursor.execute(SEED_PROSPECTS_SQL, {'company_id': company_id, 'amount': amount})
+                cursor.execute('ANALYZE sherpa_prospect;')
+
+        for term in options['terms']:
+            timings = []
+            for _ in range(options['runs']):
+                start = time.perf_counter()
+                search = ProspectSearch(term, user, {})
+                search.search()
+                count = search.result.count()
+                list(search.result[:100])
+                timings.append(time.perf_counter() - start)
+
+            median = statistics.median(timings) * 1000
+            print(f'{term!r:<16} {count:>9} results {median:>9.1f} ms')
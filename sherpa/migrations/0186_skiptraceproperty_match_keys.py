@@ -0,0 +1,40 @@
+# Generated by Django 2.2.28 on 2026-10-18 20:50
+
+from django.db import migrations, models
+
+
+def normalized(field):
+    return f"lower(btrim(regexp_replace(coalesce({field}, ''), '\\s+', ' ', 'g')))"
+
+
+def backfill_match_key_sql(address_type):
+    prefix = f'validated_{address_type}_'
+    parts = " || '|' || ".join(
+        normalized(f'{prefix}{field}') for field in ['delivery_line_1', 'delivery_line_2', 'zipcode']
+    )
+    return f"""
+        UPDATE sherpa_skiptraceproperty SET {address_type}_match_key = md5({parts})
+        WHERE {prefix}status = 'validated';
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sherpa', '0185_auto_20210826_2326'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='skiptraceproperty',
+            name='mailing_match_key',
+            field=models.CharField(blank=True, db_index=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='skiptraceproperty',
+            name='property_match_key',
+            field=models.CharField(blank=True, db_index=True, max_length=32, null=True),
+        ),
+        migrations.RunSQL(backfill_match_key_sql('mailing'), migrations.RunSQL.noop),
+        migrations.RunSQL(backfill_match_key_sql('property'), migrations.RunSQL.noop),
+    ]
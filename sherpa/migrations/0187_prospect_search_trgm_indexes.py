@@ -0,0 +1,43 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Index name and expression of each field searched by `ProspectSearch`. The expressions must be
+# the same as the sql generated by the `icontains` lookups for postgres to use the indexes.
+SEARCH_INDEXES = [
+    ('sherpa_prospect_phone_raw_trgm', 'UPPER(phone_raw::text)'),
+    ('sherpa_prospect_property_address_trgm', 'UPPER(property_address::text)'),
+    ('sherpa_prospect_property_zip_trgm', 'UPPER(property_zip::text)'),
+    ('sherpa_prospect_property_city_trgm', 'UPPER(property_city::text)'),
+    ('sherpa_prospect_property_state_trgm', 'UPPER(property_state::text)'),
+    (
+        'sherpa_prospect_fullname_trgm',
+        "UPPER((COALESCE(first_name, '') || ' ' || COALESCE(last_name, ''))::text)",
+    ),
+]
+
+
+def create_index_sql(name, expression):
+    return (
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+        f'ON sherpa_prospect USING gin ({expression} gin_trgm_ops);'
+    )
+
+
+class Migration(migrations.Migration):
+    # Indexes are created concurrently to not lock the prospects table, which can't be done inside
+    # a transaction.
+    atomic = False
+
+    dependencies = [
+        ('sherpa', '0186_skiptraceproperty_match_keys'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+    ] + [
+        migrations.RunSQL(
+            create_index_sql(name, expression),
+            f'DROP INDEX CONCURRENTLY IF EXISTS {name};',
+        )
+        for name, expression in SEARCH_INDEXES
+    ]
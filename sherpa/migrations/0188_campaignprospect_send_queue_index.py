@@ -0,0 +1,36 @@
+from django.db import migrations, models
+from django.db.models import Q
+
+CREATE_INDEX_SQL = (
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS sherpa_cp_send_queue_idx '
+    'ON sherpa_campaignprospect '
+    '(campaign_id, has_unread_sms DESC, sort_order, last_updated DESC, id) '
+    'WHERE (scheduled = false AND skipped = false AND sent = false);'
+)
+
+
+class Migration(migrations.Migration):
+    # The index is created concurrently to not lock the campaign prospects table, which can't be
+    # done inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('sherpa', '0187_prospect_search_trgm_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            CREATE_INDEX_SQL,
+            'DROP INDEX CONCURRENTLY IF EXISTS sherpa_cp_send_queue_idx;',
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='campaignprospect',
+                    index=models.Index(
+                        condition=Q(scheduled=False, sent=False, skipped=False),
+                        fields=['campaign', '-has_unread_sms', 'sort_order', '-last_updated', 'id'],
+                        name='sherpa_cp_send_queue_idx',
+                    ),
+                ),
+            ],
+        ),
+    ]
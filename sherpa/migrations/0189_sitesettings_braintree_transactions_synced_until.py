@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sherpa', '0188_campaignprospect_send_queue_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitesettings',
+            name='braintree_transactions_synced_until',
+            field=models.DateTimeField(
+                blank=True,
+                help_text='Latest settlement of the braintree transactions that were synced.',
+                null=True,
+            ),
+        ),
+    ]
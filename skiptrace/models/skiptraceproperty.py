@@ -1,3 +1,5 @@
+import hashlib
+
 from django.utils.functional import cached_property
 
 from core import models
@@ -184,6 +186,12 @@ class SkipTraceProperty(models.Model):
 
     upload_error = models.TextField(null=True, blank=True)
 
+    # Hash of the normalized validated address, used to look up existing skip trace matches.
+    mailing_match_key = models.CharField(null=True, blank=True, max_length=32, db_index=True)
+    property_match_key = models.CharField(null=True, blank=True, max_length=32, db_index=True)
+
+    MATCH_KEY_ADDRESS_FIELDS = ['status', 'delivery_line_1', 'delivery_line_2', 'zipcode']
+
     @property
     def is_entity(self):
         """
@@ -528,6 +536,61 @@ class SkipTraceProperty(models.Model):
             self.submitted_owner_last_name or '')
         return full_name.strip()
 
+    @classmethod
+    def get_match_keys(cls, values):
+        """
+        Return the address match keys for the validated addresses in `values`.
+
+        Only the address types with their validated status in `values` are returned. The key is
+        the md5 of the normalized delivery lines and zipcode, and is blank when the address isn't
+        validated.
+
+        :param values: dict of validated address field names to values.
+        """
+        match_keys = dict()
+        for address_type in ['mailing', 'property']:
+            prefix = f'validated_{address_type}_'
+            if f'{prefix}status' not in values:
+                continue
+
+            match_key = None
+            if values[f'{prefix}status'] == 'validated':
+                normalized = '|'.join(
+                    ' '.join(str(values.get(f'{prefix}{field}') or '').split()).lower()
+                    for field in cls.MATCH_KEY_ADDRESS_FIELDS[1:]
+                )
+                match_key = hashlib.md5(normalized.encode()).hexdigest()
+            match_keys[f'{address_type}_match_key'] = match_key
+
+        return match_keys
+
+    def set_match_keys(self, update_fields=None):
+        """
+        Update the address match keys and return the fields that were set.
+
+        :param update_fields: Fields being saved, only keys for address types with updated fields
+                              are set. All keys are set if not provided.
+        """
+        values = dict()
+        for address_type in ['mailing', 'property']:
+            fields = [
+                f'validated_{address_type}_{field}' for field in self.MATCH_KEY_ADDRESS_FIELDS
+            ]
+            if update_fields is None or set(fields) & set(update_fields):
+                values.update({field: getattr(self, field) for field in fields})
+
+        match_keys = self.get_match_keys(values)
+        for field, match_key in match_keys.items():
+            setattr(self, field, match_key)
+        return list(match_keys)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        match_key_fields = self.set_match_keys(update_fields)
+        if update_fields is not None and match_key_fields:
+            kwargs['update_fields'] = set(update_fields) | set(match_key_fields)
+        super().save(*args, **kwargs)
+
     def __proper_field(self, field):
         value = getattr(self, field)
         return value.title() if value else ''
@@ -767,9 +830,13 @@ class SkipTraceProperty(models.Model):
             setattr(self, update_field, value)
         self.save(update_fields=update_fields)
 
-    def copy_name_from_prospect(self, prospect, is_skip_trace=False):
+    def copy_name_from_prospect(self, prospect, is_skip_trace=False, save=True):
         """
-        Copy name from `Prospect`, or `SkipTraceProperty` if indicated.
+        Copy name from `Prospect`, or `SkipTraceProperty` if indicated, and return the fields that
+        were updated.
+
+        :param save: Whether to save the updated fields, pass False when the record is going to be
+                     saved in bulk.
         """
         name_fields = ['fullname', 'first_name', 'last_name']
         update_fields = []
@@ -787,11 +854,17 @@ class SkipTraceProperty(models.Model):
             else:
                 value = getattr(prospect, from_field)
             setattr(self, update_field, value)
-        self.save(update_fields=update_fields)
+        if save:
+            self.save(update_fields=update_fields)
+        return update_fields
 
-    def copy_relative_data(self, match):
+    def copy_relative_data(self, match, save=True):
         """
-        Copy relative data from another 'SkipTraceProperty'.
+        Copy relative data from another 'SkipTraceProperty' and return the fields that were
+        updated.
+
+        :param save: Whether to save the updated fields, pass False when the record is going to be
+                     saved in bulk.
         """
         fields = ['first_name', 'last_name', 'phone1', 'phone2', 'phone3']
         update_fields = []
@@ -802,7 +875,9 @@ class SkipTraceProperty(models.Model):
                 update_fields.append(update_field)
                 setattr(self, update_field, getattr(match, update_field))
 
-        self.save(update_fields=update_fields)
+        if save:
+            self.save(update_fields=update_fields)
+        return update_fields
 
     class Meta:
         app_label = 'sherpa'
@@ -1,23 +1,23 @@
-import base64
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta
-import json
 
 import pytz
-import requests
 
 from django.conf import settings
-from django.db.models import F
+from django.db.models import F, Q
 from django.db.utils import DataError
 from django.utils import timezone as django_tz
 
 from core.utils import clean_phone
 from prospects.utils import update_stacker_for_upload
+from services.http import run_concurrently
+from services.idi import idi_client
 from services.smarty import SmartyValidateAddresses
 from sherpa.csv_uploader import ProcessUpload
 from sherpa.models import Prospect
 from sherpa.utils import get_data_from_column_mapping
 from skiptrace.tasks import start_skip_trace_task
-from .models import SkipTraceProperty
+from .models import SkipTraceProperty, UploadSkipTrace
 from .renderers import SkipTracePropertyRenderer
 from .tasks import (
     send_skip_trace_confirmation_task,
@@ -203,6 +203,71 @@ class ProcessSkipTraceRecord:
     """
     Validate addresses and get info from IDI (or copy from existing) for a `SkipTraceProperty`.
     """
+    # Fields copied from a matching `SkipTraceProperty`.
+    match_copy_fields = [
+        'has_hit',
+        'returned_fullname',
+        'returned_first_name',
+        'returned_last_name',
+        'returned_phone_1',
+        'returned_phone_2',
+        'returned_phone_3',
+        'returned_phone_4',
+        'returned_phone_5',
+        'returned_phone_type_1',
+        'returned_phone_type_2',
+        'returned_phone_type_3',
+        'returned_phone_type_4',
+        'returned_phone_type_5',
+        'returned_phone_is_disconnected_1',
+        'returned_phone_is_disconnected_2',
+        'returned_phone_is_disconnected_3',
+        'returned_phone_is_disconnected_4',
+        'returned_phone_is_disconnected_5',
+        'returned_phone_carrier_1',
+        'returned_phone_carrier_2',
+        'returned_phone_carrier_3',
+        'returned_phone_carrier_4',
+        'returned_phone_carrier_5',
+        'returned_phone_last_seen_1',
+        'returned_phone_last_seen_2',
+        'returned_phone_last_seen_3',
+        'returned_phone_last_seen_4',
+        'returned_phone_last_seen_5',
+        'returned_email_1',
+        'returned_email_2',
+        'returned_email_3',
+        'returned_email_last_seen_1',
+        'returned_email_last_seen_2',
+        'returned_email_last_seen_3',
+        'returned_address_1',
+        'returned_city_1',
+        'returned_state_1',
+        'returned_zip_1',
+        'returned_address_last_seen_1',
+        'returned_address_2',
+        'returned_city_2',
+        'returned_state_2',
+        'returned_zip_2',
+        'returned_address_last_seen_2',
+        'returned_ip_address',
+        'returned_ip_last_seen',
+        'age',
+        'deceased',
+        'bankruptcy',
+        'returned_foreclosure_date',
+        'returned_lien_date',
+        'returned_judgment_date',
+        'validated_returned_address_1',
+        'validated_returned_address_2',
+        'validated_returned_city_1',
+        'validated_returned_state_1',
+        'validated_returned_zip_1',
+        'validated_returned_property_status',
+        'is_existing_match',
+        'existing_match_prospect_id',
+    ]
+
     def __init__(self, skip_trace_property, upload_skip_trace, is_duplicate=False):
         self.skip_trace_property = skip_trace_property
         self.upload_skip_trace = upload_skip_trace
@@ -276,27 +341,96 @@ class ProcessSkipTraceRecord:
         if address_validator.error:
             self.set_error(address_validator.error, skip_trace_property_obj)
 
-        for pk in address_validator.results:
-            SkipTraceProperty.objects.filter(pk=pk).update(**address_validator.results[pk])
+        for pk, results in address_validator.results.items():
+            results.update(SkipTraceProperty.get_match_keys(results))
+            SkipTraceProperty.objects.filter(pk=pk).update(**results)
 
     def __update_skip_trace_rec_from_idi_data(self, skip_trace_property_obj):
         """
         Invock or save `SkipTraceProperty` record based on IDI data.
+
+        Records without a match are searched in IDI concurrently since most of the time spent on a
+        skip trace is waiting for IDI to respond.
         """
+        # Reload the batch with the validated addresses in a single query.
+        refreshed = SkipTraceProperty.objects.select_related('upload_skip_trace').in_bulk(
+            [an_rec['skip_trace_id'].pk for an_rec in skip_trace_property_obj],
+        )
         for an_rec in skip_trace_property_obj:
-            self.duplicate = False
-            self.skip_trace_property = an_rec['skip_trace_id']
-            self.skip_trace_property.refresh_from_db()
-            self.internal_hit = False
+            an_rec['skip_trace_id'] = refreshed[an_rec['skip_trace_id'].pk]
 
-            # Get data from IDI if no match found or 'Suppress Against Database' turned off.
-            if not self.upload_skip_trace.suppress_against_database or not self.copy_from_match():
-                self.update_from_idi()
+        self.duplicate = False
+        idi_records = [an_rec['skip_trace_id'] for an_rec in skip_trace_property_obj]
 
+        # Get data from IDI if no match found or 'Suppress Against Database' turned off.
+        if self.upload_skip_trace.suppress_against_database:
+            idi_records = self.copy_from_match_in_batch(idi_records)
+
+        self.update_from_idi_in_batch(idi_records)
+
+        for an_rec in skip_trace_property_obj:
             # Skip Trace Property is created. Now, create `Prospects`.
-            Prospect.objects.create_from_skip_trace_property(self.skip_trace_property)
+            Prospect.objects.create_from_skip_trace_property(an_rec['skip_trace_id'])
             self.increment_last_row_processed()
 
+    def update_from_idi_in_batch(self, skip_trace_properties):
+        """
+        Get data from IDI for a batch of `SkipTraceProperty` with a single search per address.
+
+        Records that share their validated addresses with another record of the batch copy the
+        data of that record once it was searched, as each search is billed by IDI.
+        """
+        searches, batch_duplicates = self.group_batch_duplicates(skip_trace_properties)
+        run_concurrently(self.__update_record_from_idi, searches, settings.IDI_MAX_WORKERS)
+
+        # Records of addresses without a hit are not searched again, as IDI has no data for them.
+        batch_matches = {
+            skip_trace_property.id: ([searched], True)
+            for searched, duplicates in batch_duplicates.items() if searched.has_hit
+            for skip_trace_property in duplicates
+        }
+        if not batch_matches:
+            return
+
+        duplicates = [
+            skip_trace_property for skip_trace_property in skip_trace_properties
+            if skip_trace_property.id in batch_matches
+        ]
+        misses = self.copy_from_match_in_batch(duplicates, batch_matches=batch_matches)
+        run_concurrently(self.__update_record_from_idi, misses, settings.IDI_MAX_WORKERS)
+
+        for skip_trace_property in duplicates:
+            if skip_trace_property not in misses and skip_trace_property.returned_address_1:
+                validate_skip_trace_returned_address_task.delay(skip_trace_property.id)
+
+    def group_batch_duplicates(self, skip_trace_properties):
+        """
+        Return the records of the batch that need to be searched in IDI, and a dict of the searched
+        records to the other records of the batch with the same validated addresses.
+
+        :param skip_trace_properties: list of `SkipTraceProperty` with validated addresses.
+        """
+        searches = []
+        searched_by_keys = dict()
+        batch_duplicates = defaultdict(list)
+        for skip_trace_property in skip_trace_properties:
+            match_keys = tuple(sorted(self.__get_match_keys(skip_trace_property).items()))
+            if match_keys in searched_by_keys:
+                batch_duplicates[searched_by_keys[match_keys]].append(skip_trace_property)
+                continue
+
+            searches.append(skip_trace_property)
+            if match_keys:
+                searched_by_keys[match_keys] = skip_trace_property
+        return searches, batch_duplicates
+
+    def __update_record_from_idi(self, skip_trace_property):
+        """
+        Get data from IDI for a single record of the batch, meant to be run in a worker thread.
+        """
+        process_record = ProcessSkipTraceRecord(skip_trace_property, self.upload_skip_trace)
+        process_record.update_from_idi()
+
     def start_batch(self):
         """
         Replication of self.start method based on batch processing.
@@ -335,6 +469,57 @@ class ProcessSkipTraceRecord:
 
         return copied_from_match
 
+    def copy_from_match_in_batch(self, skip_trace_properties, batch_matches=None):
+        """
+        Copy data into a batch of `SkipTraceProperty` from their matches and return the records
+        that still need to be searched in IDI.
+
+        Matching skip trace properties for the whole batch are fetched in one query and the copied
+        records are saved with one bulk update. Records without a matching skip trace property fall
+        back to matching prospects one at a time.
+
+        :param skip_trace_properties: list of `SkipTraceProperty` with validated addresses.
+        :param batch_matches: Matches to copy from, in the format returned by
+                              `get_batch_matching_skip_trace_properties`, which is used when not
+                              given.
+        """
+        if batch_matches is None:
+            batch_matches = self.get_batch_matching_skip_trace_properties(skip_trace_properties)
+        copied = []
+        update_fields = set(self.match_copy_fields + [
+            'submitted_owner_fullname',
+            'submitted_owner_first_name',
+            'submitted_owner_last_name',
+        ])
+        increments = Counter()
+        misses = []
+
+        for skip_trace_property in skip_trace_properties:
+            self.skip_trace_property = skip_trace_property
+            matches, self.internal_hit = batch_matches.get(skip_trace_property.id, ([], False))
+
+            if matches and not skip_trace_property.submitted_mailing_address:
+                # Copying the mailing address requires validating it again, so this record can't
+                # be saved in bulk.
+                if not self.copy_from_match():
+                    misses.append(skip_trace_property)
+                continue
+
+            # Copy name, if it's still blank then check prospects or get it from IDI.
+            if matches and self.copy_missing_name(matches, match_is_skip_trace=True, save=False):
+                update_fields.update(self.copy_relative_data(matches, save=False))
+                self.copy_match_fields(matches[0])
+                increments.update(self.get_hit_stats(copy_from_existing=True))
+                copied.append(skip_trace_property)
+            elif self.copy_from_matching_prospects():
+                self.update_hit_stats(copy_from_existing=True)
+            else:
+                misses.append(skip_trace_property)
+
+        SkipTraceProperty.objects.bulk_update(copied, update_fields)
+        self.__increment_upload_stats(increments)
+        return misses
+
     def update_from_idi(self, force_property_search=False, force_mailing_search=False):
         """
         Update data from IDI. If full search returns no hits, try again with property search.
@@ -376,79 +561,18 @@ class ProcessSkipTraceRecord:
         self.copy_missing_mailing_address(matching_skip_trace_properties, match_is_skip_trace=True)
         self.copy_relative_data(matching_skip_trace_properties)
 
-        update_fields = [
-            'has_hit',
-            'returned_fullname',
-            'returned_first_name',
-            'returned_last_name',
-            'returned_phone_1',
-            'returned_phone_2',
-            'returned_phone_3',
-            'returned_phone_4',
-            'returned_phone_5',
-            'returned_phone_type_1',
-            'returned_phone_type_2',
-            'returned_phone_type_3',
-            'returned_phone_type_4',
-            'returned_phone_type_5',
-            'returned_phone_is_disconnected_1',
-            'returned_phone_is_disconnected_2',
-            'returned_phone_is_disconnected_3',
-            'returned_phone_is_disconnected_4',
-            'returned_phone_is_disconnected_5',
-            'returned_phone_carrier_1',
-            'returned_phone_carrier_2',
-            'returned_phone_carrier_3',
-            'returned_phone_carrier_4',
-            'returned_phone_carrier_5',
-            'returned_phone_last_seen_1',
-            'returned_phone_last_seen_2',
-            'returned_phone_last_seen_3',
-            'returned_phone_last_seen_4',
-            'returned_phone_last_seen_5',
-            'returned_email_1',
-            'returned_email_2',
-            'returned_email_3',
-            'returned_email_last_seen_1',
-            'returned_email_last_seen_2',
-            'returned_email_last_seen_3',
-            'returned_address_1',
-            'returned_city_1',
-            'returned_state_1',
-            'returned_zip_1',
-            'returned_address_last_seen_1',
-            'returned_address_2',
-            'returned_city_2',
-            'returned_state_2',
-            'returned_zip_2',
-            'returned_address_last_seen_2',
-            'returned_ip_address',
-            'returned_ip_last_seen',
-            'age',
-            'deceased',
-            'bankruptcy',
-            'returned_foreclosure_date',
-            'returned_lien_date',
-            'returned_judgment_date',
-            'validated_returned_address_1',
-            'validated_returned_address_2',
-            'validated_returned_city_1',
-            'validated_returned_state_1',
-            'validated_returned_zip_1',
-            'validated_returned_property_status',
-            'is_existing_match',
-            'existing_match_prospect_id',
-        ]
-        for field in update_fields:
-            setattr(
-                self.skip_trace_property,
-                field,
-                getattr(matching_skip_trace_properties[0], field),
-            )
-        self.skip_trace_property.is_existing_match = not self.internal_hit
-        self.skip_trace_property.save(update_fields=update_fields)
+        self.copy_match_fields(matching_skip_trace_properties[0])
+        self.skip_trace_property.save(update_fields=self.match_copy_fields)
         return True
 
+    def copy_match_fields(self, match):
+        """
+        Copy the returned data from a matching `SkipTraceProperty` without saving.
+        """
+        for field in self.match_copy_fields:
+            setattr(self.skip_trace_property, field, getattr(match, field))
+        self.skip_trace_property.is_existing_match = not self.internal_hit
+
     def copy_from_matching_prospects(self):
         """
         Copy data to `SkipTraceProperty` from matching `Prospect` objects.
@@ -515,32 +639,36 @@ class ProcessSkipTraceRecord:
         """
         Update hit stats when getting data
         """
-        update_fields = []
+        increments = self.get_hit_stats(copy_from_existing)
+        if increments['total_hits']:
+            self.skip_trace_property.save(update_fields=['has_hit'])
+        self.__increment_upload_stats(increments)
+
+    def get_hit_stats(self, copy_from_existing=False):
+        """
+        Return the upload stats increments for the current `SkipTraceProperty` and flag it as a hit
+        without saving.
+        """
+        increments = Counter()
         if copy_from_existing and not self.internal_hit:
-            self.upload_skip_trace.total_existing_matches = F('total_existing_matches') + 1
-            update_fields.append('total_existing_matches')
+            increments['total_existing_matches'] += 1
 
         # If there was a phone, email or address returned, this was a hit.
         if self.skip_trace_property.returned_phone_1 or \
                 self.skip_trace_property.returned_email_1 or \
                 self.skip_trace_property.returned_address_1:
             self.skip_trace_property.has_hit = True
-            self.skip_trace_property.save(update_fields=['has_hit'])
-            self.upload_skip_trace.total_hits = F('total_hits') + 1
-            update_fields.append('total_hits')
+            increments['total_hits'] += 1
 
             # If this is a duplicate within the file, update stats and stop here.
             if self.is_duplicate:
-                self.upload_skip_trace.save(update_fields=update_fields)
-                return
+                return increments
 
             # Only bill new hits.
             if not copy_from_existing or self.internal_hit:
-                self.upload_skip_trace.total_billable_hits = F('total_billable_hits') + 1
-                update_fields.append('total_billable_hits')
+                increments['total_billable_hits'] += 1
             if self.internal_hit:
-                self.upload_skip_trace.total_internal_hits = F('total_internal_hits') + 1
-                update_fields.append('total_internal_hits')
+                increments['total_internal_hits'] += 1
 
         # Count up to 3 phone numbers, 2 emails and 2 addresses
         fields = ['phone', 'email', 'address']
@@ -550,58 +678,134 @@ class ProcessSkipTraceRecord:
                     val = getattr(self.skip_trace_property, f'returned_{field}_{i + 1}')
                     if val:
                         total_field = f'total_{field}' if field != 'address' else f'total_{field}es'
-                        setattr(
-                            self.upload_skip_trace,
-                            total_field,
-                            getattr(self.upload_skip_trace, total_field, 0) + 1,
-                        )
-                        update_fields.append(total_field)
-        self.upload_skip_trace.save(update_fields=update_fields)
+                        increments[total_field] += 1
+        return increments
+
+    def __increment_upload_stats(self, increments):
+        """
+        Increment upload stats in a single update so records can be processed concurrently.
+        """
+        if not increments:
+            return
+        UploadSkipTrace.objects.filter(pk=self.upload_skip_trace.pk).update(
+            **{field: F(field) + count for field, count in increments.items()},
+        )
 
-    def get_matching_skip_trace_properties(self, property_only=False, all_companies=False):
+    def get_matching_skip_trace_properties(self):
         """
         Get `SkipTraceProperty` objects that match on validated mailing address or property address.
 
-        By default this searches the `Company` tied to the `SkipTraceProperty` and checks for
-        matching mailing address, then for matching property address.
-        'property_only' set to True will search property address only. 'all_companies' set to True
-        will search for matches in any `Company`.
-        """
-        field_prefix = None
-        if self.skip_trace_property.validated_mailing_status == 'validated' and not property_only:
-            field_prefix = 'validated_mailing_'
-        elif self.skip_trace_property.validated_property_status == 'validated':
-            field_prefix = 'validated_property_'
-        if field_prefix:
-            delivery_line_1 = getattr(self.skip_trace_property, f'{field_prefix}delivery_line_1')
-            delivery_line_2 = getattr(self.skip_trace_property, f'{field_prefix}delivery_line_2')
-            zip_code = getattr(self.skip_trace_property, f'{field_prefix}zipcode')
-            filters = {
-                'has_hit': True,
-                f'{field_prefix}status': 'validated',
-                f'{field_prefix}delivery_line_1': delivery_line_1,
-                f'{field_prefix}delivery_line_2': delivery_line_2,
-                f'{field_prefix}zipcode': zip_code,
-            }
-            if not all_companies:
-                filters['upload_skip_trace__company'] = \
-                    self.skip_trace_property.upload_skip_trace.company
-            else:
-                filters['created__gt'] = django_tz.now() - timedelta(
-                    days=self.match_expiration_days)
-
-            matches = SkipTraceProperty.objects.filter(**filters).exclude(
-                id=self.skip_trace_property.id)
-            if not matches and field_prefix == 'validated_mailing_':
-                return self.get_matching_skip_trace_properties(
-                    property_only=True,
-                    all_companies=all_companies,
+        This searches the `Company` tied to the `SkipTraceProperty` and checks for matching mailing
+        address, then for matching property address. If there's no match, it searches any `Company`
+        for matches created within `match_expiration_days`. All the candidates are fetched with a
+        single lookup on the address match keys.
+        """
+        match_keys = self.__get_match_keys(self.skip_trace_property)
+        candidates = self.__get_match_candidates(
+            [match_keys['mailing']] if 'mailing' in match_keys else [],
+            [match_keys['property']] if 'property' in match_keys else [],
+            self.skip_trace_property.upload_skip_trace.company_id,
+            [self.skip_trace_property.id],
+        )
+        matches, self.internal_hit = self.__resolve_matches(
+            match_keys,
+            candidates,
+            self.skip_trace_property.upload_skip_trace.company_id,
+        )
+        return matches
+
+    def get_batch_matching_skip_trace_properties(self, skip_trace_properties):
+        """
+        Return a dict of `SkipTraceProperty` id to a tuple of its matches and whether they are
+        internal hits, for each record of the batch that has matches.
+
+        Same rules as `get_matching_skip_trace_properties`, but the candidates for the whole batch
+        are fetched in one query.
+
+        :param skip_trace_properties: list of `SkipTraceProperty` from the upload being processed.
+        """
+        batch_keys = {
+            skip_trace_property.id: self.__get_match_keys(skip_trace_property)
+            for skip_trace_property in skip_trace_properties
+        }
+        keys_by_type = defaultdict(list)
+        for match_keys in batch_keys.values():
+            for address_type, match_key in match_keys.items():
+                keys_by_type[address_type].append(match_key)
+
+        company_id = self.upload_skip_trace.company_id
+        candidates = self.__get_match_candidates(
+            keys_by_type['mailing'],
+            keys_by_type['property'],
+            company_id,
+            list(batch_keys),
+        )
+
+        batch_matches = dict()
+        for skip_trace_property_id, match_keys in batch_keys.items():
+            matches, internal_hit = self.__resolve_matches(match_keys, candidates, company_id)
+            if matches:
+                batch_matches[skip_trace_property_id] = (matches, internal_hit)
+        return batch_matches
+
+    @staticmethod
+    def __get_match_keys(skip_trace_property):
+        """
+        Return the match key of each validated address type of a `SkipTraceProperty`.
+        """
+        return {
+            address_type: getattr(skip_trace_property, f'{address_type}_match_key')
+            for address_type in ['mailing', 'property']
+            if getattr(skip_trace_property, f'validated_{address_type}_status') == 'validated'
+        }
+
+    def __get_match_candidates(self, mailing_keys, property_keys, company_id, exclude_ids):
+        """
+        Return the `SkipTraceProperty` hits that can be a match for any of the given keys.
+        """
+        if not mailing_keys and not property_keys:
+            return []
+
+        expiration = django_tz.now() - timedelta(days=self.match_expiration_days)
+        return list(SkipTraceProperty.objects.filter(
+            Q(mailing_match_key__in=mailing_keys) | Q(property_match_key__in=property_keys),
+            Q(upload_skip_trace__company_id=company_id) | Q(created__gt=expiration),
+            has_hit=True,
+        ).exclude(
+            id__in=exclude_ids,
+        ).annotate(match_company_id=F('upload_skip_trace__company_id')))
+
+    def __resolve_matches(self, match_keys, candidates, company_id):
+        """
+        Return the matches for the given match keys and whether they are internal hits, following
+        the company first, then any company search order.
+        """
+        if 'property' in match_keys:
+            search_order = [
+                ('mailing', False),
+                ('property', False),
+                ('mailing', True),
+                ('property', True),
+            ]
+        else:
+            # Without a validated property address, only the company's mailing address is checked.
+            search_order = [('mailing', False)]
+
+        expiration = django_tz.now() - timedelta(days=self.match_expiration_days)
+        for address_type, all_companies in search_order:
+            if address_type not in match_keys:
+                continue
+            matches = [
+                candidate for candidate in candidates
+                if getattr(candidate, f'{address_type}_match_key') == match_keys[address_type] and (
+                    candidate.created > expiration if all_companies
+                    else candidate.match_company_id == company_id
                 )
-            if not matches and not all_companies:
-                return self.get_matching_skip_trace_properties(all_companies=True)
-            self.internal_hit = matches and all_companies
-            return matches
-        return []
+            ]
+            if matches:
+                return matches, all_companies
+
+        return [], False
 
     def get_matching_prospects(self):
         """
@@ -623,7 +827,7 @@ class ProcessSkipTraceRecord:
 
         return matches
 
-    def copy_missing_name(self, prospects, match_is_skip_trace=False):
+    def copy_missing_name(self, prospects, match_is_skip_trace=False, save=True):
         """
         If there's no name, copy name and return whether or not copy was successful.
         """
@@ -638,7 +842,7 @@ class ProcessSkipTraceRecord:
                     break
 
         self.skip_trace_property.copy_name_from_prospect(
-            get_name_from, is_skip_trace=match_is_skip_trace)
+            get_name_from, is_skip_trace=match_is_skip_trace, save=save)
 
         return not self.skip_trace_property.blank_name
 
@@ -667,9 +871,10 @@ class ProcessSkipTraceRecord:
         else:
             self.skip_trace_property.copy_mailing_address()
 
-    def copy_relative_data(self, matches):
+    def copy_relative_data(self, matches, save=True):
         """
-        Copy relative's information from matching `SkipTraceProperty` objects.
+        Copy relative's information from matching `SkipTraceProperty` objects and return the fields
+        that were updated.
         """
         # Get a match that has a relative phone if one exists.
         match = matches[0]
@@ -680,7 +885,7 @@ class ProcessSkipTraceRecord:
                 if getattr(current_match, relative_phone_field):
                     match = current_match
                     break
-        self.skip_trace_property.copy_relative_data(match)
+        return self.skip_trace_property.copy_relative_data(match, save=save)
 
 
 class UpdateFromIDI:
@@ -693,11 +898,13 @@ class UpdateFromIDI:
             skip_trace_property,
             force_property_only_search=False,
             force_mailing_search=False,
+            client=None,
     ):
         self.upload_skip_trace = upload_skip_trace
         self.skip_trace_property = skip_trace_property
         self.property_only_search = force_property_only_search
         self.mailing_only_search = force_mailing_search
+        self.client = client or idi_client
 
     def get(self):
         """
@@ -756,19 +963,7 @@ class UpdateFromIDI:
         """
         Run IDI search and return results for given data.
         """
-        if not self.upload_skip_trace.has_valid_idi_token:
-            self.set_idi_token()
-
-        url = settings.IDI_API_BASE_URL + 'search/'
-
-        headers = {
-            'authorization': self.upload_skip_trace.idi_token,
-            'content-type': "application/json",
-            'accept': "application/json",
-        }
-
-        json_body = json.dumps(search_criteria)
-        return requests.request("POST", url, data=json_body, headers=headers)
+        return self.client.search(search_criteria)
 
     def save_data_from_idi_response(self, response):
         """
@@ -849,30 +1044,6 @@ class UpdateFromIDI:
         })
         return data
 
-    def set_idi_token(self):
-        """
-        Authenticate with IDI and set token.
-        """
-        url = settings.IDI_LOGIN_BASE_URL + "apiclient"
-        client_id = settings.IDI_CLIENT_ID
-        client_secret = settings.IDI_CLIENT_SECRET
-
-        payload = "{\"glba\":\"liability\",\"dppa\":\"verification\"}"
-        headers = {
-            'authorization': "Basic " + base64.encodebytes(
-                (client_id + ":" + client_secret).encode()).decode().replace("\n", ""),
-            'content-type': "application/json",
-        }
-
-        response = requests.request("POST", url, data=payload, headers=headers)
-
-        if response.status_code != 200:
-            raise ConnectionRefusedError("Could not authenticate with IDI.")
-
-        self.upload_skip_trace.last_idi_token_reset = django_tz.now()
-        self.upload_skip_trace.idi_token = response.text
-        self.upload_skip_trace.save(update_fields=['last_idi_token_reset', 'idi_token'])
-
     def decode_idi_result(self, response):
         """
         Decode IDI result into JSON. If there's no result, re-run with property only search.
@@ -1057,10 +1228,8 @@ class UpdateFromIDI:
         """
         self.skip_trace_property.skip_trace_status = status
         self.skip_trace_property.save(update_fields=['skip_trace_status'])
-        if reset_token and not self.upload_skip_trace.has_valid_idi_token:
-            self.upload_skip_trace.last_idi_token_reset = None
-            self.upload_skip_trace.idi_token = ''
-            self.upload_skip_trace.save(update_fields=['last_idi_token_reset', 'idi_token'])
+        if reset_token:
+            self.client.invalidate_token()
 
     def get_data_from_idi_list(self, data_list, schema, cap, count_suffix=True):
         """
@@ -8,12 +8,13 @@ from smartystreets_python_sdk.us_street import Lookup
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
 from django.db.models import Sum
 from django.template.loader import render_to_string
 from django.utils import timezone as django_tz
 from django.utils.dateparse import parse_date
 
-from campaigns.utils import push_to_campaign
+from campaigns.push import BulkCampaignPush
 from services.smarty import smarty_client
 from sherpa.models import (
     Campaign,
@@ -249,15 +250,18 @@ def skip_trace_push_to_campaign_task_push_to_campaign_stage(
 
     # We skip any prospect already pushed to this campaign
     already_pushed_prospects = prospects.filter(campaignprospect__campaign=campaign)
-    prospects = prospects.difference(already_pushed_prospects)
+    prospect_ids = list(prospects.exclude(
+        campaignprospect__campaign=campaign,
+    ).order_by('id').values_list('id', flat=True))
     # Set processed rows and total to charge according to the skipped prospects
     row_count = already_pushed_prospects.count()
     total_to_charge = already_pushed_prospects.exclude(
         upload_duplicate=True,
     ).filter(campaignprospect__include_in_upload_count=True).count()
 
-    # Loop through each skip trace property and create the prospects for the campaign.
-    for prospect in prospects:
+    # Push the prospects in chunks, saving the processed rows with each chunk.
+    campaign_push = BulkCampaignPush(campaign, tags=tags, upload_skip_trace=upload_skip_trace)
+    for start in range(0, len(prospect_ids), campaign_push.chunk_size):
         # We check from the DB if we need to stop the task
         stop_check = UploadSkipTrace.objects.filter(
             id=upload_skip_trace.pk,
@@ -271,19 +275,17 @@ def skip_trace_push_to_campaign_task_push_to_campaign_stage(
                 )
             break
 
-        row_count += 1
-        upload_skip_trace.last_row_push_to_campaign = row_count
-        upload_skip_trace.save(
-            update_fields=[
-                'last_row_push_to_campaign',
-            ],
-        )
-        total_to_charge += push_to_campaign(
-            campaign,
-            prospect,
-            tags=tags,
-            upload_skip_trace=upload_skip_trace,
-        )
+        chunk = prospect_ids[start:start + campaign_push.chunk_size]
+        with transaction.atomic():
+            total_to_charge += campaign_push.push(chunk)
+            row_count += len(chunk)
+            upload_skip_trace.last_row_push_to_campaign = row_count
+            upload_skip_trace.save(
+                update_fields=[
+                    'last_row_push_to_campaign',
+                ],
+            )
+    campaign_push.finish()
 
     if total_rows_push_to_campaign != row_count:
         # If this happens, we broke off the loop because we were manually stopped/paused
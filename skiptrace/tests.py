@@ -1,18 +1,24 @@
 import csv
 from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
 import io
 import json
+from socketserver import ThreadingMixIn
+import threading
+import time
 
 from model_mommy import mommy
 
 from django.core import mail
-from django.test import Client, override_settings
+from django.test import Client, override_settings, SimpleTestCase
 from django.urls import reverse
 from django.utils import timezone as django_tz
 
 from billing.models import Transaction
 from campaigns.tests import CampaignDataMixin
 from companies.models import DownloadHistory
+from services.http import run_concurrently
+from services.idi import IDIClient
 from sherpa.tests import BaseAPITestCase, BaseTestCase
 from sherpa.utils import (
     get_data_from_column_mapping,
@@ -799,6 +805,81 @@ class SkipTraceUploadTestCase(SkipTraceDataMixin, CampaignDataMixin, BaseTestCas
         self.assertEqual(self.skip_trace.total_existing_matches, 1)
         self.assertEqual(self.skip_trace_property1.validated_property_delivery_line_1, 'hijklmno')
 
+    def test_copy_from_match_in_batch(self):
+        address = {
+            'validated_property_status': 'validated',
+            'validated_property_delivery_line_1': '123 Batch St',
+            'validated_property_zipcode': '12345',
+        }
+        mommy.make(
+            'sherpa.SkipTraceProperty',
+            upload_skip_trace=mommy.make('sherpa.UploadSkipTrace', company=self.company1),
+            has_hit=True,
+            submitted_owner_first_name='first',
+            returned_phone_1=2222222222,
+            relative_1_first_name='relative',
+            **address,
+        )
+        hit = mommy.make(
+            'sherpa.SkipTraceProperty',
+            upload_skip_trace=self.skip_trace,
+            submitted_mailing_address='123 Mailing St',
+            **address,
+        )
+        miss = mommy.make(
+            'sherpa.SkipTraceProperty',
+            upload_skip_trace=self.skip_trace,
+            submitted_mailing_address='123 Mailing St',
+            validated_property_status='validated',
+            validated_property_delivery_line_1='125 Batch St',
+            validated_property_zipcode='12345',
+        )
+
+        misses = self.process_skip_trace_record.copy_from_match_in_batch([hit, miss])
+        self.assertEqual(misses, [miss])
+
+        hit.refresh_from_db()
+        self.skip_trace.refresh_from_db()
+        self.assertTrue(hit.has_hit)
+        self.assertTrue(hit.is_existing_match)
+        self.assertEqual(hit.returned_phone_1, '2222222222')
+        self.assertEqual(hit.submitted_owner_first_name, 'first')
+        self.assertEqual(hit.relative_1_first_name, 'relative')
+        self.assertEqual(self.skip_trace.total_existing_matches, 1)
+        self.assertEqual(self.skip_trace.total_hits, 1)
+        self.assertEqual(self.skip_trace.total_billable_hits, 0)
+
+    def test_update_from_idi_in_batch(self):
+        address = {
+            'upload_skip_trace': self.skip_trace,
+            'submitted_mailing_address': '123 Mailing St',
+            'validated_property_status': 'validated',
+            'validated_property_delivery_line_1': '123 Batch St',
+            'validated_property_zipcode': '12345',
+        }
+        searched = mommy.make('sherpa.SkipTraceProperty', **address)
+        duplicate = mommy.make('sherpa.SkipTraceProperty', **address)
+        other = mommy.make(
+            'sherpa.SkipTraceProperty',
+            upload_skip_trace=self.skip_trace,
+            submitted_mailing_address='123 Mailing St',
+        )
+
+        searches, batch_duplicates = self.process_skip_trace_record.group_batch_duplicates(
+            [searched, duplicate, other],
+        )
+        self.assertEqual(searches, [searched, other])
+        self.assertEqual(batch_duplicates, {searched: [duplicate]})
+
+        self.process_skip_trace_record.update_from_idi_in_batch([searched, duplicate, other])
+        duplicate.refresh_from_db()
+        self.skip_trace.refresh_from_db()
+        self.assertTrue(duplicate.has_hit)
+        self.assertFalse(duplicate.is_existing_match)
+        self.assertEqual(duplicate.returned_phone_1, '5555555555')
+        self.assertEqual(self.skip_trace.total_hits, 3)
+        self.assertEqual(self.skip_trace.total_existing_matches, 0)
+
     def test_upload_from_idi_format_search_criteria(self):
         self.skip_trace_property1.submitted_property_address = 'submitted property address'
         self.skip_trace_property1.submitted_property_city = 'city1'
@@ -966,6 +1047,14 @@ class SkipTraceUploadTestCase(SkipTraceDataMixin, CampaignDataMixin, BaseTestCas
         self.assertEqual(self.skip_trace_property1.skip_trace_status, 'test status')
         self.assertEqual(self.skip_trace.idi_token, 'test token')
 
+    def test_upload_from_idi_set_skip_trace_status_reset_token(self):
+        self.upload_from_idi.client = IDIClient()
+        self.upload_from_idi.client.token = 'test token'
+        self.upload_from_idi.client.token_expires = time.monotonic() + 60
+        self.upload_from_idi.set_skip_trace_status('test status', reset_token=True)
+
+        self.assertFalse(self.upload_from_idi.client.has_valid_token)
+
     def test_get_name_from_idi(self):
         result = {'name': [{'first': 'First', 'last': 'Last', 'data': 'First Last'}]}
         self.upload_from_idi.get_name_from_idi(result)
@@ -1701,3 +1790,115 @@ class SkipTraceUploadAPITestCase(SkipTraceDataMixin, BaseAPITestCase):
         self.assertEqual(self.skip_trace.push_to_campaign_import_type, "all")
         self.assertEqual(self.skip_trace.push_to_campaign_status,
                          UploadSkipTrace.PushToCampaignStatus.QUEUED)
+
+
+class FakeIDIServer(ThreadingMixIn, HTTPServer):
+    """
+    Local server that mimics the IDI login and search endpoints.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeIDIHandler)
+        self.lock = threading.Lock()
+        self.token_count = 0
+        self.search_count = 0
+        self.active_searches = 0
+        self.max_active_searches = 0
+        # Status codes returned by the next searches before a successful response.
+        self.search_failures = []
+        self.search_delay = 0
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}/'
+
+
+class FakeIDIHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        server = self.server
+        if self.path == '/apiclient':
+            with server.lock:
+                server.token_count += 1
+                token = f'token-{server.token_count}'
+            return self._respond(200, token.encode())
+
+        with server.lock:
+            server.search_count += 1
+            server.active_searches += 1
+            server.max_active_searches = max(server.max_active_searches, server.active_searches)
+            status = server.search_failures.pop(0) if server.search_failures else 200
+            if self.headers['authorization'] != f'token-{server.token_count}':
+                status = 401
+        time.sleep(server.search_delay)
+        with server.lock:
+            server.active_searches -= 1
+
+        body = json.dumps({'result': [{'name': [{'first': 'a', 'last': 'b', 'data': 'a b'}]}]})
+        self._respond(status, body.encode() if status == 200 else b'')
+
+
+class IDIClientTestCase(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeIDIServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = IDIClient(
+            login_url=self.server.url,
+            api_url=self.server.url,
+            rate_limit=0,
+            pool_size=8,
+            timeout=5,
+        )
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_token_is_shared_between_searches(self):
+        run_concurrently(self.client.search, [{}] * 16, 8)
+        self.assertEqual(self.server.token_count, 1)
+        self.assertEqual(self.server.search_count, 16)
+
+    def test_expired_token_is_refreshed_once(self):
+        self.client.search({})
+        self.server.token_count += 1
+
+        responses = run_concurrently(self.client.search, [{}] * 4, 4)
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        self.assertEqual(self.server.token_count, 3)
+
+    def test_throttled_search_is_retried(self):
+        self.server.search_failures = [429, 429]
+        response = self.client.search({})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['result'][0]['name'][0]['first'], 'a')
+        self.assertEqual(self.server.search_count, 3)
+
+    def test_failed_search_is_not_retried(self):
+        self.server.search_failures = [503]
+        response = self.client.search({})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.search_count, 1)
+
+    def test_searches_run_concurrently(self):
+        self.server.search_delay = 0.1
+        run_concurrently(self.client.search, [{}] * 8, 4)
+        self.assertGreater(self.server.max_active_searches, 1)
+        self.assertLessEqual(self.server.max_active_searches, 4)
+
+    def test_rate_limit(self):
+        self.client.rate_limiter.rate = self.client.rate_limiter.capacity = 10
+        self.client.rate_limiter.tokens = 1
+        start = time.monotonic()
+        run_concurrently(self.client.search, [{}] * 6, 3)
+        self.assertGreaterEqual(time.monotonic() - start, 0.5)
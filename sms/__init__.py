@@ -18,6 +18,7 @@ TAG_MAPPINGS = {
     'Custom1': 'custom1',
     'NAME': 'first_name',
     'ADDRESS': 'property_address',
+    'CUSTOM1': 'custom1',
     'CompanyName': None,
     'UserFirstName': None,
 }
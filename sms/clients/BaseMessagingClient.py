@@ -18,12 +18,15 @@ class BaseMessagingClient(ABC):
     """
     is_production = settings.USE_TEST_MESSAGING is False
 
-    def __init__(self, is_production=None):
+    def __init__(self, is_production=None, session=None):
         """
         :param is_production bool: Optionally override the is_production setting.
+        :param session: `requests.Session` used for the lookups, such as a pooled session shared
+                        by many threads.
         """
         if is_production is not None:
             self.is_production = is_production
+        self.session = session
 
     def fetch_number(self, phone_number_raw, raise_errors=False):
         """
@@ -47,7 +50,7 @@ class BaseMessagingClient(ABC):
             'Authorization': f'Bearer {settings.TELNYX_SECRET_KEY}',
         }
 
-        response = requests.get(url, headers=headers, timeout=10)
+        response = (self.session or requests).get(url, headers=headers, timeout=10)
         if response.status_code == 422 and raise_errors:
             raise ValidationError(response.json().get('details'))
 
@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sherpa.models import Prospect, SMSTemplate
+from sms.renderer import get_opt_out_language, get_renderer
+
+
+class Command(BaseCommand):
+    """
+    Reports how many messages per second a template renders for its company's prospects.
+    """
+    def add_arguments(self, parser):
+        parser.add_argument('--template', required=True, type=int)
+        parser.add_argument('--amount', nargs='?', type=int, default=1000)
+        parser.add_argument('--runs', nargs='?', type=int, default=10)
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG:
+            print('You cannot use this command while DEBUG mode is off.')
+            return
+
+        sms_template = SMSTemplate.objects.select_related('company').get(id=options['template'])
+        company = sms_template.company
+        prospects = list(Prospect.objects.filter(company=company)[:options['amount']])
+        if not prospects:
+            print(f'Company {company.id} does not have prospects to render.')
+            return
+
+        opt_out_language = get_opt_out_language(company)
+        for prospect in prospects:
+            prospect.company = company
+
+        start = time.perf_counter()
+        for _ in range(options['runs']):
+            for prospect in prospects:
+                prospect.build_bulk_message(sms_template)
+        build_elapsed = time.perf_counter() - start
+
+        renderer = get_renderer(sms_template)
+        rows = [renderer.get_values(prospect) for prospect in prospects]
+        start = time.perf_counter()
+        for _ in range(options['runs']):
+            renderer.render_many(rows, company, opt_out_language=opt_out_language)
+        bulk_elapsed = time.perf_counter() - start
+
+        total = len(prospects) * options['runs']
+        print(f'{"build_bulk_message":<20} {total / build_elapsed:>12.0f} renders/sec')
+        print(f'{"render_many":<20} {total / bulk_elapsed:>12.0f} renders/sec')
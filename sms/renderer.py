@@ -0,0 +1,205 @@
+from collections import OrderedDict
+import random
+import re
+from string import Formatter
+
+from sms import OPT_OUT_LANGUAGE, OPT_OUT_LANGUAGE_TWILIO, TAG_MAPPINGS
+
+# Tags that are filled in with the company's outgoing data instead of the prospect's.
+COMPANY_NAME_TAG = 'CompanyName'
+USER_NAME_TAG = 'UserFirstName'
+
+
+def get_opt_out_language(company, campaign=None):
+    """
+    Return the opt out language that should be appended to the bulk messages of a campaign.
+    """
+    in_twilio_market = campaign and campaign.market.name == 'Twilio'
+    if in_twilio_market and not company.enable_optional_opt_out:
+        return ''
+    return OPT_OUT_LANGUAGE_TWILIO if in_twilio_market else OPT_OUT_LANGUAGE
+
+
+def get_company_name_index(format_spec):
+    """
+    Return the index of the outgoing company name selected by a `{CompanyName:N}` tag.
+    """
+    return int(format_spec) if format_spec.isnumeric() else 0
+
+
+class SMSTemplateRenderer:
+    """
+    Renders the messages of an `SMSTemplate` for many prospects.
+
+    The template message is parsed once into its literal text and tag slots, along with the
+    prospect fields that the tags require, so that rendering a prospect is only joining its values
+    with the literal text. Prospects that are missing a required field get the alternate message.
+    """
+
+    def __init__(self, message, alternate_message):
+        self.message = message
+        self.alternate_message = alternate_message or ''
+
+        # Each slot is the literal text followed by the tag that comes after it, if any.
+        self.slots = []
+        self.fields = []
+        self.company_name_index = None
+        for literal, tag, format_spec, _ in Formatter().parse(message):
+            if tag == COMPANY_NAME_TAG and format_spec:
+                index = get_company_name_index(format_spec)
+                if self.company_name_index is None:
+                    self.company_name_index = index
+                self.slots.append((literal, tag, index, ''))
+                continue
+
+            field = TAG_MAPPINGS.get(tag)
+            if field and field not in self.fields:
+                self.fields.append(field)
+            self.slots.append((literal, tag, field, format_spec or ''))
+
+        self.fields = tuple(self.fields)
+        tags = {slot[1] for slot in self.slots}
+        self.has_company_name = COMPANY_NAME_TAG in tags
+        self.has_user_name = USER_NAME_TAG in tags
+
+        # The alternate message is not formatted, only its first `{CompanyName:N}` tag is replaced.
+        match = re.search(r'\{CompanyName:([^]]*?)\}', self.alternate_message)
+        self.alternate_company_tag = match.group(0) if match else None
+        self.alternate_company_index = get_company_name_index(match.group(1)) if match else None
+
+    def get_values(self, prospect):
+        """
+        Return the tuple of the prospect's values for the fields used by the template.
+        """
+        return tuple(getattr(prospect, field) for field in self.fields)
+
+    def requires_alternate(self, company, sender_name=None):
+        """
+        Return whether the company is missing outgoing data that is used by the template.
+        """
+        if self.has_company_name:
+            if self.company_name_index is not None:
+                return len(company.outgoing_company_names) <= self.company_name_index
+            return not company.outgoing_company_names
+        if self.has_user_name:
+            return not (company.use_sender_name and sender_name) and \
+                not company.outgoing_user_names
+        return False
+
+    def render(self, values, company, sender_name=None, opt_out_language=''):
+        """
+        Return the message for a prospect.
+
+        :param values tuple: The prospect's values for the `fields` of the template.
+        :param company Company: The company sending the message.
+        :param sender_name str: Name of the user sending the message.
+        :param opt_out_language str: Text to append to the message.
+        """
+        return self.render_many([values], company, sender_name, opt_out_language)[0]
+
+    def render_many(self, rows, company, sender_name=None, opt_out_language=''):
+        """
+        Return the messages for many prospects, in the same order as their values.
+        """
+        company_names = company.outgoing_company_names or []
+        user_names = company.outgoing_user_names or []
+        if company.use_sender_name and sender_name:
+            user_names = [sender_name]
+
+        if self.requires_alternate(company, sender_name):
+            return [
+                self.render_alternate(company, opt_out_language) for _ in rows
+            ]
+
+        messages = []
+        for values in rows:
+            if all(values):
+                message = self.render_values(values, company_names, user_names)
+            else:
+                message = self.render_alternate(company, opt_out_language='')
+            messages.append(message + opt_out_language)
+
+        return messages
+
+    def render_values(self, values, company_names, user_names):
+        """
+        Join the literal text of the message with the prospect's values.
+        """
+        values = dict(zip(self.fields, values))
+        company_name = random.choice(company_names) if company_names else ''
+        user_name = random.choice(user_names) if user_names else ''
+        parts = []
+        for literal, tag, field, format_spec in self.slots:
+            parts.append(literal)
+            if tag is None:
+                continue
+            if tag == COMPANY_NAME_TAG:
+                if field is not None:
+                    # `{CompanyName:N}` falls back to the first name when the index is missing.
+                    company_name = company_names[field if field < len(company_names) else 0]
+                parts.append(company_name)
+            elif tag == USER_NAME_TAG:
+                parts.append(user_name)
+            elif field is None:
+                parts.append('{' + tag + '}')
+            else:
+                value = values[field]
+                parts.append(format(value, format_spec) if value is not None else '')
+        return ''.join(parts)
+
+    def render_alternate(self, company, opt_out_language=''):
+        """
+        Return the alternate message, which only contains the company's name.
+        """
+        company_names = company.outgoing_company_names or []
+        message = self.alternate_message
+        if self.alternate_company_tag and company_names:
+            i = self.alternate_company_index
+            message = message.replace(
+                self.alternate_company_tag,
+                company_names[i if i < len(company_names) else 0],
+            )
+
+        company_name = random.choice(company_names) if company_names else ''
+        return message.replace('{CompanyName}', company_name) + opt_out_language
+
+
+class RendererCache:
+    """
+    Compiled `SMSTemplateRenderer`s by template id, so each template is only parsed once.
+
+    Templates are compiled again when their `last_updated` changes.
+    """
+    max_size = 500
+
+    def __init__(self):
+        self.renderers = OrderedDict()
+
+    def get(self, sms_template):
+        if sms_template.pk is None:
+            return SMSTemplateRenderer(sms_template.message, sms_template.alternate_message)
+
+        key = (sms_template.pk, sms_template.last_updated)
+        renderer = self.renderers.get(key)
+        if renderer is None or renderer.message != sms_template.message or \
+                renderer.alternate_message != (sms_template.alternate_message or ''):
+            renderer = SMSTemplateRenderer(sms_template.message, sms_template.alternate_message)
+            self.renderers[key] = renderer
+            if len(self.renderers) > self.max_size:
+                self.renderers.popitem(last=False)
+        else:
+            self.renderers.move_to_end(key)
+        return renderer
+
+    def clear(self):
+        self.renderers.clear()
+
+
+renderer_cache = RendererCache()
+
+
+def get_renderer(sms_template):
+    """
+    Return the compiled renderer of an `SMSTemplate`.
+    """
+    return renderer_cache.get(sms_template)
@@ -0,0 +1,133 @@
+import json
+
+from django_redis import get_redis_connection
+
+from django.core.cache import cache
+
+# Return the route of our number and the id of the latest prospect of its company with the contact
+# number, in a single round trip.
+RESOLVE_SCRIPT = """
+local route = redis.call('hget', KEYS[1], ARGV[1])
+if not route then
+    return {false, false}
+end
+local company_id = cjson.decode(route)['company_id']
+if not company_id then
+    return {route, false}
+end
+return {route, redis.call('hget', KEYS[2], company_id .. ':' .. ARGV[2])}
+"""
+
+
+class InboundRoutes:
+    """
+    Routing table of the messages that we receive.
+
+    Maps our numbers to the company, market and provider that receive their messages, or to a relay
+    number, and each company's contact phones to their latest prospect, so that routing a received
+    message takes a single redis lookup instead of resolving the phone numbers and the prospect
+    with queries. Routes of numbers are cleared when the numbers change and loaded again on the next
+    message, prospects are added when they are created, including with `bulk_create`. The database
+    is still the source of truth: missing routes are loaded from it and prospects read from the
+    index are verified.
+    """
+
+    def __init__(self):
+        self.numbers_key = cache.make_key('inbound_number_routes')
+        self.prospects_key = cache.make_key('inbound_prospect_routes')
+        self.redis = get_redis_connection()
+
+    def resolve(self, our_phone, contact_phone):
+        """
+        Return the route of our number and the id of the latest prospect with the contact phone,
+        loading them from the database when they're not in the table.
+
+        :return: The route dictionary, or None when the number is not ours, and the prospect id,
+                 or None when the number has no company or the company doesn't have a prospect
+                 with the phone.
+        """
+        route, prospect_id = self.redis.eval(
+            RESOLVE_SCRIPT,
+            2,
+            self.numbers_key,
+            self.prospects_key,
+            our_phone,
+            contact_phone,
+        )
+        if route is None:
+            route = self.load_number(our_phone)
+            if route is None:
+                return None, None
+        else:
+            route = json.loads(route)
+
+        if 'company_id' not in route:
+            return route, None
+        if prospect_id is None:
+            return route, self.load_prospect(route['company_id'], contact_phone)
+        return route, int(prospect_id)
+
+    def load_number(self, phone):
+        """
+        Add the route of our number from its relay number or phone number.
+        """
+        from prospects.models import RelayNumber
+        from sherpa.models import PhoneNumber
+
+        route = {'relay': RelayNumber.objects.filter(phone=phone).exists()}
+
+        # Numbers can be bought again after being released, the active one receives the messages.
+        numbers = PhoneNumber.objects.filter(phone=phone).order_by('id')
+        phone_number = numbers.filter(status=PhoneNumber.Status.ACTIVE).last() or numbers.last()
+        if phone_number:
+            route.update({
+                'phone_number_id': phone_number.id,
+                'company_id': phone_number.company_id,
+                'market_id': phone_number.market_id,
+                'provider': phone_number.provider,
+            })
+        elif not route['relay']:
+            return None
+
+        self.redis.hset(self.numbers_key, phone, json.dumps(route))
+        return route
+
+    def remove_number(self, phone):
+        self.redis.hdel(self.numbers_key, phone)
+
+    def load_prospect(self, company_id, phone):
+        """
+        Add the latest prospect of the company with the phone.
+        """
+        from sherpa.models import Prospect
+
+        prospect_id = Prospect.objects.filter(
+            company_id=company_id,
+            phone_raw=phone,
+        ).values_list('id', flat=True).order_by('id').last()
+        if prospect_id:
+            self.redis.hset(self.prospects_key, f'{company_id}:{phone}', prospect_id)
+        else:
+            self.remove_prospect(company_id, phone)
+        return prospect_id
+
+    def add_prospects(self, prospects):
+        """
+        Set new prospects as the latest of their company with their phone, as prospects are added
+        after the existing ones.
+
+        :param prospects: Iterable of saved `Prospect`s, in the order they were created.
+        """
+        pipeline = self.redis.pipeline()
+        for prospect in prospects:
+            if prospect.pk and prospect.phone_raw:
+                pipeline.hset(
+                    self.prospects_key,
+                    f'{prospect.company_id}:{prospect.phone_raw}',
+                    prospect.pk,
+                )
+        pipeline.execute()
+
+    def remove_prospect(self, company_id, phone):
+        if phone:
+            self.redis.hdel(self.prospects_key, f'{company_id}:{phone}')
@@ -8,25 +8,26 @@ from telnyx.error import APIError, InvalidParametersError, InvalidRequestError
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.exceptions import MultipleObjectsReturned
 from django.db import transaction
 from django.db.models import F
 from django.utils import timezone as django_tz
 
 from campaigns.models import AutoDeadDetection, InitialResponse
+from companies.reference import get_lead_stage
 from core.utils import clean_phone
 from prospects.models import ProspectRelay
 from prospects.utils import record_phone_number_opt_outs
 from sherpa.models import (
     CampaignProspect,
     Company,
-    LeadStage,
     LitigatorReportQueue,
     PhoneNumber,
+    Prospect,
     SMSMessage,
     SMSTemplate,
 )
 from .models import SMSResult
+from .routing import InboundRoutes
 
 User = get_user_model()
 
@@ -65,9 +66,10 @@ def sms_message_received_router(from_number, to_number, message, media_url=None)
     """
     to_number_cleaned = clean_phone(to_number)
     from_number_cleaned = clean_phone(from_number)
+    route, _ = InboundRoutes().resolve(to_number_cleaned, from_number_cleaned)
     # If this message is being sent from an agent relay phone to a relay number, then it is a relay
     # message from a rep. Otherwise, it is a message from a prospect.
-    if ProspectRelay.objects.filter(
+    if route and route['relay'] and ProspectRelay.objects.filter(
         relay_number__phone=to_number_cleaned,
         agent_profile__phone=from_number_cleaned,
     ).exists():
@@ -113,36 +115,31 @@ def sms_message_received(from_number, to_number, message, num_media=None, file_e
     if not from_number_cleaned:
         return
 
-    # ====================== Find company ======================
+    # ====================== Find company and prospect ======================
     to_number_cleaned = clean_phone(to_number)
-
-    try:
-        phone_record = PhoneNumber.objects.get(phone=to_number_cleaned)
-    except MultipleObjectsReturned:
-        phone_record = PhoneNumber.objects.filter(
-            phone=to_number_cleaned,
-            status=PhoneNumber.Status.ACTIVE,
-        ).last()
-
-        # There's still a chance that the phone number was not found, if there are multiple released
-        # numbers, but no active.
-        if not phone_record:
-            phone_record = PhoneNumber.objects.filter(phone=to_number_cleaned).last()
-    except PhoneNumber.DoesNotExist:
+    routes = InboundRoutes()
+    route, prospect_id = routes.resolve(to_number_cleaned, from_number_cleaned)
+    if not route or 'company_id' not in route:
         # Received a message to a number that we have in twilio, however it's not in sherpa.
         # TODO (aww20191016) should log this as it seems the number should be released in twilio.
         return
 
-    company = phone_record.company
-
-    # ====================== Find prospect ======================
-
-    # lean on default ordering of prospects by pk to get last for company w that number
-    prospect = company.prospect_set.filter(phone_raw=from_number_cleaned).last()
+    # The prospect from the routes is the latest prospect of the company with that number.
+    prospects = Prospect.objects.select_related('company').filter(
+        company_id=route['company_id'],
+        phone_raw=from_number_cleaned,
+    )
+    prospect = prospects.filter(id=prospect_id).first() if prospect_id else None
+    if not prospect and prospect_id:
+        # The route is outdated, it's loaded again from the database.
+        prospect_id = routes.load_prospect(route['company_id'], from_number_cleaned)
+        prospect = prospects.filter(id=prospect_id).first() if prospect_id else None
 
     if not prospect or prospect.is_blocked:
         return
 
+    company = prospect.company
+
     # ====================== Find CampaignProspects ======================
 
     campaign_prospect_list = CampaignProspect.objects.filter(prospect=prospect)
@@ -286,11 +283,12 @@ def sms_message_received(from_number, to_number, message, num_media=None, file_e
 
     # Get the appropriate lead stage depending on if an auto dead was detected.
     if set_auto_dead or stop_called:
-        lead_stage = LeadStage.objects.get(lead_stage_title="Dead (Auto)", company=company)
+        lead_stage = get_lead_stage(company, 'Dead (Auto)')
     else:
-        lead_stage = LeadStage.objects.get(lead_stage_title="Response Received", company=company)
+        lead_stage = get_lead_stage(company, 'Response Received')
 
-    if not prospect.lead_stage or prospect.lead_stage.lead_stage_title == 'Initial Message Sent':
+    initial_stage = get_lead_stage(company, 'Initial Message Sent')
+    if not prospect.lead_stage_id or (initial_stage and prospect.lead_stage_id == initial_stage.id):
         prospect.lead_stage = lead_stage
     prospect.has_responded_via_sms = 'yes'
 
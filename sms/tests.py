@@ -10,7 +10,7 @@ from django.urls import reverse
 from campaigns.models import InitialResponse
 from campaigns.tests import CampaignDataMixin
 from prospects.models import ProspectRelay, RelayNumber
-from sherpa.models import PhoneNumber, SMSMessage, SMSPrefillText, SMSTemplate
+from sherpa.models import PhoneNumber, Prospect, SMSMessage, SMSPrefillText, SMSTemplate
 from sherpa.tests import (
     AdminUserMixin,
     BaseAPITestCase,
@@ -19,9 +19,11 @@ from sherpa.tests import (
     CompanyTwoMixin,
     NoDataBaseTestCase,
 )
-from . import OPT_OUT_LANGUAGE
+from . import OPT_OUT_LANGUAGE, TAG_MAPPINGS
 from .clients import TelnyxClient
 from .models import CarrierApprovedTemplate, SMSResult, SMSTemplateCategory
+from .renderer import get_renderer, SMSTemplateRenderer
+from .routing import InboundRoutes
 from .tasks import (
     record_phone_number_stats_received,
     sms_message_received,
@@ -65,6 +67,60 @@ class SMSTemplateModelTestCase(CompanyOneMixin, NoDataBaseTestCase):
         self.assertIn(self.company1.random_outgoing_company_name, alternate_message)
         self.assertIn(OPT_OUT_LANGUAGE, alternate_message)
 
+    def test_renderer_renders_many_prospects(self):
+        template = mommy.make(
+            'sherpa.SMSTemplate',
+            message='Hi {FirstName}, None of {ZipCode} is {CompanyName:1}?',
+            alternate_message='Hello from {CompanyName:0}',
+            company=self.company1,
+        )
+        self.company1.outgoing_company_names = ['First Co', 'Second Co']
+        renderer = get_renderer(template)
+        self.assertEqual(renderer.fields, ('first_name', 'property_zip'))
+        self.assertIs(get_renderer(template), renderer)
+
+        messages = renderer.render_many(
+            [('John', '55555'), ('Mary', None)],
+            self.company1,
+            opt_out_language=OPT_OUT_LANGUAGE,
+        )
+        self.assertEqual(messages, [
+            f'Hi John, None of 55555 is Second Co?{OPT_OUT_LANGUAGE}',
+            f'Hello from First Co{OPT_OUT_LANGUAGE}',
+        ])
+
+        # Templates are compiled again when they are updated.
+        template.message = 'Bye {FirstName} {CompanyName}'
+        template.save()
+        renderer = get_renderer(template)
+        self.assertEqual(renderer.fields, ('first_name',))
+        self.assertIn('Bye John', renderer.render(('John',), self.company1))
+
+    def test_renderer_renders_every_tag(self):
+        prospect = mommy.make(
+            'sherpa.Prospect',
+            company=self.company1,
+            first_name='John',
+            last_name='Doe',
+            property_address='123 Main St',
+            property_city='Denver',
+            property_state='CO',
+            property_zip='80202',
+            custom1='Blue house',
+        )
+        self.company1.outgoing_company_names = ['First Co']
+        self.company1.outgoing_user_names = ['Mary']
+        self.assertEqual(set(TAG_MAPPINGS), set(prospect.msg_attrs))
+
+        # Each tag renders the same value that the prospect's message attributes had.
+        for tag in TAG_MAPPINGS:
+            message = f'Hi {{{tag}}}!'
+            renderer = SMSTemplateRenderer(message, '')
+            self.assertEqual(
+                renderer.render(renderer.get_values(prospect), self.company1),
+                message.format(**prospect.msg_attrs),
+            )
+
 
 class SMSTemplateAPITestCase(CompanyTwoMixin, AdminUserMixin, CompanyOneMixin, NoDataBaseTestCase):
     sms_template_list_url = reverse('smstemplate-list')
@@ -492,6 +548,51 @@ class SMSTaskTestCase(CampaignDataMixin, BaseTestCase):
         self.assertTrue(self.george_prospect.wrong_number)
         self.assertFalse(self.george_prospect.do_not_call)
 
+    def test_inbound_routes(self):
+        routes = InboundRoutes()
+        phone_number = self.george_prospect.sherpa_phone_number_obj
+        contact_phone = self.george_prospect.phone_raw
+        route, prospect_id = routes.resolve(phone_number.phone, contact_phone)
+        self.assertFalse(route['relay'])
+        self.assertEqual(route['company_id'], self.company1.id)
+        self.assertEqual(route['market_id'], phone_number.market_id)
+        self.assertEqual(
+            prospect_id,
+            self.company1.prospect_set.filter(phone_raw=contact_phone).last().id,
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(routes.resolve(phone_number.phone, contact_phone)[1], prospect_id)
+
+        # New prospects are the latest with their phone.
+        prospect = mommy.make('sherpa.Prospect', company=self.company1, phone_raw=contact_phone)
+        with self.assertNumQueries(0):
+            self.assertEqual(routes.resolve(phone_number.phone, contact_phone)[1], prospect.id)
+        mommy.make('sherpa.CampaignProspect', campaign=self.george_campaign, prospect=prospect)
+        self.receive_message(message='routed to the latest prospect')
+        self.assertEqual(prospect.messages.count(), 1)
+
+        # Prospects created in bulk by uploads are the latest with their phone too.
+        uploaded, = Prospect.objects.bulk_create([
+            Prospect(company=self.company1, phone_raw=contact_phone),
+        ])
+        mommy.make('sherpa.CampaignProspect', campaign=self.george_campaign, prospect=uploaded)
+        self.receive_message(message='routed to the uploaded prospect')
+        self.assertEqual(uploaded.messages.count(), 1)
+        self.assertEqual(prospect.messages.count(), 1)
+        uploaded.delete()
+
+        # Deleted prospects are loaded again from the database.
+        prospect.delete()
+        self.assertEqual(routes.resolve(phone_number.phone, contact_phone)[1], prospect_id)
+
+        # Routes of numbers are loaded again when they change.
+        phone_number.company = self.company2
+        phone_number.save()
+        route, prospect_id = routes.resolve(phone_number.phone, contact_phone)
+        self.assertEqual(route['company_id'], self.company2.id)
+        self.assertIsNone(routes.resolve('0000000000', contact_phone)[0])
+        routes.remove_number(phone_number.phone)
+
 
 class SMSMessageAPITestCase(CampaignDataMixin, BaseAPITestCase):
 